@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Async Engine Throughput Benchmark
+Measures manifest submission throughput of StandardWikiBot at different
+per-wiki concurrency limits against the mock MediaWiki API with artificial
+latency.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from mock_mediawiki import MockMediaWiki
+from wiki_automated_submission import StandardWikiBot
+
+
+def build_manifest(directory: str, pages: int) -> list:
+    """Write one small content file per page and return the manifest."""
+    manifest = []
+    for index in range(pages):
+        path = os.path.join(directory, f"page{index}.md")
+        with open(path, 'w') as f:
+            f.write(f"== Page {index} ==\nBenchmark content.\n")
+        manifest.append({"title": f"Benchmark Page {index}", "content_file": path, "summary": "Benchmark"})
+    return manifest
+
+
+def bench_limit(api_url: str, manifest: list, max_in_flight: int) -> float:
+    """Submit the manifest once and return the elapsed wall-clock time."""
+    bot = StandardWikiBot()
+    bot.username = "TestUser"
+    bot.password = "TestPassword"
+    start = time.perf_counter()
+    with redirect_stdout(StringIO()):
+        results = bot.submit_manifest(api_url, manifest, max_in_flight)
+    elapsed = time.perf_counter() - start
+    failed = [result for result in results if result["status"] == "failed"]
+    if failed:
+        raise RuntimeError(f"{len(failed)} pages failed, e.g. {failed[0]['error']}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark concurrent manifest submission')
+    parser.add_argument('--pages', type=int, default=200, help='Pages per run')
+    parser.add_argument('--latency', type=float, default=0.05, help='Artificial server latency in seconds')
+    parser.add_argument('--limits', default='1,4,16', help='Comma-separated max_in_flight values to compare')
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        manifest = build_manifest(temp_dir, args.pages)
+        print(f"{'max_in_flight':<16}{'Pages':>8}{'Seconds':>10}{'Pages/s':>10}")
+        for limit in [int(value) for value in args.limits.split(",")]:
+            # A fresh wiki per run so every edit is a real change
+            with MockMediaWiki(latency=args.latency) as wiki:
+                elapsed = bench_limit(wiki.api_url, manifest, limit)
+            print(f"{limit:<16}{args.pages:>8}{elapsed:>10.3f}{args.pages / elapsed:>10.1f}")
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
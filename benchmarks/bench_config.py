@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Configuration Loading Benchmark
+Times WikiConfigManager start-up and repeated lookups with thousands of
+configured wikis: parsing the JSON files, loading the on-disk cache, the
+memoized merge that only checks the files' modification times, loading one
+wiki from a sharded wikis.d directory, the indexed lookups by API URL and
+category, and fuzzy search.
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from wiki_config_manager import WikiConfigManager, categorize_wikis
+from wiki_config_shards import export_shards
+
+
+def build_wikis(count: int, prefix: str) -> dict:
+    """Generate wiki configurations shaped like the entries in wiki_config.json."""
+    return {f"{prefix}{index}": {
+        "name": f"Wiki {index}",
+        "api_url": f"https://wiki{index}.example.org/api.php",
+        "user_agent": f"WikiSecureBot/1.0 (Wiki {index})",
+        "validation_rules": {"related_articles": "{{Related articles", "note_box": "{{Note|"}
+    } for index in range(count)}
+
+
+def report(name: str, number: int, seconds: float) -> None:
+    print(f"{name:<44}{number:>10}{seconds / number * 1e6:>14.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark configuration loading and lookups')
+    parser.add_argument('--wikis', type=int, default=5000, help='Wikis in the main configuration')
+    parser.add_argument('--user-wikis', type=int, default=500, help='Wikis in the user configuration')
+    parser.add_argument('--lookups', type=int, default=20000, help='Lookups per lookup benchmark')
+    parser.add_argument('--shard-size', type=int, default=100, help='Wikis per shard in the sharded benchmark')
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp()
+    config_file = os.path.join(temp_dir, "wiki_config.json")
+    user_config_file = os.path.join(temp_dir, "user_wikis.json")
+    cache_dir = os.path.join(temp_dir, "cache")
+    with open(config_file, 'w') as f:
+        json.dump({"default_wiki": "wiki0", "wikis": build_wikis(args.wikis, "wiki")}, f, indent=2)
+    with open(user_config_file, 'w') as f:
+        json.dump({"wikis": build_wikis(args.user_wikis, "user")}, f, indent=2)
+
+    def new_manager(use_disk_cache: bool = True) -> WikiConfigManager:
+        return WikiConfigManager(config_file=config_file, user_config_file=user_config_file,
+                                 cache_dir=cache_dir, use_disk_cache=use_disk_cache)
+
+    size = os.path.getsize(config_file) + os.path.getsize(user_config_file)
+    print(f"{args.wikis + args.user_wikis} wikis, {size / 1024 / 1024:.1f} MB of JSON\n")
+    print(f"{'Benchmark':<44}{'Iterations':>10}{'us/iteration':>14}")
+
+    starts = 20
+    report("start-up, parse JSON", starts, timeit.timeit(lambda: new_manager(False).merge_configs(), number=starts))
+    new_manager().merge_configs()
+    report("start-up, on-disk cache", starts, timeit.timeit(lambda: new_manager().merge_configs(), number=starts))
+
+    # Sharded directory, with Fandom-style families of --shard-size wikis
+    with open(config_file) as f:
+        config = json.load(f)
+    for index, wiki_config in enumerate(config["wikis"].values()):
+        wiki_config["family"] = f"family{index // args.shard_size}"
+    shard_dir = os.path.join(temp_dir, "wikis.d")
+    export_shards(config, shard_dir)
+    target = next(iter(config["wikis"]))
+
+    def sharded_start():
+        manager = WikiConfigManager(config_file=shard_dir, user_config_file=user_config_file, use_disk_cache=False)
+        return manager.get_wiki_config(target)
+
+    report(f"start-up + --wiki, sharded ({args.shard_size}/shard)", starts, timeit.timeit(sharded_start, number=starts))
+
+    uncached = new_manager(False)
+
+    def reparse():
+        # What every merge_configs() call cost before it was memoized
+        uncached.config_signature = None
+        return uncached.merge_configs()
+
+    report("merge_configs, re-read every call", starts, timeit.timeit(reparse, number=starts))
+    manager = new_manager()
+    manager.merge_configs()
+    report("merge_configs, unchanged files", args.lookups, timeit.timeit(manager.merge_configs, number=args.lookups))
+
+    wiki_ids = list(manager.get_wiki_list())
+    rng = random.Random(1)
+    lookups = [rng.choice(wiki_ids) for _ in range(args.lookups)]
+    lookup_iter = iter(lookups * 2)
+    report("get_wiki_config", args.lookups,
+           timeit.timeit(lambda: manager.get_wiki_config(next(lookup_iter)), number=args.lookups))
+    report("build api_url and host indexes", 1, timeit.timeit(lambda: manager.get_index("api_url"), number=1))
+    report("build category index", 1, timeit.timeit(lambda: manager.get_index("category"), number=1))
+    urls = [manager.get_wiki_config(wiki_id)["api_url"] for wiki_id in lookups[:1000]]
+    url_iter = iter(urls * (args.lookups // len(urls) + 1))
+    report("find_wiki_id_by_api_url (indexed)", args.lookups,
+           timeit.timeit(lambda: manager.find_wiki_id_by_api_url(next(url_iter)), number=args.lookups))
+    report("find by api_url, linear scan", 200,
+           timeit.timeit(lambda: next(wiki_id for wiki_id, wiki_config in manager.get_wiki_list().items()
+                                      if wiki_config.get("api_url") == urls[0]), number=200))
+    report("get_wikis_by_category (indexed)", args.lookups,
+           timeit.timeit(manager.get_wikis_by_category, number=args.lookups))
+    report("categorize_wikis, rebuilt", 20,
+           timeit.timeit(lambda: categorize_wikis(manager.get_wiki_list()), number=20))
+    report("build search index", 1, timeit.timeit(lambda: manager.get_search_index(), number=1))
+
+    def cached_search_index():
+        # What a new process pays for the index once it is in the on-disk cache
+        fresh = new_manager()
+        fresh.merge_configs()
+        return fresh.get_search_index()
+
+    report("search index, on-disk cache (+ start-up)", starts, timeit.timeit(cached_search_index, number=starts))
+    queries = ["wiki 1234", "wiki1234.example", "user 77", "wki 4321", "example"]
+    query_iter = iter(queries * (args.lookups // 100))
+    report("search_wikis", args.lookups // 100,
+           timeit.timeit(lambda: manager.search_wikis(next(query_iter)), number=args.lookups // 100))
+    manager.get_validation_rules(lookups[0])
+    report("get_validation_rules (compiled)", args.lookups,
+           timeit.timeit(lambda: manager.get_validation_rules(lookups[0]), number=args.lookups))
+
+    shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
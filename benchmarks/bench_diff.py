@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Line Diff Benchmark
+Compares the line-hash diff used in validation reports with difflib on
+multi-megabyte wikitext pages with scattered edits.
+"""
+
+import argparse
+import difflib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from wiki_diff import unified_diff
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "[[Link]]", "{{Template|x}}", "<ref>Source</ref>", "'''bold'''"]
+# Markup lines that repeat throughout real pages, e.g. table rows and blank lines
+REPEATED_LINES = ["", "|-", "* item", "}}"]
+
+
+def build_lines(size_mb: float, seed: int = 1) -> list:
+    """Generate wikitext lines of roughly the given total size."""
+    rng = random.Random(seed)
+    lines = []
+    length = 0
+    while length < size_mb * 1024 * 1024:
+        if rng.random() < 0.3:
+            line = rng.choice(REPEATED_LINES)
+        else:
+            line = " ".join(rng.choice(WORDS) for _ in range(10))
+        lines.append(line)
+        length += len(line) + 1
+    return lines
+
+
+def edit_lines(lines: list, edits: int, seed: int = 2) -> list:
+    """Apply random line insertions, deletions and replacements."""
+    rng = random.Random(seed)
+    edited = list(lines)
+    for index in range(edits):
+        position = rng.randrange(len(edited))
+        action = rng.choice(["insert", "delete", "replace"])
+        if action == "insert":
+            edited.insert(position, f"inserted line {index}")
+        elif action == "delete":
+            del edited[position]
+        else:
+            edited[position] = f"replaced line {index}"
+    return edited
+
+
+def time_diff(func, a: list, b: list) -> (float, int):
+    start = time.perf_counter()
+    lines = sum(1 for _ in func(a, b))
+    return time.perf_counter() - start, lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark line diffs of large pages')
+    parser.add_argument('--sizes', default='0.5,1,2,4', help='Comma-separated page sizes in megabytes')
+    parser.add_argument('--edits', type=int, default=200, help='Random line edits between the two versions')
+    parser.add_argument('--skip-difflib-above', type=float, default=2.0,
+                        help='Do not run difflib on pages larger than this many megabytes')
+    args = parser.parse_args()
+
+    print(f"{args.edits} scattered line edits per page\n")
+    print(f"{'Size':<8}{'Lines':>10}{'wiki_diff':>12}{'difflib':>12}{'Diff lines':>12}")
+    for size in [float(value) for value in args.sizes.split(",")]:
+        a = build_lines(size)
+        b = edit_lines(a, args.edits)
+        ours, diff_lines = time_diff(unified_diff, a, b)
+        if size <= args.skip_difflib_above:
+            theirs = f"{time_diff(lambda x, y: difflib.unified_diff(x, y, lineterm=''), a, b)[0]:.3f}s"
+        else:
+            theirs = "skipped"
+        print(f"{size:<8}{len(a):>10}{ours:>11.3f}s{theirs:>12}{diff_lines:>12}")
+
+
+if __name__ == "__main__":
+    main()
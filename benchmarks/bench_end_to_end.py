@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+End-to-End Throughput Benchmark
+Measures pages/sec, p50/p99 latency per page and peak RSS of StandardWikiBot
+(manifest submission), EnhancedSecureWikiBot (one interactive submission per
+page, with scripted credentials) and WikiValidator (revision validation per
+page) against the mock MediaWiki API.
+
+The mock wiki runs in this process and every measured run in a child
+process, so the peak RSS is that of the client alone. Results are saved as
+JSON; pass an earlier results file with --compare to track regressions
+between versions.
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from io import StringIO
+from typing import Any, Dict, List, Optional
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from mock_mediawiki import MockMediaWiki
+
+SCENARIOS = ("standard", "secure", "validator")
+
+# Bump when the layout of the results file changes
+RESULTS_VERSION = 1
+
+VALIDATION_RULES = {"heading": "== Benchmark Page"}
+
+# Shorter runs are dominated by start-up noise and are not checked for regressions
+MIN_COMPARED_SECONDS = 1.0
+
+
+def page_title(index: int) -> str:
+    """Title of the nth benchmark page."""
+    return f"Benchmark Page {index}"
+
+
+def page_content(index: int) -> str:
+    """Content of the nth benchmark page, a few kilobytes like a typical article section."""
+    return f"== Benchmark Page {index} ==\n" + f"Line {index} of benchmark content.\n" * 100
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """Nearest-rank percentile of values, None if there are none."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q * len(ordered)) - 1)]
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MiB, None where it cannot be measured."""
+    # On Linux ru_maxrss survives fork() and exec(), so a child would report the
+    # parent's peak; VmHWM belongs to the address space exec() created
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def write_pages(directory: str, pages: int) -> List[Dict[str, str]]:
+    """Write one content file per page and return the manifest."""
+    manifest = []
+    for index in range(pages):
+        path = os.path.join(directory, f"page{index}.md")
+        with open(path, 'w') as f:
+            f.write(page_content(index))
+        manifest.append({"title": page_title(index), "content_file": path, "summary": "Benchmark"})
+    return manifest
+
+
+def run_standard(api_url: str, manifest: List[Dict[str, str]], max_in_flight: int) -> List[float]:
+    """Submit the manifest in one session and return the seconds spent on each page."""
+    from wiki_automated_submission import StandardWikiBot
+
+    bot = StandardWikiBot()
+    bot.username = "TestUser"
+    bot.password = "TestPassword"
+    latencies = []
+    submit_entry = bot.submit_manifest_entry
+
+    def timed_submit_entry(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return submit_entry(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    bot.submit_manifest_entry = timed_submit_entry
+    results = bot.submit_manifest(api_url, manifest, max_in_flight)
+    failed = [result for result in results if result["status"] != "success"]
+    if failed:
+        raise RuntimeError(f"{len(failed)} pages not submitted, e.g. {failed[0]}")
+    return latencies
+
+
+def run_secure(api_url: str, manifest: List[Dict[str, str]]) -> List[float]:
+    """Submit every page the way the interactive script does, with scripted credentials."""
+    from wiki_secure_submission import EnhancedSecureWikiBot
+
+    latencies = []
+    with patch('builtins.input', return_value="TestUser"), patch('getpass.getpass', return_value="TestPassword"):
+        for entry in manifest:
+            start = time.perf_counter()
+            bot = EnhancedSecureWikiBot()
+            bot.set_wiki_config({"name": "Benchmark Wiki", "api_url": api_url})
+            edit = bot.submit_content(entry["title"], entry["content_file"], entry["summary"])
+            latencies.append(time.perf_counter() - start)
+            if "newrevid" not in edit:
+                raise RuntimeError(f"Page '{entry['title']}' not submitted: {edit}")
+    return latencies
+
+
+def run_validator(api_url: str, manifest: List[Dict[str, str]]) -> List[float]:
+    """Validate every page against the wiki, which already holds the same content."""
+    from wiki_validator import WikiValidator
+
+    validator = WikiValidator()
+    latencies = []
+    for entry in manifest:
+        start = time.perf_counter()
+        success, details = validator.validate_revision(api_url, entry["title"], entry["content_file"],
+                                                       VALIDATION_RULES)
+        latencies.append(time.perf_counter() - start)
+        if not success:
+            raise RuntimeError(f"Page '{entry['title']}' failed validation: {details}")
+    return latencies
+
+
+def run_child(scenario: str, api_url: str, pages: int, max_in_flight: int) -> Dict[str, Any]:
+    """Run one scenario in this process and measure it."""
+    temp_dir = tempfile.mkdtemp()
+    try:
+        manifest = write_pages(temp_dir, pages)
+        startup_rss = peak_rss_mb()
+        start = time.perf_counter()
+        with redirect_stdout(StringIO()):
+            if scenario == "standard":
+                latencies = run_standard(api_url, manifest, max_in_flight)
+            elif scenario == "secure":
+                latencies = run_secure(api_url, manifest)
+            else:
+                latencies = run_validator(api_url, manifest)
+        elapsed = time.perf_counter() - start
+    finally:
+        shutil.rmtree(temp_dir)
+    peak_rss = peak_rss_mb()
+    return {
+        "scenario": scenario,
+        "pages": pages,
+        "seconds": round(elapsed, 4),
+        "pages_per_second": round(pages / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.5) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "startup_rss_mb": round(startup_rss, 1) if startup_rss is not None else None,
+        "peak_rss_mb": round(peak_rss, 1) if peak_rss is not None else None
+    }
+
+
+def bench(scenario: str, pages: int, latency: float, max_in_flight: int) -> Dict[str, Any]:
+    """Start a fresh mock wiki and measure one scenario in a child process."""
+    with MockMediaWiki(latency=latency) as wiki:
+        if scenario == "validator":
+            for index in range(pages):
+                wiki.set_page(page_title(index), page_content(index))
+        process = subprocess.run(
+            [sys.executable, __file__, "--run", scenario, "--api-url", wiki.api_url, "--pages", str(pages),
+             "--max-in-flight", str(max_in_flight)],
+            capture_output=True, text=True)
+        requests_count = wiki.request_count
+    if process.returncode != 0:
+        raise RuntimeError(f"{scenario} with {pages} pages failed:\n{process.stderr}")
+    result = json.loads(process.stdout.splitlines()[-1])
+    result["requests"] = requests_count
+    return result
+
+
+def git_revision() -> Optional[str]:
+    """The checked out commit, None outside a git checkout."""
+    try:
+        process = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                 cwd=os.path.dirname(os.path.abspath(__file__)))
+    except OSError:
+        return None
+    return process.stdout.strip() if process.returncode == 0 else None
+
+
+def compare(results: List[Dict[str, Any]], baseline_file: str, max_regression: float) -> bool:
+    """
+    Print the change against an earlier results file.
+
+    Returns:
+        True if no run of at least MIN_COMPARED_SECONDS lost more than max_regression of its throughput
+    """
+    with open(baseline_file, 'r') as f:
+        baseline = {(result["scenario"], result["pages"]): result for result in json.load(f)["results"]}
+    ok = True
+    print(f"\nCompared with {baseline_file}:")
+    print(f"{'Scenario':<12}{'Pages':>8}{'Pages/s':>12}{'p99':>12}{'Peak RSS':>12}")
+    for result in results:
+        before = baseline.get((result["scenario"], result["pages"]))
+        if before is None:
+            continue
+        throughput = result["pages_per_second"] / before["pages_per_second"] - 1
+        p99 = result["p99_ms"] / before["p99_ms"] - 1 if before["p99_ms"] else 0.0
+        rss = (f"{result['peak_rss_mb'] - before['peak_rss_mb']:>+10.1f}MB"
+               if result["peak_rss_mb"] is not None and before.get("peak_rss_mb") is not None else f"{'-':>12}")
+        flag = ""
+        if min(result["seconds"], before["seconds"]) < MIN_COMPARED_SECONDS:
+            flag = "  (too short to check)"
+        elif throughput < -max_regression:
+            ok = False
+            flag = "  REGRESSION"
+        print(f"{result['scenario']:<12}{result['pages']:>8}{throughput:>+12.1%}{p99:>+12.1%}{rss}{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark end-to-end submission and validation throughput')
+    parser.add_argument('--scenarios', default=",".join(SCENARIOS),
+                        help='Comma-separated scenarios to run (default: all)')
+    parser.add_argument('--pages', default='1,100,10000', help='Comma-separated page counts')
+    parser.add_argument('--latency', type=float, default=0.0, help='Artificial server latency in seconds')
+    parser.add_argument('--max-in-flight', type=int, default=4,
+                        help='Concurrent edits of the standard bot (default: 4)')
+    parser.add_argument('--output', default='bench_end_to_end.json', help='Where to save the results')
+    parser.add_argument('--compare', metavar='BASELINE', help='Results file of an earlier version to compare with')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='Exit with status 1 if pages/sec drops by more than this share (default: 0.2)')
+    # Used for the child processes
+    parser.add_argument('--run', choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument('--api-url', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_child(args.run, args.api_url, int(args.pages), args.max_in_flight)))
+        return
+
+    scenarios = args.scenarios.split(",")
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f"unknown scenario '{scenario}', expected one of {', '.join(SCENARIOS)}")
+
+    results = []
+    print(f"{'Scenario':<12}{'Pages':>8}{'Seconds':>10}{'Pages/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'Peak RSS':>12}")
+    for scenario in scenarios:
+        for pages in [int(value) for value in args.pages.split(",")]:
+            result = bench(scenario, pages, args.latency, args.max_in_flight)
+            results.append(result)
+            rss = f"{result['peak_rss_mb']:>10.1f}MB" if result["peak_rss_mb"] is not None else f"{'-':>12}"
+            print(f"{scenario:<12}{pages:>8}{result['seconds']:>10.3f}{result['pages_per_second']:>10.1f}"
+                  f"{result['p50_ms']:>10.2f}{result['p99_ms']:>10.2f}{rss}")
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            "version": RESULTS_VERSION,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "latency": args.latency,
+            "max_in_flight": args.max_in_flight,
+            "results": results
+        }, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+    if args.compare and not compare(results, args.compare, args.max_regression):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Fault Scenario Suite
+Runs the submission bots against the mock MediaWiki API under each fault
+profile (lagged replicas, throttling, token churn, dropped connections, slow
+responses) and measures how well their retry paths cope:
+
+- success rate: share of pages saved
+- wasted round trips: requests beyond what the saved pages needed on a
+  clean wiki, so requests spent on failed pages count as wasted
+- retry delay: total time the bots slept before retrying
+- paced: total time requests waited for the adaptive rate limiter
+
+Delays are recorded but skipped by default, so a suite run takes seconds;
+pass --real-sleep to wait them out. Profiles whose faults depend on the
+request rate, such as "overloaded", always wait and only run when named
+with --profiles.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+from typing import Any, Dict, List
+from unittest.mock import patch
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from bench_end_to_end import write_pages
+from mock_mediawiki import FAULT_PROFILES, MockMediaWiki
+from wiki_automated_submission import StandardWikiBot
+from wiki_metrics import get_metrics
+from wiki_secure_submission import EnhancedSecureWikiBot
+
+SCENARIOS = ("manifest", "standard", "secure")
+
+# Profiles that measure pacing, so delays cannot be skipped
+REAL_TIME_PROFILES = ("overloaded",)
+
+
+class SleepRecorder:
+    def __init__(self, real: bool = False):
+        """
+        Initialize the SleepRecorder.
+
+        Args:
+            real: Actually wait for the recorded delays
+        """
+        self.real = real
+        self.delays = []
+        self.skipped = 0.0
+        self.time_sleep = time.sleep
+        self.time_monotonic = time.monotonic
+        self.asyncio_sleep = asyncio.sleep
+
+    def sleep(self, seconds: float) -> None:
+        """Stand-in for time.sleep()."""
+        self.delays.append(seconds)
+        if self.real:
+            self.time_sleep(seconds)
+        else:
+            self.skipped += seconds
+
+    def monotonic(self) -> float:
+        """Stand-in for time.monotonic() that counts skipped delays as time passed, for the rate limiter."""
+        return self.time_monotonic() + self.skipped
+
+    async def async_sleep(self, seconds: float, result: Any = None) -> Any:
+        """Stand-in for asyncio.sleep(), used by the async submission engine's retries."""
+        self.delays.append(seconds)
+        return await self.asyncio_sleep(seconds if self.real else 0, result)
+
+
+def submit_manifest(api_url: str, manifest: List[Dict[str, str]]) -> List[str]:
+    """Submit the pages as one manifest batch; returns one error message per failed page."""
+    bot = StandardWikiBot()
+    bot.username = "TestUser"
+    bot.password = "TestPassword"
+    try:
+        results = bot.submit_manifest(api_url, manifest, max_in_flight=4)
+    except Exception as e:
+        # Login failed, so every page did
+        return [str(e)] * len(manifest)
+    return [result["error"] for result in results if result["status"] == "failed"]
+
+
+def submit_standard(api_url: str, manifest: List[Dict[str, str]]) -> List[str]:
+    """Submit the pages one run of wiki_automated_submission.py at a time."""
+    errors = []
+    for entry in manifest:
+        bot = StandardWikiBot()
+        bot.username = "TestUser"
+        bot.password = "TestPassword"
+        try:
+            bot.submit_content(api_url, entry["title"], entry["content_file"], entry["summary"])
+        except Exception as e:
+            errors.append(str(e))
+    return errors
+
+
+def submit_secure(api_url: str, manifest: List[Dict[str, str]]) -> List[str]:
+    """Submit the pages one run of wiki_secure_submission.py at a time, with scripted credentials."""
+    errors = []
+    with patch('builtins.input', return_value="TestUser"), patch('getpass.getpass', return_value="TestPassword"):
+        for entry in manifest:
+            bot = EnhancedSecureWikiBot()
+            bot.set_wiki_config({"name": "Fault Wiki", "api_url": api_url})
+            try:
+                bot.submit_content(entry["title"], entry["content_file"], entry["summary"])
+            except Exception as e:
+                errors.append(str(e))
+    return errors
+
+
+def error_kind(error: str) -> str:
+    """Shorten an error message so failures of the same kind are counted together."""
+    # Drop the response dumps, URLs and numbers that differ between pages
+    error = error.split(". Response:")[0].split(" for url:")[0]
+    return re.sub(r"\d+", "N", error)[:90]
+
+
+SUBMITTERS = {"manifest": submit_manifest, "standard": submit_standard, "secure": submit_secure}
+
+
+def run_scenario(profile: str, scenario: str, manifest: List[Dict[str, str]], real_sleep: bool) -> Dict[str, Any]:
+    """Submit the manifest with one bot against a fresh wiki with one fault profile."""
+    recorder = SleepRecorder(real_sleep or profile in REAL_TIME_PROFILES)
+    with MockMediaWiki(faults=FAULT_PROFILES[profile]) as wiki, \
+            patch('time.sleep', recorder.sleep), patch('asyncio.sleep', recorder.async_sleep), \
+            patch('wiki_rate_limiter.time', recorder), \
+            redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+        start = time.perf_counter()
+        errors = SUBMITTERS[scenario](wiki.api_url, manifest)
+        elapsed = time.perf_counter() - start
+    # Every run has its own wiki URL, so its own metrics and rate limiter
+    summary = get_metrics().to_summary()["wikis"].get(wiki.api_url, {})
+    paced = (summary.get("pacing") or {}).get("waited_seconds", 0.0)
+    return {
+        "profile": profile,
+        "scenario": scenario,
+        "pages": len(manifest),
+        "saved": len(manifest) - len(errors),
+        "requests": wiki.request_count,
+        "faults": dict(wiki.fault_counts),
+        "retries": sum(summary.get("retries", {}).values()),
+        "retry_delay": round(sum(recorder.delays) - paced, 3),
+        "paced": round(paced, 3),
+        "seconds": round(elapsed, 3),
+        "errors": dict(Counter(error_kind(error) for error in errors).most_common(3))
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the bots\' retry paths under injected faults')
+    parser.add_argument('--profiles',
+                        default=",".join(profile for profile in FAULT_PROFILES if profile not in REAL_TIME_PROFILES),
+                        help=f'Comma-separated fault profiles (default: all but {", ".join(REAL_TIME_PROFILES)})')
+    parser.add_argument('--scenarios', default=",".join(SCENARIOS),
+                        help=f'Comma-separated scenarios: {", ".join(SCENARIOS)} (default: all)')
+    parser.add_argument('--pages', type=int, default=30, help='Pages per run')
+    parser.add_argument('--real-sleep', action='store_true', help='Wait out retry delays instead of skipping them')
+    parser.add_argument('--output', help='Also save the results as JSON')
+    args = parser.parse_args()
+
+    profiles = args.profiles.split(",")
+    scenarios = args.scenarios.split(",")
+    for profile in profiles:
+        if profile not in FAULT_PROFILES:
+            parser.error(f"unknown profile '{profile}', expected one of {', '.join(FAULT_PROFILES)}")
+    for scenario in scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f"unknown scenario '{scenario}', expected one of {', '.join(SCENARIOS)}")
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        manifest = write_pages(temp_dir, args.pages)
+        # Round trips per saved page without faults, the baseline for wasted round trips
+        clean = {scenario: run_scenario("clean", scenario, manifest, False) for scenario in scenarios}
+        results = []
+        print(f"{'Profile':<15}{'Scenario':<10}{'Saved':>8}{'Requests':>10}{'Wasted':>8}{'Retries':>9}"
+              f"{'Delay s':>9}{'Paced s':>9}{'Seconds':>9}")
+        for profile in profiles:
+            for scenario in scenarios:
+                result = clean[scenario] if profile == "clean" else \
+                    run_scenario(profile, scenario, manifest, args.real_sleep)
+                needed = clean[scenario]["requests"] / clean[scenario]["saved"] * result["saved"]
+                result["wasted_requests"] = max(0, round(result["requests"] - needed))
+                results.append(result)
+                print(f"{profile:<15}{scenario:<10}{result['saved'] / result['pages']:>8.0%}{result['requests']:>10}"
+                      f"{result['wasted_requests']:>8}{result['retries']:>9}{result['retry_delay']:>9.1f}"
+                      f"{result['paced']:>9.1f}{result['seconds']:>9.2f}")
+    finally:
+        shutil.rmtree(temp_dir)
+
+    failures = [result for result in results if result["errors"]]
+    if failures:
+        print("\nMost common failures:")
+        for result in failures:
+            for error, count in result["errors"].items():
+                print(f"  {result['profile']}/{result['scenario']}: {count} x {error}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({"pages": args.pages, "real_sleep": args.real_sleep, "results": results}, f, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
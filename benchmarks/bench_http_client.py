@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+HTTP Client Benchmark
+Compares requests/sec of the pooled WikiHttpClient against the previous
+one-curl-process-per-call approach, using the local mock MediaWiki API.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from mock_mediawiki import MockMediaWiki
+from wiki_http_client import WikiHttpClient
+
+TOKEN_QUERY = {"action": "query", "meta": "tokens", "type": "csrf", "format": "json"}
+
+
+def bench_curl(api_url: str, requests_count: int) -> float:
+    """Issue requests the way run_curl_command used to: one curl process and cookie file round trip per call."""
+    cookies_file = os.path.join(tempfile.mkdtemp(), "cookies.txt")
+    start = time.perf_counter()
+    for index in range(requests_count):
+        cmd = ["curl", "-s", "-X", "POST", api_url]
+        if index == 0:
+            cmd.extend(["-c", cookies_file])
+        else:
+            cmd.extend(["-b", cookies_file, "-c", cookies_file])
+        for key, value in TOKEN_QUERY.items():
+            cmd.extend(["-d", f"{key}={value}"])
+        cmd.extend(["--connect-timeout", "30", "--max-time", "120"])
+        process = subprocess.run(cmd, capture_output=True, text=True, check=True)
+        json.loads(process.stdout)
+    elapsed = time.perf_counter() - start
+    shutil.rmtree(os.path.dirname(cookies_file), ignore_errors=True)
+    return elapsed
+
+
+def bench_client(api_url: str, requests_count: int) -> float:
+    """Issue requests over a single pooled keep-alive session."""
+    client = WikiHttpClient()
+    start = time.perf_counter()
+    for _ in range(requests_count):
+        client.post_json(api_url, TOKEN_QUERY)
+    elapsed = time.perf_counter() - start
+    client.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pooled HTTP client against per-call curl')
+    parser.add_argument('--requests', type=int, default=200, help='Number of API requests per run')
+    parser.add_argument('--latency', type=float, default=0.0, help='Artificial server latency in seconds')
+    args = parser.parse_args()
+
+    with MockMediaWiki(latency=args.latency) as wiki:
+        results = {}
+        if shutil.which("curl"):
+            results["curl"] = bench_curl(wiki.api_url, args.requests)
+        else:
+            print("curl not found, skipping the curl baseline", file=sys.stderr)
+        results["pooled_client"] = bench_client(wiki.api_url, args.requests)
+
+    print(f"{'Transport':<16}{'Requests':>10}{'Seconds':>10}{'Req/s':>10}")
+    for name, elapsed in results.items():
+        print(f"{name:<16}{args.requests:>10}{elapsed:>10.3f}{args.requests / elapsed:>10.1f}")
+    if "curl" in results:
+        print(f"\nSpeedup: {results['curl'] / results['pooled_client']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Validation Rule Evaluator Micro-benchmarks
+Times the pieces of rule evaluation separately: compiling a rule set, the
+cached lookups that avoid recompiling, and evaluating each rule type on a
+typical page.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from wiki_config_manager import WikiConfigManager
+from wiki_rules import compile_rules, get_rule_set
+
+RULES = {
+    "related_articles": "{{Related articles",
+    "note_box": "{{Note|",
+    "categories": "[[Category:",
+    "no_duplicate_numbering": {"type": "literal", "pattern": "===1. ", "negate": True},
+    "heading_style": {"type": "regex", "pattern": "(?m)^== [^=]+ ==$"},
+    "section_count": {"type": "count", "pattern": "==", "min": 2, "max": 500},
+    "ref_count": {"type": "count", "pattern": "<ref[ >]", "regex": True, "max": 100}
+}
+
+
+def build_page(size_kb: int) -> str:
+    """Generate wikitext of roughly the given size."""
+    section = ("== Section ==\nSome text with a [[Link]] and a {{Template|x}}.<ref>Source</ref>\n"
+               "=== Subsection ===\n* item\n* item\n\n")
+    return "{{Related articles|Foo}}\n" + section * (size_kb * 1024 // len(section)) + "[[Category:Test]]\n"
+
+
+def rules_of_type(rule_type: str) -> dict:
+    """Select the configured rules of one type; plain strings are literal rules."""
+    return {name: spec for name, spec in RULES.items()
+            if (spec.get("type") if isinstance(spec, dict) else "literal") == rule_type}
+
+
+def report(name: str, number: int, seconds: float) -> None:
+    print(f"{name:<40}{number:>10}{seconds / number * 1e6:>14.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmark the validation rule evaluator')
+    parser.add_argument('--page-size', type=int, default=100, help='Page size in kilobytes')
+    parser.add_argument('--number', type=int, default=200, help='Iterations of each page-sized benchmark')
+    args = parser.parse_args()
+
+    page = build_page(args.page_size)
+    temp_dir = tempfile.mkdtemp()
+    config_file = os.path.join(temp_dir, "wiki_config.json")
+    with open(config_file, 'w') as f:
+        json.dump({"default_wiki": "bench", "wikis": {"bench": {"name": "Bench", "validation_rules": RULES}}}, f)
+    config_manager = WikiConfigManager(config_file=config_file, user_config_file=os.path.join(temp_dir, "none.json"),
+                                       use_disk_cache=False)
+    config_manager.get_validation_rules("bench")
+
+    print(f"Page size: {len(page) / 1024:.0f} KB, {len(RULES)} rules\n")
+    print(f"{'Benchmark':<40}{'Iterations':>10}{'us/iteration':>14}")
+
+    lookups = 20000
+    report("compile_rules (cold)", 2000, timeit.timeit(lambda: compile_rules(RULES), number=2000))
+    report("get_rule_set (cached by content)", lookups, timeit.timeit(lambda: get_rule_set(RULES), number=lookups))
+    report("get_validation_rules (cached by id)", lookups,
+           timeit.timeit(lambda: config_manager.get_validation_rules("bench"), number=lookups))
+
+    for rule_type in ["literal", "regex", "count"]:
+        rule_set = compile_rules(rules_of_type(rule_type))
+        report(f"evaluate {rule_type} rules ({len(rule_set)})", args.number,
+               timeit.timeit(lambda: rule_set.evaluate(page), number=args.number))
+
+    rule_set = config_manager.get_validation_rules("bench")
+    report(f"evaluate all rules ({len(rule_set)})", args.number,
+           timeit.timeit(lambda: rule_set.evaluate(page), number=args.number))
+
+    shutil.rmtree(temp_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Validation Rule Matching Benchmark
+Compares one substring scan per rule with the compiled PatternMatcher, using
+both of its strategies, on multi-megabyte wikitext pages.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+
+from wiki_rules import PatternMatcher, SINGLE_PASS_MIN_PATTERNS
+
+WORDS = ["lorem", "ipsum", "dolor", "sit", "amet", "[[Link]]", "{{Template|x}}", "== Heading ==",
+         "=== Section ===", "* item", "# step", "<ref>Source</ref>", "'''bold'''"]
+
+RULE_PREFIXES = ["{{Related articles", "{{Note|", "===1. ", "{{Infobox", "==References==", "[[Category:",
+                 "==See also==", "{{Book nav", "<poem>", "{{Quote box", "__NOTOC__", "{{Cite web|",
+                 "[[File:", "<ref name=", "{{Main|", "==External links=="]
+
+
+def build_page(size_mb: float, seed: int = 1) -> str:
+    """Generate wikitext of roughly the given size in which none of the rules occur."""
+    rng = random.Random(seed)
+    lines = []
+    length = 0
+    while length < size_mb * 1024 * 1024:
+        line = " ".join(rng.choice(WORDS) for _ in range(12))
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)
+
+
+def build_rules(count: int) -> list:
+    """Generate realistic rule patterns, numbered once the base list runs out."""
+    rules = []
+    for index in range(count):
+        prefix = RULE_PREFIXES[index % len(RULE_PREFIXES)]
+        # Number inside the markup so variants do not contain each other
+        rules.append(prefix if index < len(RULE_PREFIXES) else prefix[:2] + str(index) + prefix[2:])
+    return rules
+
+
+def best_of(repeat: int, func, *args) -> float:
+    """Run func repeatedly and return the fastest time in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def naive_scan(patterns: list, text: str) -> set:
+    """The original approach: one `in` scan per rule."""
+    return {pattern for pattern in patterns if pattern in text}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark validation rule matching')
+    parser.add_argument('--size', type=float, default=4.0, help='Page size in megabytes')
+    parser.add_argument('--rules', default='4,12,24,48,96', help='Comma-separated rule counts to compare')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, the fastest is reported')
+    args = parser.parse_args()
+
+    page = build_page(args.size)
+    print(f"Page size: {len(page) / 1024 / 1024:.1f} MB, none of the rules present (worst case)")
+    print(f"Default strategy switches to a single pass at {SINGLE_PASS_MIN_PATTERNS} rules\n")
+    print(f"{'Rules':<8}{'Per-rule in':>14}{'Scans':>10}{'Single pass':>14}{'Default':>10}")
+    for count in [int(value) for value in args.rules.split(",")]:
+        patterns = build_rules(count)
+        scans = PatternMatcher(patterns, single_pass=False)
+        single = PatternMatcher(patterns, single_pass=True)
+        default = PatternMatcher(patterns)
+        expected = naive_scan(patterns, page)
+        if scans.find(page) != expected or single.find(page) != expected:
+            raise RuntimeError("Matcher results differ from the per-rule scan")
+        # Warm the regex cache, as repeated validations would
+        single.find(page)
+        default.find(page)
+        print(f"{count:<8}{best_of(args.repeat, naive_scan, patterns, page):>13.3f}s"
+              f"{best_of(args.repeat, scans.find, page):>9.3f}s"
+              f"{best_of(args.repeat, single.find, page):>13.3f}s"
+              f"{best_of(args.repeat, default.find, page):>9.3f}s")
+
+
+if __name__ == "__main__":
+    main()
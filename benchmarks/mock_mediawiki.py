@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+Mock MediaWiki API
+A small in-process stand-in for a MediaWiki api.php endpoint used by the
+benchmarks and tests. It implements the token, login, edit and query calls
+the submission bots rely on and speaks keep-alive HTTP/1.1.
+
+A FaultProfile makes it misbehave like a busy production wiki: lagged
+replicas, throttling, rate limits, rejected tokens, slow responses and
+connections dropped mid-response. See FAULT_PROFILES for named profiles.
+"""
+
+import hashlib
+import json
+import math
+import random
+import re
+import secrets
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, Optional
+from urllib.parse import parse_qsl, urlsplit
+
+SESSION_COOKIE = "mockwiki_session"
+
+REDIRECT_PATTERN = re.compile(r"#REDIRECT\s*\[\[([^\]|#]+)", re.IGNORECASE)
+
+
+class FaultProfile:
+    def __init__(self, latency: float = 0.0, latency_sigma: float = 0.0, slow_rate: float = 0.0,
+                 slow_latency: float = 2.0, maxlag_rate: float = 0.0, lag: int = 5, throttle_rate: float = 0.0,
+                 retry_after: int = 2, ratelimit_rate: float = 0.0, wrongtoken_rate: float = 0.0,
+                 token_ttl: Optional[float] = None, disconnect_rate: float = 0.0, capacity: Optional[float] = None,
+                 seed: Optional[int] = 0):
+        """
+        Initialize the FaultProfile. Rates are the share of requests, between 0 and 1, that get the fault.
+
+        Args:
+            latency: Median delay in seconds added to every response
+            latency_sigma: Spread of the log-normal delay distribution around the median; 0 for a fixed delay
+            slow_rate: Share of responses delayed by slow_latency on top, for a long tail
+            slow_latency: Delay in seconds of the slow responses
+            maxlag_rate: Share of requests that find the replicas lagged by lag seconds. They fail
+                with a maxlag error unless their maxlag parameter allows that much lag. Unlike a real
+                wiki, requests without a maxlag parameter fail too, so every bot sees the errors.
+            lag: Replication lag in seconds reported by maxlag errors
+            throttle_rate: Share of requests refused with HTTP 429 and a Retry-After header, as by a
+                front-end cache or proxy
+            retry_after: Seconds in the Retry-After header of throttled requests
+            ratelimit_rate: Share of edits refused with a ratelimited error
+            wrongtoken_rate: Share of logins answered with WrongToken
+            token_ttl: Seconds after which a CSRF token is rejected with badtoken and replaced, None
+                for tokens that never expire
+            disconnect_rate: Share of requests whose response is cut off halfway through the body,
+                after the request took effect
+            capacity: Requests per second the replicas keep up with, None for no limit. Every
+                request served adds 1/capacity seconds of replication lag, which drains in real
+                time; requests whose maxlag parameter is below the lag get maxlag errors.
+            seed: Seed of the random faults, None for a different run every time
+        """
+        self.latency = latency
+        self.latency_sigma = latency_sigma
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.maxlag_rate = maxlag_rate
+        self.lag = lag
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.ratelimit_rate = ratelimit_rate
+        self.wrongtoken_rate = wrongtoken_rate
+        self.token_ttl = token_ttl
+        self.disconnect_rate = disconnect_rate
+        self.capacity = capacity
+        self.seed = seed
+
+    def delay(self, rng: random.Random) -> float:
+        """Draw the delay of one response."""
+        delay = self.latency
+        if delay and self.latency_sigma:
+            delay = rng.lognormvariate(math.log(delay), self.latency_sigma)
+        if self.slow_rate and rng.random() < self.slow_rate:
+            delay += self.slow_latency
+        return delay
+
+
+# Fault profiles of the scenario suite (benchmarks/bench_faults.py), by name
+FAULT_PROFILES = {
+    "clean": FaultProfile(),
+    "lagged": FaultProfile(maxlag_rate=0.3, lag=8),
+    "throttled": FaultProfile(throttle_rate=0.15, retry_after=2, ratelimit_rate=0.1),
+    "token-churn": FaultProfile(wrongtoken_rate=0.3, token_ttl=0.05),
+    "flaky-network": FaultProfile(disconnect_rate=0.1),
+    "slow": FaultProfile(latency=0.01, latency_sigma=0.8, slow_rate=0.02, slow_latency=1.0),
+    "hostile": FaultProfile(latency=0.005, latency_sigma=0.5, maxlag_rate=0.1, lag=6, throttle_rate=0.05,
+                            ratelimit_rate=0.05, wrongtoken_rate=0.1, token_ttl=0.2, disconnect_rate=0.05),
+    # Lags once the bots send more than 20 requests per second; run with --real-sleep
+    "overloaded": FaultProfile(capacity=20)
+}
+
+
+def normalize_text(text: str) -> str:
+    """Normalize line endings and strip trailing whitespace, as MediaWiki does on save."""
+    return text.replace("\r\n", "\n").replace("\r", "\n").rstrip(" \t\n\r\0\x0b")
+
+
+def parse_multipart(body: bytes, content_type: str) -> Dict[str, str]:
+    """Parse a multipart/form-data body into its text fields."""
+    boundary = content_type.split("boundary=", 1)[1].strip('"')
+    fields = {}
+    for part in body.split(b"--" + boundary.encode("ascii"))[1:]:
+        if part.startswith(b"--"):
+            break
+        headers, _, value = part[2:].partition(b"\r\n\r\n")
+        name = re.search(rb'name="([^"]*)"', headers).group(1).decode("utf-8")
+        fields[name] = value[:-2].decode("utf-8")
+    return fields
+
+
+def normalize_title(title: str) -> str:
+    """Normalize a page title the way MediaWiki does: spaces for underscores and a capital first letter."""
+    title = title.replace("_", " ").strip()
+    return title[:1].upper() + title[1:]
+
+
+class MockMediaWiki:
+    def __init__(self, users: Optional[Dict[str, str]] = None, latency: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0, faults: Optional[FaultProfile] = None):
+        """
+        Initialize the mock wiki.
+
+        Args:
+            users: Mapping of usernames to passwords accepted by action=login
+            latency: Artificial delay in seconds added to every response
+            host: Interface to listen on
+            port: Port to listen on, 0 picks a free port
+            faults: Faults to inject, none by default
+        """
+        self.users = users if users is not None else {"TestUser": "TestPassword"}
+        self.latency = latency
+        self.faults = faults or FaultProfile()
+        self.random = random.Random(self.faults.seed)
+        # Injected faults by kind, e.g. "maxlag" or "disconnect"
+        self.fault_counts = {}
+        # Replication lag in seconds built up by requests beyond the capacity
+        self.backlog = 0.0
+        self.backlog_updated = time.monotonic()
+        # Bound now, so a benchmark that replaces time.sleep to skip the
+        # client's retry delays leaves the server's delays real
+        self.sleep = time.sleep
+        self.pages = {}
+        self.revisions = {}
+        self.sessions = {}
+        self.request_count = 0
+        self.action_counts = {}
+        self.next_revid = 1
+        # Users granted apihighlimits (500 instead of 50 titles per query)
+        self.high_limit_users = set()
+        # Maximum number of page texts per query response before continuing, None for no limit
+        self.content_batch = None
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def api_url(self) -> str:
+        """URL of the mock api.php endpoint."""
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/api.php"
+
+    def start(self) -> "MockMediaWiki":
+        """Start serving requests on a background thread."""
+        self.thread = threading.Thread(target=self.server.serve_forever, kwargs={"poll_interval": 0.05},
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop the server and close its socket."""
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "MockMediaWiki":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def set_page(self, title: str, text: str) -> int:
+        """
+        Create or replace a page directly, bypassing the API.
+
+        Returns:
+            The revision ID of the stored text
+        """
+        with self.lock:
+            return self._store_page(title, text)
+
+    def expire_tokens(self) -> None:
+        """Invalidate the CSRF token of every session, as when a server-side session rotates."""
+        with self.lock:
+            for session in self.sessions.values():
+                if session["csrftoken"] is not None:
+                    session["csrftoken"] = secrets.token_hex(16) + "+\\"
+                    session["csrftoken_issued"] = time.monotonic()
+
+    def expire_sessions(self) -> None:
+        """Log every session out, as when sessions time out on the server; cookies stay valid."""
+        with self.lock:
+            for session in self.sessions.values():
+                session["user"] = None
+                session["csrftoken"] = None
+
+    def _store_page(self, title: str, text: str, user: Optional[str] = None) -> int:
+        title = normalize_title(title)
+        text = normalize_text(text)
+        revid = self.next_revid
+        self.next_revid += 1
+        page = self.pages.setdefault(title, {"pageid": len(self.pages) + 1})
+        page["text"] = text
+        page["revid"] = revid
+        page["sha1"] = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        page["size"] = len(text.encode("utf-8"))
+        self.revisions[revid] = {"title": title, "pageid": page["pageid"], "text": text, "revid": revid,
+                                 "sha1": page["sha1"], "size": page["size"], "user": user}
+        return revid
+
+    def _make_handler(self):
+        wiki = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are separate writes; avoid Nagle/delayed-ACK stalls on keep-alive
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                self._dispatch(dict(parse_qsl(urlsplit(self.path).query, keep_blank_values=True)))
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length)
+                params = dict(parse_qsl(urlsplit(self.path).query, keep_blank_values=True))
+                content_type = self.headers.get("Content-Type", "")
+                if content_type.startswith("multipart/form-data"):
+                    params.update(parse_multipart(body, content_type))
+                else:
+                    params.update(parse_qsl(body.decode("utf-8"), keep_blank_values=True))
+                self._dispatch(params)
+
+            def _dispatch(self, params):
+                with wiki.lock:
+                    delay = wiki.latency + wiki.faults.delay(wiki.random)
+                if delay:
+                    wiki.sleep(delay)
+                session_id = self._session_id()
+                with wiki.lock:
+                    if wiki._inject("throttle", wiki.faults.throttle_rate):
+                        wiki.request_count += 1
+                        self._send(429, b"Too many requests", "text/plain; charset=utf-8", session_id,
+                                   {"Retry-After": str(wiki.faults.retry_after)})
+                        return
+                    if session_id not in wiki.sessions:
+                        session_id = secrets.token_hex(8)
+                        wiki.sessions[session_id] = {"user": None, "logintoken": None, "csrftoken": None}
+                    result = wiki.handle_api(params, wiki.sessions[session_id])
+                    disconnect = wiki._inject("disconnect", wiki.faults.disconnect_rate)
+                headers = {}
+                if result.get("error", {}).get("code") == "maxlag":
+                    # As sent by ApiMain
+                    headers = {"Retry-After": str(max(int(float(params.get("maxlag", 0))), 5)),
+                               "X-Database-Lag": str(result["error"]["lag"])}
+                payload = json.dumps(result).encode("utf-8")
+                self._send(200, payload, "application/json; charset=utf-8", session_id, headers, disconnect)
+
+            def _send(self, status, payload, content_type, session_id, headers, disconnect=False):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                if session_id:
+                    self.send_header("Set-Cookie", f"{SESSION_COOKIE}={session_id}; Path=/")
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                if disconnect:
+                    # Half the promised body, then a dropped connection
+                    self.wfile.write(payload[:len(payload) // 2])
+                    self.wfile.flush()
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    self.close_connection = True
+                    return
+                self.wfile.write(payload)
+
+            def _session_id(self):
+                for cookie in self.headers.get("Cookie", "").split(";"):
+                    name, _, value = cookie.strip().partition("=")
+                    if name == SESSION_COOKIE:
+                        return value
+                return None
+
+        return Handler
+
+    def _inject(self, fault: str, rate: float) -> bool:
+        """Decide whether to inject a fault, counting it. Called with the wiki lock held."""
+        if not rate or self.random.random() >= rate:
+            return False
+        self.fault_counts[fault] = self.fault_counts.get(fault, 0) + 1
+        return True
+
+    def handle_api(self, params: Dict[str, str], session: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Handle a single API call. Called with the wiki lock held.
+
+        Args:
+            params: The merged query string and form parameters
+            session: Mutable state of the caller's session
+
+        Returns:
+            The JSON-serialisable API response
+        """
+        action = params.get("action")
+        self.request_count += 1
+        self.action_counts[action] = self.action_counts.get(action, 0) + 1
+
+        maxlag = float(params.get("maxlag", -1))
+        if maxlag < self.faults.lag and self._inject("maxlag", self.faults.maxlag_rate):
+            return self._maxlag_error(self.faults.lag)
+        if self.faults.capacity:
+            now = time.monotonic()
+            self.backlog = max(0.0, self.backlog - (now - self.backlog_updated))
+            self.backlog_updated = now
+            lag = int(self.backlog)
+            if lag and maxlag < lag:
+                self.fault_counts["maxlag"] = self.fault_counts.get("maxlag", 0) + 1
+                return self._maxlag_error(lag)
+            self.backlog += 1 / self.faults.capacity
+
+        if action == "query":
+            return self._handle_query(params, session)
+        if action == "login":
+            return self._handle_login(params, session)
+        if action == "edit":
+            return self._handle_edit(params, session)
+        return self._error("badvalue", f"Unrecognized value for parameter \"action\": {action}.")
+
+    def _maxlag_error(self, lag: int) -> Dict[str, Any]:
+        return {"error": {"code": "maxlag", "info": f"Waiting for 10.0.0.1: {lag} seconds lagged.",
+                          "host": "10.0.0.1", "lag": lag}}
+
+    def _error(self, code: str, info: str) -> Dict[str, Any]:
+        return {"error": {"code": code, "info": info}}
+
+    def _handle_query(self, params: Dict[str, str], session: Dict[str, Any]) -> Dict[str, Any]:
+        if params.get("meta") == "tokens":
+            token_type = params.get("type", "csrf")
+            if token_type == "login":
+                session["logintoken"] = secrets.token_hex(16) + "+\\"
+                return {"batchcomplete": "", "query": {"tokens": {"logintoken": session["logintoken"]}}}
+            if session["user"] is None:
+                # Anonymous sessions get the fixed anonymous token, as on a real wiki
+                return {"batchcomplete": "", "query": {"tokens": {"csrftoken": "+\\"}}}
+            if session["csrftoken"] is None:
+                session["csrftoken"] = secrets.token_hex(16) + "+\\"
+                session["csrftoken_issued"] = time.monotonic()
+            return {"batchcomplete": "", "query": {"tokens": {"csrftoken": session["csrftoken"]}}}
+
+        if params.get("meta") == "userinfo":
+            rights = ["read", "edit"]
+            if session["user"] in self.high_limit_users:
+                rights.append("apihighlimits")
+            userinfo = {"id": 1 if session["user"] else 0, "name": session["user"] or "127.0.0.1"}
+            if "rights" in params.get("uiprop", "").split("|"):
+                userinfo["rights"] = rights
+            return {"batchcomplete": "", "query": {"userinfo": userinfo}}
+
+        if params.get("prop") == "revisions" and "revids" in params:
+            return self._query_revids(params)
+
+        if params.get("prop") == "revisions":
+            return self._query_revisions(params, session)
+
+        return self._error("badvalue", "Unsupported query.")
+
+    def _query_revids(self, params: Dict[str, str]) -> Dict[str, Any]:
+        rvprop = params.get("rvprop", "ids|timestamp|flags|comment|user").split("|")
+        pages, badrevids = {}, {}
+        for value in params["revids"].split("|"):
+            revision = self.revisions.get(int(value))
+            if revision is None:
+                badrevids[value] = {"revid": int(value), "missing": ""}
+                continue
+            page = pages.setdefault(str(revision["pageid"]), {"pageid": revision["pageid"], "ns": 0,
+                                                              "title": revision["title"], "revisions": []})
+            page["revisions"].append(self._revision(revision, rvprop))
+        query = {"pages": pages}
+        if badrevids:
+            query["badrevids"] = badrevids
+        return {"batchcomplete": "", "query": query}
+
+    def _query_revisions(self, params: Dict[str, str], session: Dict[str, Any]) -> Dict[str, Any]:
+        titles = params.get("titles", "").split("|")
+        limit = 500 if session["user"] in self.high_limit_users else 50
+        if len(titles) > limit:
+            return self._error("toomanyvalues",
+                               f"Too many values supplied for parameter \"titles\". The limit is {limit}.")
+
+        normalized, redirects, resolved = [], [], []
+        for title in titles:
+            name = normalize_title(title)
+            if name != title and {"from": title, "to": name} not in normalized:
+                normalized.append({"from": title, "to": name})
+            if "redirects" in params and name in self.pages:
+                match = REDIRECT_PATTERN.match(self.pages[name]["text"])
+                if match:
+                    target = normalize_title(match.group(1))
+                    if {"from": name, "to": target} not in redirects:
+                        redirects.append({"from": name, "to": target})
+                    name = target
+            if name not in resolved:
+                resolved.append(name)
+
+        rvprop = params.get("rvprop", "ids|timestamp|flags|comment|user").split("|")
+        # Page texts are split across continuations, like $wgAPIMaxResultSize on a real wiki
+        start = int(params.get("rvcontinue", 0))
+        end = len(resolved)
+        if "content" in rvprop and self.content_batch:
+            end = min(end, start + self.content_batch)
+
+        pages = {}
+        for index, name in enumerate(resolved):
+            page = self.pages.get(name)
+            if page is None:
+                pages[str(-1 - index)] = {"ns": 0, "title": name, "missing": ""}
+                continue
+            pages[str(page["pageid"])] = {"pageid": page["pageid"], "ns": 0, "title": name}
+            if start <= index < end:
+                pages[str(page["pageid"])]["revisions"] = [self._revision(page, rvprop)]
+
+        query = {"pages": pages}
+        if normalized:
+            query["normalized"] = normalized
+        if redirects:
+            query["redirects"] = redirects
+        if end < len(resolved):
+            return {"continue": {"rvcontinue": str(end), "continue": "||"}, "query": query}
+        return {"batchcomplete": "", "query": query}
+
+    def _revision(self, page: Dict[str, Any], rvprop: list) -> Dict[str, Any]:
+        revision = {}
+        if "ids" in rvprop:
+            revision["revid"] = page["revid"]
+        if "size" in rvprop:
+            revision["size"] = page["size"]
+        if "sha1" in rvprop:
+            revision["sha1"] = page["sha1"]
+        if "content" in rvprop:
+            revision["*"] = page["text"]
+        return revision
+
+    def _handle_login(self, params: Dict[str, str], session: Dict[str, Any]) -> Dict[str, Any]:
+        if not session["logintoken"] or params.get("lgtoken") != session["logintoken"]:
+            return {"login": {"result": "WrongToken"}}
+        if self._inject("wrongtoken", self.faults.wrongtoken_rate):
+            return {"login": {"result": "WrongToken"}}
+        username = params.get("lgname")
+        if username not in self.users or self.users[username] != params.get("lgpassword"):
+            return {"login": {"result": "Failed", "reason": "Incorrect username or password entered."}}
+        session["user"] = username
+        session["csrftoken"] = None
+        return {"login": {"result": "Success", "lguserid": 1, "lgusername": username}}
+
+    def _handle_edit(self, params: Dict[str, str], session: Dict[str, Any]) -> Dict[str, Any]:
+        # Checked before the token, as by MediaWiki
+        if params.get("assert") == "user" and session["user"] is None:
+            return self._error("assertuserfailed", "You are no longer logged in, so the action could not be completed.")
+        if session["user"] is None:
+            # Logged out sessions edit with the anonymous token, as an IP address
+            if params.get("token") != "+\\":
+                return self._error("badtoken", "Invalid CSRF token.")
+        elif params.get("token") != session["csrftoken"]:
+            return self._error("badtoken", "Invalid CSRF token.")
+        if self.faults.token_ttl is not None and session["user"] is not None and \
+                time.monotonic() - session.get("csrftoken_issued", 0) > self.faults.token_ttl:
+            self.fault_counts["tokenexpiry"] = self.fault_counts.get("tokenexpiry", 0) + 1
+            session["csrftoken"] = None
+            return self._error("badtoken", "Invalid CSRF token.")
+        if self._inject("ratelimited", self.faults.ratelimit_rate):
+            return self._error("ratelimited", "As an anti-abuse measure, you are limited from performing this "
+                                              "action too many times in a short space of time, and you have "
+                                              "exceeded this limit. Please try again in a few minutes.")
+        title = normalize_title(params.get("title", ""))
+        text = params.get("text", "")
+        page = self.pages.get(title)
+        if page is not None and page["text"] == normalize_text(text):
+            return {"edit": {"result": "Success", "pageid": page["pageid"], "title": title,
+                             "contentmodel": "wikitext", "nochange": ""}}
+        old_revid = page["revid"] if page else 0
+        new_revid = self._store_page(title, text, session["user"])
+        return {"edit": {"result": "Success", "pageid": self.pages[title]["pageid"], "title": title,
+                         "contentmodel": "wikitext", "oldrevid": old_revid, "newrevid": new_revid,
+                         "newtimestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}}
+
+
+def main():
+    """Run the mock wiki in the foreground."""
+    import argparse
+
+    parser = argparse.ArgumentParser(description='Mock MediaWiki API server')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--latency', type=float, default=0.0, help='Artificial latency per request in seconds')
+    parser.add_argument('--profile', choices=sorted(FAULT_PROFILES), default='clean',
+                        help='Fault profile to inject (default: clean)')
+    args = parser.parse_args()
+
+    wiki = MockMediaWiki(latency=args.latency, port=args.port, faults=FAULT_PROFILES[args.profile])
+    print(f"Mock MediaWiki API listening on {wiki.api_url}")
+    try:
+        wiki.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        wiki.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Wiki Async Submission Engine
+Runs many blocking wiki API jobs concurrently on an asyncio event loop, with
+a per-wiki limit on requests in flight and cooperative retry backoff.
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+from typing import Any, Callable, Dict, List, Optional
+
+from wiki_config_manager import DEFAULT_MAX_IN_FLIGHT
+from wiki_metrics import get_metrics
+from wiki_retry import RetryPolicy
+
+
+class AsyncSubmissionEngine:
+    def __init__(self, max_retries: int = 3, base_delay: float = 1.0,
+                 log_message: Optional[Callable[[str], None]] = None):
+        """
+        Initialize the AsyncSubmissionEngine.
+
+        Args:
+            max_retries: Attempts per job before giving up on retryable errors
+            base_delay: Shortest delay in seconds before a retry; see RetryPolicy.next_delay()
+            log_message: Optional logging callback taking a message string
+        """
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.retry_policy = RetryPolicy(max_attempts=max_retries, base_delay=base_delay)
+        self.log_message = log_message or (lambda message: None)
+        self.limits = {}
+
+    def set_limit(self, wiki_key: str, max_in_flight: int) -> None:
+        """
+        Set how many jobs may be in flight at once against one wiki.
+
+        Args:
+            wiki_key: Identifier of the wiki (wiki ID or API URL)
+            max_in_flight: Maximum number of concurrent jobs, at least 1
+        """
+        self.limits[wiki_key] = max(1, int(max_in_flight))
+
+    def is_transient_error(self, error: Exception) -> bool:
+        """Check whether a failed job is worth retrying later, see RetryPolicy.retry_reason()."""
+        # A rejected CSRF token is refreshed by the job itself, resending it as is cannot help
+        return self.retry_policy.retry_reason(error) not in (None, "badtoken")
+
+    async def _run_job(self, loop: asyncio.AbstractEventLoop, executor: concurrent.futures.Executor,
+                       semaphore: asyncio.Semaphore, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Run one job, releasing its wiki slot while it waits to retry."""
+        outcome = {"result": None, "error": None, "attempts": 0}
+        call = functools.partial(job["func"], *job.get("args", ()), **job.get("kwargs", {}))
+        delay = 0.0
+
+        while True:
+            outcome["attempts"] += 1
+            try:
+                async with semaphore:
+                    outcome["result"] = await loop.run_in_executor(executor, call)
+                return outcome
+            except Exception as e:
+                if outcome["attempts"] >= self.max_retries or not self.is_transient_error(e):
+                    outcome["error"] = e
+                    return outcome
+                delay = self.retry_policy.next_delay(delay, e)
+                reason = self.retry_policy.retry_reason(e)
+                self.log_message(f"Attempt {outcome['attempts']} for {job.get('name', 'job')} failed "
+                                 f"({reason}): {e}. Retrying in {delay:.1f} seconds...")
+                get_metrics().count_retry(job["wiki"], reason)
+                # Other jobs keep the wiki slot busy while this one sleeps
+                await asyncio.sleep(delay)
+
+    async def run_all(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Run jobs concurrently, honouring the per-wiki limits.
+
+        Args:
+            jobs: Job dictionaries with "wiki", "func" and optional "args", "kwargs" and "name" keys
+
+        Returns:
+            One outcome per job, in job order, with "result", "error" and "attempts" keys
+        """
+        loop = asyncio.get_running_loop()
+        semaphores = {}
+        for job in jobs:
+            wiki_key = job["wiki"]
+            if wiki_key not in semaphores:
+                semaphores[wiki_key] = asyncio.Semaphore(self.limits.get(wiki_key, DEFAULT_MAX_IN_FLIGHT))
+
+        workers = max(1, sum(self.limits.get(wiki_key, DEFAULT_MAX_IN_FLIGHT) for wiki_key in semaphores))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            return await asyncio.gather(
+                *(self._run_job(loop, executor, semaphores[job["wiki"]], job) for job in jobs)
+            )
+
+    def run(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Run jobs to completion on a new event loop. See run_all()."""
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(self.run_all(jobs))
+        finally:
+            loop.close()
@@ -5,32 +5,63 @@ This script can use file-based or environment variable credentials for automated
 Works with any MediaWiki-based wiki.
 """
 
-import subprocess
-import json
+import functools
 import time
 import sys
 import argparse
 import os
 import secrets
-from typing import Dict, List, Optional, Any
+import threading
+from typing import Dict, List, Optional, Any, Tuple
+
+from wiki_async_engine import AsyncSubmissionEngine
+from wiki_config_manager import WikiConfigManager, DEFAULT_MAX_IN_FLIGHT, DEFAULT_MAXLAG
+from wiki_logging import get_run_journal
+from wiki_metrics import export_at_exit, get_metrics
+from wiki_http_client import (BadTokenError, FileFormValue, RateLimitedError, WikiApiError, WikiHttpClient,
+                              WrongTokenError, raise_for_maxlag)
+from wiki_manifest import load_manifest
+from wiki_rate_limiter import get_rate_limiter
+from wiki_retry import RetryPolicy
+from wiki_session_cache import WikiSessionCache, ANONYMOUS_CSRF_TOKEN
+from wiki_validator import WikiValidator, revision_matches_content
+from wiki_watch import ContentWatcher, DEBOUNCE, page_title_for_file
+
+# Seconds without pushes after which watch mode checks that the session is
+# still logged in before the next push
+WATCH_SESSION_CHECK_INTERVAL = 600
 
 class StandardWikiBot:
     def __init__(self):
         self.username = None
         self.password = None
-        self.log_file = f"/tmp/wiki_submission_{os.getpid()}.log"  # Use process ID for unique file
-        self.session = None
+        self.log_file = f"/tmp/wiki_submission_{os.getpid()}.jsonl"  # Use process ID for unique file
+        # Shared by every bot of this process; removed at exit unless keep is set
+        self.journal = get_run_journal(self.log_file)
+        self.metrics = get_metrics()
+        self.retry_policy = RetryPolicy()
+        # For edits run by the async engine: only the token refresh happens here, the engine retries the rest
+        self.edit_retry_policy = RetryPolicy(max_attempts=1)
+        self.http_client = WikiHttpClient(user_agent="WikiStandardBot/1.0 (Generic Wiki Submission Tool)")
+        self.csrf_token = None
+        self.token_lock = threading.Lock()
+        self.session_cache = None
+        self.skip_unchanged = True
+        # Sent as the maxlag parameter of every request, None to send none
+        self.maxlag = DEFAULT_MAXLAG
         
-    def log_message(self, message: str) -> None:
-        """Logs messages to a file with a timestamp, excluding sensitive data."""
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S UTC")
-        log_entry = f"[{timestamp}] {message}"
-        try:
-            with open(self.log_file, "a") as f:
-                f.write(log_entry + "\n")
-        except Exception:
-            # If we can't write to log, continue without logging
-            pass
+    def log_message(self, message: str, **fields: Any) -> None:
+        """
+        Log a message to the run journal, excluding sensitive data.
+        
+        The record is queued and written by a background thread, so this
+        never blocks on the file.
+        
+        Args:
+            message: The message
+            **fields: Structured fields: wiki, page, phase, duration (seconds) and outcome
+        """
+        self.journal.log(message, **fields)
         
     def load_credentials_from_file(self, credentials_file: str) -> bool:
         """Load credentials from a configuration file."""
@@ -71,203 +102,220 @@ class StandardWikiBot:
             # Clear the random data
             del s
             
-    def run_curl_command(self, wiki_api_url: str, data_params: Dict[str, str], method: str = "POST", 
-                        expect_json: bool = True, initial_cookies: bool = False,
-                        urlencode_params: Dict[str, str] = None) -> Any:
-        """Helper function to execute curl commands and parse JSON responses."""
-        # Create cookies file with process ID for unique file
-        cookies_file = f"/tmp/wiki_cookies_{os.getpid()}.txt"
-        
-        cmd = ["curl", "-s", "-X", method, wiki_api_url]
+    def _redact_params(self, params: Dict[str, str]) -> Dict[str, str]:
+        """Return a copy of request parameters safe for logging."""
+        redacted = {}
+        for key, value in params.items():
+            if key in ["lgpassword", "lgtoken", "token"]:
+                redacted[key] = "***"
+            elif key == "text" and isinstance(value, FileFormValue):
+                redacted[key] = f"<{len(value)} bytes from {value.path}>"
+            elif key == "text":
+                redacted[key] = f"<{len(value)} characters>"
+            else:
+                redacted[key] = value
+        return redacted
 
+    def api_request(self, wiki_api_url: str, data_params: Dict[str, str], method: str = "POST",
+                    expect_json: bool = True, initial_cookies: bool = False,
+                    urlencode_params: Dict[str, str] = None) -> Any:
+        """Helper function to send an API request over the pooled session and parse JSON responses."""
         if initial_cookies:
-            # For the very first login token request, we don't have cookies yet
-            cmd.extend(["-c", cookies_file])
-        else:
-            # For subsequent requests, read and write cookies
-            cmd.extend(["-b", cookies_file, "-c", cookies_file])
-
-        # Add data parameters
-        for key, value in data_params.items():
-            # URL encode sensitive parameters
-            if key in ["lgtoken", "lgpassword", "text", "summary", "token"]:
-                cmd.extend(["--data-urlencode", f"{key}={value}"])
-            else:
-                cmd.extend(["-d", f"{key}={value}"])
-                
-        # Add additional URL-encoded parameters
-        if urlencode_params:
-            for key, value in urlencode_params.items():
-                cmd.extend(["--data-urlencode", f"{key}={value}"])
-        
-        # Add user agent
-        cmd.extend(["--user-agent", "WikiStandardBot/1.0 (Generic Wiki Submission Tool)"])
-        
-        # Add timeout options
-        cmd.extend(["--connect-timeout", "30", "--max-time", "120"])
+            # The login token request starts a fresh session
+            self.http_client.clear_cookies()
 
-        self.log_message(f"Executing curl command: {' '.join(cmd[:3] + ['***' if '=' in x and any(sensitive in x.lower() for sensitive in ['password', 'token']) else x for x in cmd[3:]])}")
-        process = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        params = dict(data_params)
+        if urlencode_params:
+            params.update(urlencode_params)
+        if self.maxlag is not None:
+            # Lets the wiki refuse the request while its replicas lag, instead of adding to their load
+            params["maxlag"] = str(self.maxlag)
 
-        if process.returncode != 0:
-            self.log_message(f"Curl command failed with exit code {process.returncode}: {process.stderr}")
-            raise Exception(f"Curl command failed: {process.stderr}")
+        self.log_message(f"Sending {method} request to {wiki_api_url}: {self._redact_params(params)}",
+                         wiki=wiki_api_url, phase="request")
+        # Paced per wiki; refusals and slow responses slow down every bot talking to it
+        with get_rate_limiter(wiki_api_url).paced():
+            if method.upper() == "GET":
+                response = self.http_client.request(method, wiki_api_url, params=params)
+            else:
+                response = self.http_client.request(method, wiki_api_url, data=params)
 
-        if expect_json:
-            try:
-                return json.loads(process.stdout)
-            except json.JSONDecodeError:
-                self.log_message(f"Failed to decode JSON response: {process.stdout}")
-                raise Exception("Failed to decode JSON response from API.")
-        return process.stdout
+            if expect_json:
+                try:
+                    data = response.json()
+                except ValueError:
+                    self.log_message(f"Failed to decode JSON response: {response.text}")
+                    raise Exception("Failed to decode JSON response from API.")
+                raise_for_maxlag(response, data)
+                return data
+            return response.text
 
     def get_login_token(self, wiki_api_url: str) -> str:
         """Get login token from Wiki API."""
-        self.log_message("Attempting to get login token...")
-        response = self.run_curl_command(
-            wiki_api_url,
-            {"action": "query", "meta": "tokens", "type": "login", "format": "json"}, 
-            initial_cookies=True
-        )
-        token = response.get("query", {}).get("tokens", {}).get("logintoken")
-        if not token:
-            self.log_message(f"Failed to get login token. Response: {response}")
-            raise Exception("Could not retrieve login token.")
-        self.log_message("Login token obtained.")
-        return token
+        with self.metrics.timed(wiki_api_url, "login_token"):
+            self.log_message("Attempting to get login token...")
+            response = self.api_request(
+                wiki_api_url,
+                {"action": "query", "meta": "tokens", "type": "login", "format": "json"}, 
+                initial_cookies=True
+            )
+            token = response.get("query", {}).get("tokens", {}).get("logintoken")
+            if not token:
+                self.log_message(f"Failed to get login token. Response: {response}")
+                raise WikiApiError("Could not retrieve login token.", code="notoken")
+            self.log_message("Login token obtained.")
+            return token
 
     def login(self, wiki_api_url: str, login_token: str) -> str:
         """Login to Wiki API. Returns 'Success' on success, raises exception on failure."""
-        self.log_message(f"Attempting to log in as {self.username}...")
-        response = self.run_curl_command(
-            wiki_api_url,
-            {
-                "action": "login",
-                "lgname": self.username,
-                "format": "json"
-            },
-            urlencode_params={
-                "lgpassword": self.password,
-                "lgtoken": login_token
-            }
-        )
-        result = response.get("login", {}).get("result")
-        if result != "Success":
-            reason = response.get("login", {}).get("reason", "Unknown reason")
-            # Log more details about the response for debugging
-            self.log_message(f"Login failed. Full response: {response}")
-            raise Exception(f"Login failed: {reason}. Response: {response}")
-        self.log_message("Login successful.")
-        return result
+        with self.metrics.timed(wiki_api_url, "login"):
+            self.log_message(f"Attempting to log in as {self.username}...")
+            response = self.api_request(
+                wiki_api_url,
+                {
+                    "action": "login",
+                    "lgname": self.username,
+                    "format": "json"
+                },
+                urlencode_params={
+                    "lgpassword": self.password,
+                    "lgtoken": login_token
+                }
+            )
+            result = response.get("login", {}).get("result")
+            if result != "Success":
+                reason = response.get("login", {}).get("reason", "Unknown reason")
+                # Log more details about the response for debugging
+                self.log_message(f"Login failed. Full response: {response}", phase="login", outcome="failed")
+                if result == "WrongToken":
+                    raise WrongTokenError(f"Login failed: {reason}. Response: {response}")
+                raise WikiApiError(f"Login failed: {reason}. Response: {response}", code=result or "unknown")
+            self.log_message("Login successful.", phase="login", outcome="success")
+            return result
 
     def get_csrf_token(self, wiki_api_url: str) -> str:
         """Get CSRF token for editing."""
-        self.log_message("Attempting to get CSRF token...")
-        response = self.run_curl_command(
-            wiki_api_url,
-            {
-                "action": "query", 
-                "meta": "tokens", 
-                "type": "csrf", 
+        with self.metrics.timed(wiki_api_url, "csrf_token"):
+            self.log_message("Attempting to get CSRF token...")
+            response = self.api_request(
+                wiki_api_url,
+                {
+                    "action": "query", 
+                    "meta": "tokens", 
+                    "type": "csrf", 
+                    "format": "json"
+                }
+            )
+            token = response.get("query", {}).get("tokens", {}).get("csrftoken")
+            if not token:
+                self.log_message(f"Failed to get CSRF token. Response: {response}")
+                raise WikiApiError("Could not retrieve CSRF token.", code="notoken")
+            self.log_message("CSRF token obtained.")
+            return token
+
+    def submit_wiki_page(self, wiki_api_url: str, title: str, content: Any, summary: str, 
+                        csrf_token: str, is_bot_edit: bool = True) -> Dict[str, Any]:
+        """Submit page content (a string or FileFormValue) to Wiki. Returns the "edit" object of the API response."""
+        with self.metrics.timed(wiki_api_url, "edit"):
+            self.log_message(f"Attempting to submit page: '{title}' with summary: '{summary}'...")
+            params = {
+                "action": "edit",
+                "title": title,
+                # Refused with assertuserfailed instead of being saved logged out if the session expired
+                "assert": "user",
                 "format": "json"
             }
-        )
-        token = response.get("query", {}).get("tokens", {}).get("csrftoken")
-        if not token:
-            self.log_message(f"Failed to get CSRF token. Response: {response}")
-            raise Exception("Could not retrieve CSRF token.")
-        self.log_message("CSRF token obtained.")
-        return token
-
-    def submit_wiki_page(self, wiki_api_url: str, title: str, content: str, summary: str, 
-                        csrf_token: str, is_bot_edit: bool = True) -> None:
-        """Submit page content to Wiki."""
-        self.log_message(f"Attempting to submit page: '{title}' with summary: '{summary}'...")
-        params = {
-            "action": "edit",
-            "title": title,
-            "format": "json"
-        }
-        if is_bot_edit:
-            params["bot"] = "1"
-
-        response = self.run_curl_command(
-            wiki_api_url,
-            params,
-            urlencode_params={
-                "text": content,
-                "summary": summary,
-                "token": csrf_token
-            }
-        )
-        result = response.get("edit", {}).get("result")
-        if result != "Success":
-            error_code = response.get("error", {}).get("code", "N/A")
-            error_info = response.get("error", {}).get("info", "Unknown error")
-            self.log_message(f"Edit failed for '{title}': {error_code} - {error_info}. Full response: {response}")
+            if is_bot_edit:
+                params["bot"] = "1"
+
+            start = time.monotonic()
+            response = self.api_request(
+                wiki_api_url,
+                params,
+                urlencode_params={
+                    "text": content,
+                    "summary": summary,
+                    "token": csrf_token
+                }
+            )
+            result = response.get("edit", {}).get("result")
+            if result != "Success":
+                error_code = response.get("error", {}).get("code", "N/A")
+                error_info = response.get("error", {}).get("info", "Unknown error")
+                self.log_message(f"Edit failed for '{title}': {error_code} - {error_info}. Full response: {response}",
+                                 wiki=wiki_api_url, page=title, phase="edit",
+                                 duration=time.monotonic() - start, outcome=error_code)
             
-            # Handle specific error cases
-            if error_code == "badtoken":
-                raise Exception("CSRF token is invalid. Please get a new CSRF token and try again.")
-            elif error_code == "maxlag":
-                raise Exception("Wiki is currently lagging. Please try again later.")
-            elif error_code == "spamdetected":
-                raise Exception("Content detected as spam. Please review your content.")
-            elif error_code == "abusefilter":
-                raise Exception("Content blocked by abuse filter. Please review your content.")
-            else:
-                raise Exception(f"Edit failed: {error_code} - {error_info}")
+                # Handle specific error cases
+                if error_code == "badtoken":
+                    raise BadTokenError("CSRF token is invalid. Please get a new CSRF token and try again.")
+                elif error_code == "assertuserfailed":
+                    raise BadTokenError("Session is no longer logged in. Please log in again.", code=error_code)
+                elif error_code == "ratelimited":
+                    error = RateLimitedError(f"Edit failed: {error_code} - {error_info}")
+                    # Further edits would hit the same per-account limit
+                    get_rate_limiter(wiki_api_url).record_error(error)
+                    raise error
+                elif error_code == "spamdetected":
+                    raise WikiApiError("Content detected as spam. Please review your content.", code=error_code)
+                elif error_code == "abusefilter":
+                    raise WikiApiError("Content blocked by abuse filter. Please review your content.", code=error_code)
+                else:
+                    raise WikiApiError(f"Edit failed: {error_code} - {error_info}", code=error_code)
                 
-        self.log_message(f"Page '{title}' submitted successfully. New revision ID: {response.get('edit',{}).get('newrevid')}")
+            self.log_message(f"Page '{title}' submitted successfully. New revision ID: {response.get('edit',{}).get('newrevid')}",
+                             wiki=wiki_api_url, page=title, phase="edit",
+                             duration=time.monotonic() - start, outcome="success")
+            return response.get("edit", {})
 
-    def exponential_backoff(self, func, *args, max_retries: int = 3, **kwargs) -> Any:
-        """Execute function with exponential backoff for transient errors."""
-        retry_count = 0
-        delay = 1
+    def is_page_unchanged(self, wiki_api_url: str, title: str, content: Any) -> bool:
+        """
+        Check whether the wiki already has this exact content, so the edit can be skipped.
         
-        while retry_count < max_retries:
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                retry_count += 1
-                if retry_count < max_retries:
-                    error_msg = str(e).lower()
-                    # Check if this is a transient error
-                    if any(keyword in error_msg for keyword in ["maxlag", "timeout", "network"]):
-                        self.log_message(f"Attempt {retry_count} failed with transient error. Retrying in {delay} seconds...")
-                        time.sleep(delay)
-                        delay *= 2  # Exponential backoff
-                        continue
-                    elif "wrongtoken" in error_msg.lower():
-                        self.log_message(f"Attempt {retry_count} failed with wrong token error. Retrying with fresh token...")
-                        time.sleep(delay)
-                        delay *= 2  # Exponential backoff
-                        continue
-                    else:
-                        # Non-transient error, don't retry
-                        raise e
-                else:
-                    self.log_message(f"Failed after {max_retries} attempts")
-                    raise Exception(f"Failed after {max_retries} attempts: {e}")
+        Compares the latest revision's SHA-1 and size with the local content
+        without downloading the page. Always False when skip_unchanged is off.
+        """
+        if not self.skip_unchanged:
+            return False
+        validator = WikiValidator(http_client=self.http_client)
+        if validator.is_content_unchanged(wiki_api_url, title, content):
+            self.log_message(f"Page '{title}' already matches the local content. Skipping edit",
+                             wiki=wiki_api_url, page=title, phase="check", outcome="unchanged")
+            return True
+        return False
+
+    def exponential_backoff(self, func, *args, refresh_token=None, **kwargs) -> Any:
+        """
+        Execute function, retrying errors the retry policy classifies as retryable.
         
-        return None
+        Waits grow with decorrelated jitter and honour Retry-After and maxlag
+        lag values. See RetryPolicy.call() for refresh_token.
+        """
+        # Every method retried here takes the wiki's API URL first
+        wiki_api_url = args[0] if args else ""
+        on_retry = functools.partial(self.log_retry, wiki_api_url)
+        
+        try:
+            return self.retry_policy.call(func, *args, refresh_token=refresh_token, on_retry=on_retry, **kwargs)
+        except Exception as e:
+            if self.retry_policy.retry_reason(e) is not None:
+                self.log_message(f"Giving up after {self.retry_policy.max_attempts} attempts: {e}",
+                                 wiki=wiki_api_url, phase="retry", outcome="failed")
+            raise
+
+    def log_retry(self, wiki_api_url: str, attempt: int, error: BaseException, reason: str, delay: float) -> None:
+        """Log a retry and count it in the wiki's metrics; the on_retry callback of RetryPolicy.call()."""
+        self.log_message(f"Attempt {attempt} failed ({reason}): {error}. Retrying in {delay:.1f} seconds...",
+                         wiki=wiki_api_url, phase="retry", outcome=reason)
+        self.metrics.count_retry(wiki_api_url, reason)
 
     def cleanup(self) -> None:
         """Cleanup temporary files and clear sensitive data."""
-        # Create cookies file with process ID for unique file
-        cookies_file = f"/tmp/wiki_cookies_{os.getpid()}.txt"
-        
         print("\033[0;34m[INFO]\033[0m Cleaning up temporary files...")
         self.log_message("Cleaning up temporary files")
         
-        # Remove temporary files
-        try:
-            if os.path.exists(cookies_file):
-                os.remove(cookies_file)
-            if os.path.exists(self.log_file):
-                os.remove(self.log_file)
-        except Exception as e:
-            self.log_message(f"Error during cleanup: {e}")
+        # Drop the session cookies and pooled connections
+        self.http_client.close()
         
         # Securely clear credentials
         self.secure_clear_string(self.password)
@@ -276,13 +324,93 @@ class StandardWikiBot:
         
         print("\033[0;34m[INFO]\033[0m Cleanup completed")
         self.log_message("Cleanup completed")
+        # Write the queued records out now; the journal itself is removed at exit unless kept
+        self.journal.flush()
+
+    def restore_cached_session(self, wiki_api_url: str) -> Optional[str]:
+        """
+        Reuse a cached session if the wiki still accepts it.
+        
+        The cached cookies are checked with a single meta=tokens request; a
+        logged-out session gets the anonymous token back.
+        
+        Returns:
+            A CSRF token for the restored session, or None if a full login is needed
+        """
+        if not self.session_cache:
+            return None
+        entry = self.session_cache.load(wiki_api_url, self.username)
+        if not entry:
+            return None
+        
+        self.log_message("Found cached session. Checking that it is still valid...")
+        self.http_client.clear_cookies()
+        self.http_client.import_cookies(entry["cookies"])
+        try:
+            csrf_tok = self.get_csrf_token(wiki_api_url)
+        except Exception as e:
+            self.log_message(f"Cached session check failed: {e}")
+            csrf_tok = None
+        
+        if not csrf_tok or csrf_tok == ANONYMOUS_CSRF_TOKEN:
+            self.log_message("Cached session is no longer valid. Falling back to full login")
+            self.session_cache.invalidate(wiki_api_url, self.username)
+            self.http_client.clear_cookies()
+            return None
+        
+        self.log_message("Reusing cached session")
+        self.save_session(wiki_api_url, csrf_tok)
+        return csrf_tok
+
+    def save_session(self, wiki_api_url: str, csrf_token: str) -> None:
+        """Store the current session in the session cache, if enabled."""
+        if not self.session_cache:
+            return
+        try:
+            self.session_cache.store(wiki_api_url, self.username, self.http_client.export_cookies(), csrf_token)
+        except Exception as e:
+            # A cache write failure must not fail the submission
+            self.log_message(f"Failed to update session cache: {e}")
+
+    def authenticate(self, wiki_api_url: str) -> str:
+        """Log in to the wiki and return a CSRF token for the new session."""
+        print("\033[0;34m[INFO]\033[0m Proceeding with authentication...")
+        self.log_message("Proceeding with authentication")
+        
+        # Skip the login entirely if a cached session is still valid
+        csrf_tok = self.restore_cached_session(wiki_api_url)
+        if csrf_tok:
+            return csrf_tok
+        
+        # Step 1 & 2: Get login token and login with retry for WrongToken errors
+        login_success = False
+        login_attempts = 0
+        max_login_attempts = 3
+        
+        while not login_success and login_attempts < max_login_attempts:
+            login_attempts += 1
+            try:
+                login_tok = self.exponential_backoff(self.get_login_token, wiki_api_url)
+                self.exponential_backoff(self.login, wiki_api_url, login_tok)
+                login_success = True
+            except WrongTokenError:
+                if login_attempts >= max_login_attempts:
+                    raise
+                # A fresh login token is all it takes; waiting would not help
+                self.log_message(f"Login attempt {login_attempts} failed with wrong token. Retrying...",
+                                 wiki=wiki_api_url, phase="retry", outcome="wrongtoken")
+                self.metrics.count_retry(wiki_api_url, "wrongtoken")
+        
+        # Step 3: Get CSRF token
+        csrf_tok = self.exponential_backoff(self.get_csrf_token, wiki_api_url)
+        self.save_session(wiki_api_url, csrf_tok)
+        return csrf_tok
 
     def submit_content(self, wiki_api_url: str, page_title: str, content_file: str, edit_summary: str) -> None:
         """Main function to submit content to Wiki with standard credential handling."""
         try:
-            # Read content from file
-            with open(content_file, 'r', encoding='utf-8') as f:
-                content = f.read()
+            # Stream the content from the file instead of reading it into memory
+            content = FileFormValue(content_file)
             
             self.log_message(f"Starting standard Wiki submission process for page: {page_title}")
             
@@ -290,30 +418,14 @@ class StandardWikiBot:
             if not self.username or not self.password:
                 raise Exception("Username and password must be set")
             
-            print("\033[0;34m[INFO]\033[0m Proceeding with authentication...")
-            self.log_message("Proceeding with authentication")
-            
-            # Step 1 & 2: Get login token and login with retry for WrongToken errors
-            login_success = False
-            login_attempts = 0
-            max_login_attempts = 3
+            # Nothing to do if the wiki already has this content
+            if self.is_page_unchanged(wiki_api_url, page_title, content):
+                print(f"\033[0;34m[INFO]\033[0m Page '{page_title}' already matches '{content_file}'. Edit skipped.")
+                return
             
-            while not login_success and login_attempts < max_login_attempts:
-                login_attempts += 1
-                try:
-                    login_tok = self.get_login_token(wiki_api_url)
-                    self.login(wiki_api_url, login_tok)
-                    login_success = True
-                except Exception as e:
-                    if "wrongtoken" in str(e).lower() and login_attempts < max_login_attempts:
-                        self.log_message(f"Login attempt {login_attempts} failed with wrong token. Retrying...")
-                        time.sleep(1)
-                        continue
-                    else:
-                        raise e
-            
-            # Step 3: Get CSRF token
-            csrf_tok = self.exponential_backoff(self.get_csrf_token, wiki_api_url)
+            # Steps 1-3: Login and get CSRF token
+            self.csrf_token = self.authenticate(wiki_api_url)
+            csrf_tok = self.csrf_token
             
             # Step 4: Submit the page
             self.exponential_backoff(
@@ -322,7 +434,8 @@ class StandardWikiBot:
                 page_title, 
                 content, 
                 edit_summary, 
-                csrf_tok
+                csrf_token=csrf_tok,
+                refresh_token=functools.partial(self.refresh_csrf_token, wiki_api_url, csrf_tok)
             )
             
             self.log_message("Wiki submission completed successfully!")
@@ -334,23 +447,341 @@ class StandardWikiBot:
             self.log_message(f"An unrecoverable error occurred: {e}")
             raise e
         finally:
+            self.log_message("Script finished.")
             # Cleanup
             self.cleanup()
+
+    def refresh_csrf_token(self, wiki_api_url: str, stale_token: str) -> str:
+        """
+        Replace a CSRF token the wiki rejected, once per stale token.
+        
+        Concurrent edits that hit badtoken with the same token share a single
+        refresh. If the session expired, the wiki hands out the anonymous token,
+        so the bot logs in again instead of saving edits logged out.
+        """
+        with self.token_lock:
+            if self.csrf_token == stale_token:
+                self.log_message("CSRF token rejected. Refreshing token...")
+                csrf_tok = self.exponential_backoff(self.get_csrf_token, wiki_api_url)
+                if csrf_tok == ANONYMOUS_CSRF_TOKEN:
+                    self.log_message("Session expired. Logging in again", wiki=wiki_api_url, phase="login")
+                    csrf_tok = self.authenticate(wiki_api_url)
+                else:
+                    self.save_session(wiki_api_url, csrf_tok)
+                self.csrf_token = csrf_tok
+            return self.csrf_token
+
+    def find_unchanged_entries(self, wiki_api_url: str, manifest: List[Dict[str, str]]) -> set:
+        """
+        Find manifest pages the wiki already holds, with batched revision lookups.
+        
+        Fetches the SHA-1 and size of up to 50 (500 with apihighlimits) pages
+        per request instead of one request per page.
+        
+        Returns:
+            Indexes of the manifest entries whose edits can be skipped
+        """
+        entries_by_title = {}
+        for index, entry in enumerate(manifest):
+            entries_by_title.setdefault(entry["title"], []).append(index)
+        
+        unchanged = set()
+        validator = WikiValidator(http_client=self.http_client)
+        for title, revision in validator.fetch_revision_infos(wiki_api_url, entries_by_title):
+            if revision is None:
+                continue
+            for index in entries_by_title[title]:
+                try:
+                    content = FileFormValue(manifest[index]["content_file"])
+                except (OSError, ValueError):
+                    # Reported when the page itself is submitted
+                    continue
+                if revision_matches_content(revision, content):
+                    self.log_message(f"Page '{title}' already matches the local content. Skipping edit")
+                    unchanged.add(index)
+        return unchanged
+
+    def submit_manifest_entry(self, wiki_api_url: str, entry: Dict[str, str],
+                              check_unchanged: bool = True) -> Dict[str, Any]:
+        """
+        Submit one manifest page with the session's CSRF token, refreshing it once on badtoken.
+        
+        Returns {"skipped": True} instead of an edit result if the page is already up to date.
+        Pass check_unchanged=False if the page was already checked by find_unchanged_entries().
+        """
+        content = FileFormValue(entry["content_file"])
+        
+        if check_unchanged and self.is_page_unchanged(wiki_api_url, entry["title"], content):
+            return {"skipped": True}
+        
+        csrf_tok = self.csrf_token
+        # Session token expired mid-batch: refresh it and retry this page; other errors go back to the engine
+        return self.edit_retry_policy.call(
+            self.submit_wiki_page, wiki_api_url, entry["title"], content, entry["summary"],
+            csrf_token=csrf_tok,
+            refresh_token=functools.partial(self.refresh_csrf_token, wiki_api_url, csrf_tok),
+            on_retry=functools.partial(self.log_retry, wiki_api_url)
+        )
+
+    def submit_entries(self, wiki_api_url: str, manifest: List[Dict[str, str]], max_in_flight: int = 1,
+                       check_unchanged: bool = True) -> List[Dict[str, Any]]:
+        """
+        Submit manifest pages with the session's CSRF token; the bot must be authenticated.
+        
+        Args:
+            wiki_api_url: URL of the wiki API endpoint
+            manifest: Entries with "title", "content_file" and "summary" keys
+            max_in_flight: Maximum number of concurrent edits
+            check_unchanged: Skip pages the wiki already holds, see find_unchanged_entries()
+            
+        Returns:
+            List of per-page results with "title", "status", "revid" and "error" keys
+        """
+        unchanged = set()
+        if check_unchanged:
+            unchanged = self.find_unchanged_entries(wiki_api_url, manifest)
+        
+        engine = AsyncSubmissionEngine(log_message=self.log_message)
+        engine.set_limit(wiki_api_url, max_in_flight)
+        outcomes = iter(engine.run([
+            {
+                "wiki": wiki_api_url,
+                "name": entry["title"],
+                "func": self.submit_manifest_entry,
+                "args": (wiki_api_url, entry, False)
+            }
+            for index, entry in enumerate(manifest) if index not in unchanged
+        ]))
+        
+        results = []
+        for index, entry in enumerate(manifest):
+            if index in unchanged:
+                results.append({"title": entry["title"], "status": "skipped", "revid": None, "error": None})
+                continue
+            outcome = next(outcomes)
+            result = {"title": entry["title"], "status": "failed", "revid": None, "error": None}
+            if outcome["error"] is not None:
+                result["error"] = str(outcome["error"])
+                self.log_message(f"Failed to submit '{entry['title']}': {outcome['error']}",
+                                 wiki=wiki_api_url, page=entry["title"], phase="edit", outcome="failed")
+            else:
+                edit = outcome["result"]
+                if edit.get("skipped"):
+                    result["status"] = "skipped"
+                else:
+                    result["status"] = "unchanged" if "nochange" in edit else "success"
+                result["revid"] = edit.get("newrevid")
+            results.append(result)
+        return results
+
+    def submit_manifest(self, wiki_api_url: str, manifest: List[Dict[str, str]],
+                        max_in_flight: int = 1) -> List[Dict[str, Any]]:
+        """
+        Submit every page of a manifest in one authenticated session.
+        
+        Logs in once and reuses the CSRF token for all edits; the token is only
+        refreshed when the wiki rejects it with badtoken. Edits run on the
+        asyncio submission engine with up to max_in_flight requests in flight.
+        Failures are recorded per page and do not stop the batch.
+        
+        Args:
+            wiki_api_url: URL of the wiki API endpoint
+            manifest: Entries with "title", "content_file" and "summary" keys
+            max_in_flight: Maximum number of concurrent edits
+            
+        Returns:
+            List of per-page results with "title", "status", "revid" and "error" keys
+        """
+        try:
+            self.log_message(f"Starting batch submission of {len(manifest)} pages")
+            
+            # Validate credentials
+            if not self.username or not self.password:
+                raise Exception("Username and password must be set")
+            
+            self.csrf_token = self.authenticate(wiki_api_url)
+            results = self.submit_entries(wiki_api_url, manifest, max_in_flight, self.skip_unchanged)
+            
+            self.log_message("Batch submission finished")
+            return results
+            
+        except Exception as e:
+            self.log_message(f"An unrecoverable error occurred: {e}")
+            raise e
+        finally:
+            self.log_message("Script finished.")
+            # Cleanup
+            self.csrf_token = None
+            self.cleanup()
+
+    def ensure_session(self, wiki_api_url: str) -> str:
+        """
+        Check that the session is still logged in, logging in again if it expired.
+        
+        An expired session gets the anonymous CSRF token, which would save edits
+        without the account.
+        
+        Returns:
+            A CSRF token of a logged-in session
+        """
+        csrf_tok = self.exponential_backoff(self.get_csrf_token, wiki_api_url)
+        if csrf_tok == ANONYMOUS_CSRF_TOKEN:
+            self.log_message("Session expired. Logging in again", wiki=wiki_api_url, phase="login")
+            csrf_tok = self.authenticate(wiki_api_url)
+        with self.token_lock:
+            self.csrf_token = csrf_tok
+        return csrf_tok
+
+    def watch(self, wiki_api_url: str, watcher: ContentWatcher, edit_summary: str,
+              manifest: Optional[List[Dict[str, str]]] = None, max_in_flight: int = 1) -> None:
+        """
+        Push the content files of a watched directory whenever a save changes them.
+        
+        Logs in once and keeps the session for every push. The watcher only
+        reports files whose content changed, so they are submitted without
+        asking the wiki first. Runs until watcher.stop() is called or the
+        process is interrupted. A page that fails is pushed again on its next
+        save, even if the content is the same.
+        
+        Args:
+            wiki_api_url: URL of the wiki API endpoint
+            watcher: Watcher of the content directory
+            edit_summary: Edit summary of files without a manifest entry
+            manifest: Entries mapping content files to titles and summaries; other
+                files get their title from the file name, see page_title_for_file()
+            max_in_flight: Maximum number of concurrent edits
+        """
+        try:
+            # Validate credentials
+            if not self.username or not self.password:
+                raise Exception("Username and password must be set")
+            
+            self.csrf_token = self.authenticate(wiki_api_url)
+            entries_by_path = {os.path.abspath(entry["content_file"]): entry for entry in manifest or []}
+            self.log_message(f"Watching {watcher.directory} for changes ({watcher.backend})")
+            last_push = time.monotonic()
+            
+            for paths in watcher:
+                entries = [
+                    entries_by_path.get(path) or {"title": page_title_for_file(watcher.directory, path),
+                                                  "content_file": path, "summary": edit_summary}
+                    for path in paths
+                ]
+                if time.monotonic() - last_push > WATCH_SESSION_CHECK_INTERVAL:
+                    try:
+                        self.ensure_session(wiki_api_url)
+                    except Exception as e:
+                        # The edits fail too and are pushed again on the next save
+                        self.log_message(f"Session check failed: {e}")
+                results = self.submit_entries(wiki_api_url, entries, max_in_flight, check_unchanged=False)
+                last_push = time.monotonic()
+                for entry, result in zip(entries, results):
+                    if result["status"] == "failed":
+                        watcher.forget(entry["content_file"])
+                self.print_manifest_report(results)
+            
+        except Exception as e:
+            self.log_message(f"An unrecoverable error occurred: {e}")
+            raise e
+        finally:
             self.log_message("Script finished.")
+            # Cleanup
+            self.csrf_token = None
+            self.cleanup()
+
+    def print_manifest_report(self, results: List[Dict[str, Any]]) -> None:
+        """Print per-page results of a batch submission."""
+        print("\n\033[0;34m[INFO]\033[0m Batch submission results:")
+        for result in results:
+            if result["status"] == "failed":
+                print(f"\033[0;31m✗\033[0m {result['title']}: {result['error']}")
+            elif result["status"] == "skipped":
+                print(f"\033[0;34m=\033[0m {result['title']}: already up to date, skipped")
+            elif result["status"] == "unchanged":
+                print(f"\033[0;34m=\033[0m {result['title']}: no change")
+            else:
+                print(f"\033[0;32m✓\033[0m {result['title']}: revision {result['revid']}")
+        
+        failed = sum(1 for result in results if result["status"] == "failed")
+        print(f"\n{len(results) - failed} of {len(results)} pages submitted successfully")
+
+def find_configured_wiki(wiki_api_url: str) -> Tuple[WikiConfigManager, Optional[str]]:
+    """Look up a wiki in wiki_config.json by its API URL; the ID is None if it is not configured."""
+    config_manager = WikiConfigManager()
+    try:
+        return config_manager, config_manager.find_wiki_id_by_api_url(wiki_api_url)
+    except Exception:
+        # No usable configuration file; the defaults apply
+        return config_manager, None
+
+def get_configured_max_in_flight(wiki_api_url: str) -> int:
+    """Look up the concurrency limit of a wiki in wiki_config.json by its API URL."""
+    config_manager, wiki_id = find_configured_wiki(wiki_api_url)
+    if wiki_id is None:
+        return DEFAULT_MAX_IN_FLIGHT
+    return config_manager.get_max_in_flight(wiki_id)
+
+def get_configured_pacing(wiki_api_url: str) -> Tuple[Optional[int], Optional[float]]:
+    """Look up the maxlag and max_rate settings of a wiki in wiki_config.json by its API URL."""
+    config_manager, wiki_id = find_configured_wiki(wiki_api_url)
+    if wiki_id is None:
+        return DEFAULT_MAXLAG, None
+    return config_manager.get_maxlag(wiki_id), config_manager.get_max_rate(wiki_id)
 
 def main():
     parser = argparse.ArgumentParser(description='Standard Wiki Submission Script')
     parser.add_argument('wiki_api_url', nargs='?', help='URL of the wiki API endpoint (e.g., https://wiki.archlinux.org/api.php)')
-    parser.add_argument('page_title', help='Title of the wiki page to edit')
-    parser.add_argument('content_file', help='Path to the file containing the content')
+    parser.add_argument('page_title', nargs='?', help='Title of the wiki page to edit')
+    parser.add_argument('content_file', nargs='?', help='Path to the file containing the content')
     parser.add_argument('edit_summary', nargs='?', default='Automated update for wiki content',
                        help='Edit summary for the wiki edit')
     parser.add_argument('--credentials', '-c', help='Path to credentials file')
+    parser.add_argument('--manifest', '-m',
+                       help='JSON or CSV manifest of pages (title, content_file, summary) to submit in one session')
+    parser.add_argument('--watch', metavar='DIR',
+                       help='Keep running and push every content file in DIR when a save changes it, in one session. '
+                            'Titles come from the file names unless --manifest maps the files')
+    parser.add_argument('--debounce', type=float, default=DEBOUNCE, metavar='SECONDS',
+                       help=f'Seconds of quiet after which a burst of saves is pushed in watch mode (default: {DEBOUNCE})')
+    parser.add_argument('--poll-interval', type=float, metavar='SECONDS',
+                       help='Scan the watched directory this often instead of using inotify')
+    parser.add_argument('--max-in-flight', type=int,
+                       help='Concurrent edits in manifest mode (default: the wiki\'s "max_in_flight" from wiki_config.json)')
+    parser.add_argument('--maxlag', type=int, metavar='SECONDS',
+                       help=f'Replication lag at which the wiki should refuse requests (default: the wiki\'s "maxlag" '
+                            f'from wiki_config.json, or {DEFAULT_MAXLAG})')
+    parser.add_argument('--max-rate', type=float, metavar='REQUESTS',
+                       help='Highest request rate per second (default: the wiki\'s "max_rate" from wiki_config.json; '
+                            'without one the rate only follows the wiki\'s feedback)')
+    parser.add_argument('--session-cache', action='store_true',
+                       help='Reuse an encrypted cached login session between runs (requires the cryptography package)')
+    parser.add_argument('--force', action='store_true',
+                       help='Submit even if the wiki page already has the same content')
+    parser.add_argument('--keep-log', action='store_true',
+                       help='Keep the JSON Lines run journal (/tmp/wiki_submission_<pid>.jsonl) after the run')
+    parser.add_argument('--metrics-textfile', metavar='PATH',
+                       help='Write per-wiki latency, retry, error, byte and pacing metrics as a Prometheus textfile at exit')
+    parser.add_argument('--metrics-json', metavar='PATH',
+                       help='Write a JSON summary of the same metrics at exit')
     
     args = parser.parse_args()
     
+    # The API URL is optional, so "title file" lands in the first two positionals
+    if args.wiki_api_url and args.page_title and not args.content_file:
+        args.wiki_api_url, args.page_title, args.content_file = None, args.wiki_api_url, args.page_title
+    
+    if args.manifest or args.watch:
+        if args.content_file:
+            parser.error("--manifest and --watch only accept the wiki API URL as a positional argument")
+    elif not args.page_title or not args.content_file:
+        parser.error("page_title and content_file are required unless --manifest or --watch is given")
+    
     # Create bot instance
     bot = StandardWikiBot()
+    if args.keep_log:
+        bot.journal.keep = True
+        print(f"\033[0;34m[INFO]\033[0m Run journal: {bot.log_file}")
+    export_at_exit(args.metrics_textfile, args.metrics_json)
     
     # Load credentials
     if args.credentials:
@@ -374,6 +805,60 @@ def main():
         print("\033[0;31m[ERROR]\033[0m No wiki API URL provided.")
         sys.exit(1)
     
+    bot.skip_unchanged = not args.force
+    
+    maxlag, max_rate = get_configured_pacing(bot.wiki_api_url)
+    bot.maxlag = args.maxlag if args.maxlag is not None else maxlag
+    max_rate = args.max_rate if args.max_rate is not None else max_rate
+    if max_rate is not None:
+        get_rate_limiter(bot.wiki_api_url).set_max_rate(max_rate)
+    
+    if args.session_cache:
+        try:
+            bot.session_cache = WikiSessionCache()
+        except Exception as e:
+            print(f"\033[0;31m[ERROR]\033[0m {e}")
+            sys.exit(1)
+    
+    manifest = None
+    if args.manifest:
+        try:
+            manifest = load_manifest(args.manifest, args.edit_summary)
+        except Exception as e:
+            print(f"\033[0;31m[ERROR]\033[0m Failed to load manifest {args.manifest}: {e}")
+            sys.exit(1)
+    max_in_flight = args.max_in_flight or get_configured_max_in_flight(bot.wiki_api_url)
+    
+    if args.watch:
+        try:
+            watcher = ContentWatcher(args.watch, [entry["content_file"] for entry in manifest] if manifest else None,
+                                     args.debounce, args.poll_interval)
+        except Exception as e:
+            print(f"\033[0;31m[ERROR]\033[0m Cannot watch {args.watch}: {e}")
+            sys.exit(1)
+        print(f"\033[0;34m[INFO]\033[0m Watching {watcher.directory} ({watcher.backend}). Press Ctrl+C to stop.")
+        try:
+            bot.watch(bot.wiki_api_url, watcher, args.edit_summary, manifest, max_in_flight)
+        except KeyboardInterrupt:
+            print("\n\033[0;34m[INFO]\033[0m Stopped watching")
+        except Exception as e:
+            print(f"\n\033[0;31m[ERROR]\033[0m {e}")
+            sys.exit(1)
+        finally:
+            watcher.close()
+        return
+    
+    if manifest is not None:
+        try:
+            results = bot.submit_manifest(bot.wiki_api_url, manifest, max_in_flight)
+        except Exception as e:
+            print(f"\n\033[0;31m[ERROR]\033[0m {e}")
+            sys.exit(1)
+        bot.print_manifest_report(results)
+        if any(result["status"] == "failed" for result in results):
+            sys.exit(1)
+        return
+    
     try:
         bot.submit_content(bot.wiki_api_url, args.page_title, args.content_file, args.edit_summary)
         print("\n\033[0;34m[INFO]\033[0m Process completed successfully!")
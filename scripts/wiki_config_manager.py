@@ -4,25 +4,280 @@ Wiki Configuration Manager
 Handles loading and managing wiki configurations from JSON files.
 """
 
+import hashlib
 import json
+import marshal
 import os
+import re
+import stat
 import sys
-from typing import Dict, Any, Optional
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+try:
+    import fcntl
+except ImportError:
+    # Not available on Windows, where writes are still atomic but not locked
+    fcntl = None
+
+from wiki_rules import RuleSet, compile_rules
+from wiki_search import WikiSearchIndex
+
+# Concurrent edits allowed against a wiki that doesn't set "max_in_flight"
+DEFAULT_MAX_IN_FLIGHT = 4
+
+# Replication lag in seconds a wiki that doesn't set "maxlag" may have before
+# it refuses the bots' requests, as recommended for bots on MediaWiki.org
+DEFAULT_MAXLAG = 5
+
+# Bump when the layout of the on-disk merged config cache changes
+CONFIG_CACHE_VERSION = 2
+
+# Categories shown by the interactive selector, in display order; explicit
+# categories not listed here are shown before "Other"
+WIKI_CATEGORIES = ["Wikimedia Foundation", "Technology", "Fandom", "Other"]
+
+# Category of each "family" value a wiki may declare
+WIKI_FAMILY_CATEGORIES = {
+    "wikimedia": "Wikimedia Foundation",
+    "technology": "Technology",
+    "fandom": "Fandom"
+}
+
+# Name keywords used to categorize wikis that declare neither "category" nor "family"
+WIKIMEDIA_NAMES = ["wikipedia", "wiktionary", "wikibooks", "wikiquote", "wikisource", "wikiversity",
+                   "wikidata", "wikimedia commons"]
+TECHNOLOGY_NAMES = ["arch wiki", "ubuntu wiki", "debian wiki", "gentoo wiki", "fedora wiki", "python wiki"]
+
+DEFAULT_PORTS = {"https": 443, "http": 80}
+
+# Files of a sharded configuration directory (wikis.d/): the index maps wiki IDs
+# to shard files, the summaries hold what listing and lookups need of each wiki
+SHARD_INDEX_FILE = "index.json"
+SHARD_SUMMARIES_FILE = "summaries.json"
+SHARD_INDEX_VERSION = 1
+
+# URLs already in normalized form, which normalize_api_url() returns unchanged
+NORMALIZED_API_URL = re.compile(r"https?://[a-z0-9.\-]+/(?:[^/?#\s]+(?:/[^/?#\s]+)*)?")
+
+def get_cache_dir() -> str:
+    """
+    Get the directory for the tool's cache files.
+    
+    Returns:
+        $XDG_CACHE_HOME/secure-wiki-automation, or ~/.cache/secure-wiki-automation
+    """
+    cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(cache_home, "secure-wiki-automation")
+
+def get_config_dir() -> str:
+    """
+    Get the directory for the tool's per-user settings and keys.
+    
+    Returns:
+        $XDG_CONFIG_HOME/secure-wiki-automation, or ~/.config/secure-wiki-automation
+    """
+    config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.join(os.path.expanduser("~"), ".config")
+    return os.path.join(config_home, "secure-wiki-automation")
+
+def file_signature(path: str) -> Optional[Tuple[str, int, int]]:
+    """
+    Identify the current version of a file without reading it.
+    
+    Args:
+        path: Path to the file
+        
+    Returns:
+        (absolute path, mtime in nanoseconds, size), or None if the file doesn't exist
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+
+def normalize_api_url(api_url: str) -> str:
+    """
+    Normalize an API URL so equivalent spellings compare equal.
+    
+    The scheme and host are lowercased, default ports, repeated slashes, the
+    query and the fragment are dropped.
+    
+    Args:
+        api_url: The API URL
+        
+    Returns:
+        The normalized URL
+    """
+    if NORMALIZED_API_URL.fullmatch(api_url):
+        return api_url
+    parts = urlsplit(api_url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"
+    try:
+        port = parts.port
+    except ValueError:
+        port = None
+    netloc = host if port is None or port == DEFAULT_PORTS.get(scheme) else f"{host}:{port}"
+    path = "/".join(segment for segment in parts.path.split("/") if segment)
+    return f"{scheme}://{netloc}/{path}"
+
+def write_json_atomic(path: str, data: Any, sync: bool = False) -> None:
+    """
+    Write a JSON file so readers see either the old or the new contents, never a partial file.
+    
+    The data is written to a temporary file in the same directory, which then
+    replaces the file. The file keeps its permissions; a new file gets mode 600.
+    
+    Args:
+        path: The file to write
+        data: The data to serialize
+        sync: Flush the data to disk before replacing the file, so a crash cannot leave it empty
+    """
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, 'w') as f:
+            try:
+                os.chmod(temp_path, stat.S_IMODE(os.stat(path).st_mode))
+            except FileNotFoundError:
+                pass
+            json.dump(data, f, indent=2)
+            f.write("\n")
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+@contextmanager
+def locked(path: str) -> Iterator[None]:
+    """
+    Hold an exclusive advisory lock for updating a file.
+    
+    The lock is taken on a "<path>.lock" file beside it rather than on the file
+    itself, which write_json_atomic() replaces. Only processes updating the
+    same file wait for each other; readers never take the lock.
+    
+    Args:
+        path: The file about to be updated
+    """
+    fd = os.open(f"{path}.lock", os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        # Closing the descriptor releases the lock
+        os.close(fd)
+
+
+def get_wiki_category(wiki_config: Dict[str, Any]) -> str:
+    """
+    Get the category a wiki is listed under.
+    
+    Args:
+        wiki_config: The wiki configuration
+        
+    Returns:
+        The explicit "category", the category of its "family", or one guessed from the wiki name
+    """
+    if wiki_config.get("category"):
+        return wiki_config["category"]
+    family = wiki_config.get("family")
+    if family:
+        return WIKI_FAMILY_CATEGORIES.get(family.lower(), family)
+    
+    wiki_name = wiki_config.get("name", "").lower()
+    if any(name in wiki_name for name in WIKIMEDIA_NAMES):
+        return "Wikimedia Foundation"
+    if any(name in wiki_name for name in TECHNOLOGY_NAMES):
+        return "Technology"
+    if "fandom" in wiki_name:
+        return "Fandom"
+    return "Other"
+
+def categorize_wikis(wiki_list: Dict[str, Dict[str, Any]]) -> Dict[str, List[str]]:
+    """
+    Group wikis by category.
+    
+    Args:
+        wiki_list: Dictionary of wiki configurations keyed by wiki ID
+        
+    Returns:
+        Dictionary with every category of WIKI_CATEGORIES, plus any explicit ones,
+        as keys in display order and lists of wiki IDs as values
+    """
+    categories = {category: [] for category in WIKI_CATEGORIES}
+    for wiki_id, wiki_config in wiki_list.items():
+        categories.setdefault(get_wiki_category(wiki_config), []).append(wiki_id)
+    # Keep "Other" last after explicit categories were appended
+    categories["Other"] = categories.pop("Other")
+    return categories
+
+def apply_wiki_defaults(defaults: Dict[str, Any], wiki_config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Complete a wiki configuration from a shard's family-level defaults.
+    
+    Keys set by the wiki override the defaults, except "validation_rules",
+    which adds to the default rules. "{name}" in a default "user_agent" is
+    replaced with the wiki's name.
+    
+    Args:
+        defaults: The "defaults" of the shard
+        wiki_config: The wiki's own configuration
+        
+    Returns:
+        The complete wiki configuration
+    """
+    merged = dict(defaults)
+    merged.update(wiki_config)
+    if isinstance(defaults.get("validation_rules"), dict):
+        # A copy even without own rules, so wikis never share one rules dictionary
+        merged["validation_rules"] = {**defaults["validation_rules"], **wiki_config.get("validation_rules", {})}
+    if "user_agent" not in wiki_config and "{name}" in merged.get("user_agent", ""):
+        merged["user_agent"] = merged["user_agent"].replace("{name}", merged.get("name", ""))
+    return merged
 
 class WikiConfigManager:
-    def __init__(self, config_file: str = "wiki_config.json", user_config_file: str = "user_wikis.json"):
+    def __init__(self, config_file: str = "wiki_config.json", user_config_file: str = "user_wikis.json",
+                 cache_dir: Optional[str] = None, use_disk_cache: bool = True):
         """
         Initialize the WikiConfigManager.
         
         Args:
-            config_file: Path to the main configuration file
+            config_file: Path to the main configuration file, or to a sharded
+                configuration directory (see wiki_config_shards.py)
             user_config_file: Path to the user configuration file
+            cache_dir: Directory for the on-disk merged config cache; defaults to a
+                "config" directory in the tool's cache dir
+            use_disk_cache: Whether to keep the parsed configuration on disk for fast startup
         """
         self.config_file = config_file
         self.user_config_file = user_config_file
         self.config = {}
         self.user_config = {}
         self.merged_config = {}
+        # Compiled validation rules by wiki ID, reset whenever the configuration is reloaded
+        self.compiled_rules = {}
+        self.cache_dir = cache_dir or os.path.join(get_cache_dir(), "config")
+        self.use_disk_cache = use_disk_cache
+        # File signatures of both configuration files the merged config was built from
+        self.config_signature = None
+        # Lookup indexes over the merged config, built on first use after each reload
+        self.indexes = None
+        # Sharded configuration: shard file by wiki ID, the shard files loaded so
+        # far, and the wiki summaries once needed
+        self.shard_index = {}
+        self.loaded_shards = set()
+        self.all_shards_loaded = False
+        self.shard_summaries = None
         
     def load_config(self) -> Dict[str, Any]:
         """
@@ -35,6 +290,12 @@ class WikiConfigManager:
             FileNotFoundError: If the config file doesn't exist
             json.JSONDecodeError: If the config file is invalid JSON
         """
+        self.shard_index = {}
+        self.loaded_shards = set()
+        self.all_shards_loaded = False
+        self.shard_summaries = None
+        if self.is_sharded():
+            return self._load_shard_index()
         try:
             with open(self.config_file, 'r') as f:
                 self.config = json.load(f)
@@ -44,6 +305,56 @@ class WikiConfigManager:
         except json.JSONDecodeError as e:
             raise json.JSONDecodeError(f"Invalid JSON in configuration file '{self.config_file}': {e.msg}", e.doc, e.pos)
     
+    def is_sharded(self) -> bool:
+        """
+        Check whether the main configuration is a sharded directory.
+        
+        Returns:
+            True if config_file is a directory of shards
+        """
+        return os.path.isdir(self.config_file)
+    
+    def _load_shard_index(self) -> Dict[str, Any]:
+        """Load the index of a sharded configuration; wikis are loaded from their shards on demand."""
+        index_file = os.path.join(self.config_file, SHARD_INDEX_FILE)
+        try:
+            with open(index_file, 'r') as f:
+                index = json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Configuration index '{index_file}' not found.")
+        except json.JSONDecodeError as e:
+            raise json.JSONDecodeError(f"Invalid JSON in configuration index '{index_file}': {e.msg}", e.doc, e.pos)
+        if index.get("version") != SHARD_INDEX_VERSION:
+            raise ValueError(f"Unsupported configuration index version in '{index_file}': {index.get('version')}")
+        self.shard_index = index.get("wikis", {})
+        self.config = {"wikis": {}}
+        if "default_wiki" in index:
+            self.config["default_wiki"] = index["default_wiki"]
+        return self.config
+    
+    def _load_shard_file(self, name: str) -> Dict[str, Any]:
+        """Parse one file of a sharded configuration directory."""
+        shard_file = os.path.join(self.config_file, name)
+        try:
+            with open(shard_file, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Configuration shard '{shard_file}' not found.")
+        except json.JSONDecodeError as e:
+            raise json.JSONDecodeError(f"Invalid JSON in configuration shard '{shard_file}': {e.msg}", e.doc, e.pos)
+    
+    def _load_shard(self, shard: str) -> None:
+        """Load the wikis of one shard file into the merged configuration."""
+        data = self._load_shard_file(shard)
+        defaults = data.get("defaults", {})
+        wikis = self.merged_config.setdefault("wikis", {})
+        user_wikis = self.user_config.get("wikis", {})
+        for wiki_id, wiki_config in data.get("wikis", {}).items():
+            # User configuration takes precedence, as in merge_configs()
+            if wiki_id not in user_wikis:
+                wikis[wiki_id] = apply_wiki_defaults(defaults, wiki_config)
+        self.loaded_shards.add(shard)
+    
     def load_user_config(self) -> Dict[str, Any]:
         """
         Load the user configuration file if it exists.
@@ -51,6 +362,7 @@ class WikiConfigManager:
         Returns:
             Dictionary containing the user configuration data, or empty dict if file doesn't exist
         """
+        self.user_config = {}
         if os.path.exists(self.user_config_file):
             try:
                 with open(self.user_config_file, 'r') as f:
@@ -66,9 +378,29 @@ class WikiConfigManager:
         Merge the main configuration with the user configuration.
         User configurations take precedence over main configurations.
         
+        The result is cached by the path, modification time and size of both
+        files, so the files are only read again after one of them changes. A
+        process starting against unchanged files loads the parsed result from
+        the on-disk cache instead of parsing the JSON.
+        
+        With a sharded configuration only its index is read here (and its
+        modification time checked); wikis are added as their shards are loaded.
+        
         Returns:
             Dictionary containing the merged configuration data
         """
+        sharded = self.is_sharded()
+        main_file = os.path.join(self.config_file, SHARD_INDEX_FILE) if sharded else self.config_file
+        signature = (file_signature(main_file), file_signature(self.user_config_file))
+        if self.merged_config and signature == self.config_signature:
+            return self.merged_config
+        
+        self.compiled_rules = {}
+        self.indexes = None
+        if signature[0] is not None and not sharded and self._load_disk_cache(signature):
+            self.config_signature = signature
+            return self.merged_config
+        
         # Load both configurations
         self.load_config()
         self.load_user_config()
@@ -85,9 +417,68 @@ class WikiConfigManager:
         # Update default wiki if specified in user config
         if "default_wiki" in self.user_config:
             self.merged_config["default_wiki"] = self.user_config["default_wiki"]
-            
+        
+        self.config_signature = signature
+        if not sharded:
+            self._save_disk_cache(signature)
         return self.merged_config
     
+    def _disk_cache_path(self, kind: str = "") -> str:
+        """Get the cache file for this pair of configuration files, or for an index built from them."""
+        key = hashlib.sha256(f"{os.path.abspath(self.config_file)}\0{os.path.abspath(self.user_config_file)}"
+                             .encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.cache_dir, f"{key}.{kind}.marshal" if kind else f"{key}.marshal")
+    
+    def _read_disk_cache(self, path: str, signature: Tuple) -> Optional[Any]:
+        """Read an on-disk cache entry, or None if it is missing or was written for other files."""
+        if not self.use_disk_cache:
+            return None
+        try:
+            with open(path, 'rb') as f:
+                # One read: marshal.load() on a file object reads it piecemeal and is several times slower
+                version, python, cached_signature, data = marshal.loads(f.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        # marshal's format is specific to the Python version that wrote it
+        if version != CONFIG_CACHE_VERSION or python != tuple(sys.version_info[:2]) or cached_signature != signature:
+            return None
+        return data
+    
+    def _write_disk_cache(self, path: str, signature: Tuple, data: Any) -> None:
+        """Write an on-disk cache entry, ignoring failures."""
+        if not self.use_disk_cache:
+            return
+        entry = (CONFIG_CACHE_VERSION, tuple(sys.version_info[:2]), signature, data)
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            data = marshal.dumps(entry)
+            fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                # Atomic, so concurrent runs never read a partly written cache
+                os.replace(temp_path, path)
+            except OSError:
+                os.unlink(temp_path)
+                raise
+        except (OSError, ValueError):
+            # The cache is only an optimization; a read-only cache dir or
+            # unmarshallable values just mean the next run parses the JSON again
+            pass
+    
+    def _load_disk_cache(self, signature: Tuple) -> bool:
+        """Load the parsed configuration from the on-disk cache if it matches the files."""
+        cached = self._read_disk_cache(self._disk_cache_path(), signature)
+        if cached is None:
+            return False
+        self.config, self.user_config, self.merged_config = cached
+        return True
+    
+    def _save_disk_cache(self, signature: Tuple) -> None:
+        """Write the parsed configuration to the on-disk cache, ignoring failures."""
+        self._write_disk_cache(self._disk_cache_path(), signature,
+                               (self.config, self.user_config, self.merged_config))
+    
     def get_wiki_config(self, wiki_id: str) -> Optional[Dict[str, Any]]:
         """
         Get the configuration for a specific wiki.
@@ -98,23 +489,58 @@ class WikiConfigManager:
         Returns:
             Dictionary containing the wiki configuration, or None if not found
         """
-        if not self.merged_config:
-            self.merge_configs()
-            
-        return self.merged_config.get("wikis", {}).get(wiki_id)
+        self.merge_configs()
+        
+        wikis = self.merged_config.get("wikis", {})
+        if wiki_id not in wikis and wiki_id in self.shard_index:
+            # Sharded configuration: load only the shard holding this wiki
+            self._load_shard(self.shard_index[wiki_id])
+        return wikis.get(wiki_id)
     
     def get_wiki_list(self) -> Dict[str, Dict[str, Any]]:
         """
         Get a list of all available wikis.
         
+        With a sharded configuration this loads every shard; use
+        get_wiki_summaries() to list wikis without loading them.
+        
         Returns:
             Dictionary of wiki configurations keyed by wiki ID
         """
-        if not self.merged_config:
-            self.merge_configs()
-            
+        self.merge_configs()
+        
+        if self.shard_index and not self.all_shards_loaded:
+            for shard in self.shard_index.values():
+                if shard not in self.loaded_shards:
+                    self._load_shard(shard)
+            # Index order, as a single file would list them, then wikis only in the user config
+            wikis = self.merged_config.get("wikis", {})
+            ordered = {wiki_id: wikis[wiki_id] for wiki_id in self.shard_index if wiki_id in wikis}
+            ordered.update(wikis)
+            self.merged_config["wikis"] = ordered
+            self.all_shards_loaded = True
         return self.merged_config.get("wikis", {})
     
+    def get_wiki_summaries(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the name, API URL and category of all available wikis.
+        
+        With a sharded configuration these come from its summaries file, so no
+        shard is loaded; otherwise the full wiki configurations are returned.
+        
+        Returns:
+            Dictionary of wiki configurations or summaries keyed by wiki ID
+        """
+        self.merge_configs()
+        
+        if not self.shard_index:
+            return self.get_wiki_list()
+        if self.shard_summaries is None:
+            summaries = self._load_shard_file(SHARD_SUMMARIES_FILE)
+            summaries.update(self.user_config.get("wikis", {}))
+            self.shard_summaries = summaries
+        return self.shard_summaries
+    
     def get_default_wiki(self) -> str:
         """
         Get the default wiki ID.
@@ -122,33 +548,222 @@ class WikiConfigManager:
         Returns:
             The ID of the default wiki
         """
-        if not self.merged_config:
-            self.merge_configs()
-            
+        self.merge_configs()
+        
         return self.merged_config.get("default_wiki", "")
     
+    def get_max_in_flight(self, wiki_id: str) -> int:
+        """
+        Get how many edits may be in flight at once against a wiki.
+        
+        Args:
+            wiki_id: The ID of the wiki
+            
+        Returns:
+            The wiki's "max_in_flight" setting, or DEFAULT_MAX_IN_FLIGHT if unset
+        """
+        wiki_config = self.get_wiki_config(wiki_id) or {}
+        return max(1, int(wiki_config.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT)))
+    
+    def get_maxlag(self, wiki_id: str) -> Optional[int]:
+        """
+        Get the maxlag parameter sent with every request to a wiki.
+        
+        Args:
+            wiki_id: The ID of the wiki
+            
+        Returns:
+            The wiki's "maxlag" setting, DEFAULT_MAXLAG if unset, or None if set
+            to null to send no maxlag parameter
+        """
+        wiki_config = self.get_wiki_config(wiki_id) or {}
+        maxlag = wiki_config.get("maxlag", DEFAULT_MAXLAG)
+        return None if maxlag is None else max(0, int(maxlag))
+    
+    def get_max_rate(self, wiki_id: str) -> Optional[float]:
+        """
+        Get the highest request rate the bots may reach against a wiki.
+        
+        Args:
+            wiki_id: The ID of the wiki
+            
+        Returns:
+            The wiki's "max_rate" setting in requests per second, or None if unset,
+            leaving the rate to the wiki's feedback alone
+        """
+        wiki_config = self.get_wiki_config(wiki_id) or {}
+        max_rate = wiki_config.get("max_rate")
+        return None if max_rate is None else float(max_rate)
+    
+    def get_validation_rules(self, wiki_id: str) -> RuleSet:
+        """
+        Get the compiled validation rules of a wiki.
+        
+        Rules are compiled on first use and cached until the configuration is
+        reloaded, so validating many pages never recompiles them.
+        
+        Args:
+            wiki_id: The ID of the wiki
+            
+        Returns:
+            The compiled rule set; empty if the wiki is unknown or has no rules
+            
+        Raises:
+            ValueError: If a rule in the configuration is malformed
+        """
+        # Reloading a changed configuration clears the compiled rules
+        self.merge_configs()
+        if wiki_id not in self.compiled_rules:
+            wiki_config = self.get_wiki_config(wiki_id) or {}
+            self.compiled_rules[wiki_id] = compile_rules(wiki_config.get("validation_rules", {}))
+        return self.compiled_rules[wiki_id]
+    
+    def get_index(self, name: str) -> Dict[str, Any]:
+        """
+        Get a lookup index over the configured wikis.
+        
+        Each index is built in one pass the first time it is needed after the
+        configuration is (re)loaded.
+        
+        Args:
+            name: "api_url" (API URL, as configured and normalized, to wiki ID),
+                "host" (host name to wiki IDs) or "category" (categorize_wikis() result)
+            
+        Returns:
+            The index
+        """
+        wiki_list = self.get_wiki_summaries()
+        if self.indexes is None:
+            self.indexes = {}
+        if name not in self.indexes:
+            if name == "category":
+                self.indexes[name] = categorize_wikis(wiki_list)
+            elif name in ("api_url", "host"):
+                by_api_url, by_host = {}, {}
+                for wiki_id, wiki_config in wiki_list.items():
+                    api_url = wiki_config.get("api_url")
+                    if not api_url:
+                        continue
+                    normalized = normalize_api_url(api_url)
+                    # The first wiki configured for a URL wins, as with the previous linear scan.
+                    # The URL as written is indexed too, so exact lookups skip normalization.
+                    by_api_url.setdefault(normalized, wiki_id)
+                    by_api_url.setdefault(api_url, wiki_id)
+                    # Normalized URLs are "scheme://host[:port]/path", so no need to parse them again
+                    netloc = normalized.split("/", 3)[2]
+                    host = netloc[1:netloc.find("]")] if netloc.startswith("[") else netloc.partition(":")[0]
+                    by_host.setdefault(host, []).append(wiki_id)
+                self.indexes["api_url"], self.indexes["host"] = by_api_url, by_host
+            else:
+                raise ValueError(f"Unknown index '{name}'")
+        return self.indexes[name]
+    
+    def find_wiki_id_by_api_url(self, api_url: str) -> Optional[str]:
+        """
+        Find the ID of a configured wiki by its API URL.
+        
+        Args:
+            api_url: The API URL to look up; case of the host, default ports and
+                duplicate slashes are ignored
+            
+        Returns:
+            The wiki ID, or None if no configured wiki uses this URL
+        """
+        by_api_url = self.get_index("api_url")
+        return by_api_url.get(api_url) or by_api_url.get(normalize_api_url(api_url))
+    
+    def find_wiki_ids_by_host(self, host: str) -> List[str]:
+        """
+        Find the IDs of the configured wikis served from a host.
+        
+        Args:
+            host: The host name, e.g. "wiki.archlinux.org"
+            
+        Returns:
+            List of wiki IDs, empty if none
+        """
+        return list(self.get_index("host").get(host.lower(), []))
+    
+    def get_wikis_by_category(self) -> Dict[str, List[str]]:
+        """
+        Get the configured wikis grouped by category.
+        
+        A wiki's category is its "category" field, the category of its
+        "family" field, or guessed from its name.
+        
+        Returns:
+            Dictionary with categories as keys in display order and lists of wiki IDs as values
+        """
+        return self.get_index("category")
+    
+    def get_search_index(self) -> WikiSearchIndex:
+        """
+        Get the fuzzy search index over the configured wikis' IDs, names and hosts.
+        
+        The index is built once per version of the configuration files and
+        kept in the on-disk cache, so later runs load it instead of building it.
+        
+        Returns:
+            The search index
+        """
+        self.merge_configs()
+        if self.indexes is None:
+            self.indexes = {}
+        if "search" not in self.indexes:
+            path = self._disk_cache_path("search")
+            search_index = WikiSearchIndex.from_state(self._read_disk_cache(path, self.config_signature))
+            if search_index is None:
+                search_index = WikiSearchIndex(self.get_wiki_summaries())
+                self._write_disk_cache(path, self.config_signature, search_index.to_state())
+            self.indexes["search"] = search_index
+        return self.indexes["search"]
+    
+    def search_wikis(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """
+        Find configured wikis by part of their ID, name or host, tolerating typos.
+        
+        Args:
+            query: Free text, e.g. "arch" or "memory alpha"
+            limit: Maximum number of matches
+            
+        Returns:
+            List of (wiki_id, score) tuples, best first; a score of 1.0 or more
+            means every trigram of the query matched
+        """
+        return self.get_search_index().search(query, limit)
+    
     def add_wiki(self, wiki_id: str, wiki_config: Dict[str, Any]) -> None:
         """
         Add a new wiki to the user configuration.
         
+        Safe to call from many processes at once: the user configuration is
+        re-read under a lock on that file, the wiki is merged into what is
+        there now, and the result is written atomically, so wikis added
+        concurrently by other processes are kept and the file is never left
+        half-written.
+        
         Args:
             wiki_id: The ID for the new wiki
             wiki_config: Dictionary containing the wiki configuration
         """
-        # Load user config or create empty if it doesn't exist
-        self.load_user_config()
-        
-        # Add or update wikis in user config
-        if "wikis" not in self.user_config:
-            self.user_config["wikis"] = {}
-        self.user_config["wikis"][wiki_id] = wiki_config
-        
-        # Save the updated user config
         try:
-            with open(self.user_config_file, 'w') as f:
-                json.dump(self.user_config, f, indent=2)
+            with locked(self.user_config_file):
+                user_config = {}
+                if os.path.exists(self.user_config_file):
+                    with open(self.user_config_file, 'r') as f:
+                        user_config = json.load(f)
+                # Add or update wikis in user config
+                user_config.setdefault("wikis", {})[wiki_id] = wiki_config
+                write_json_atomic(self.user_config_file, user_config, sync=True)
+                self.user_config = user_config
+        except json.JSONDecodeError as e:
+            # Never replace a file we could not read, and lose the wikis in it
+            raise Exception(f"Failed to save user configuration: invalid JSON in '{self.user_config_file}': {e.msg}")
         except Exception as e:
             raise Exception(f"Failed to save user configuration: {e}")
+        finally:
+            # Reload on next use, even if the write left the file's mtime unchanged
+            self.config_signature = None
     
     def validate_api_url(self, api_url: str) -> bool:
         """
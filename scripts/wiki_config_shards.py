@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Wiki Config Shards
+Splits a wiki_config.json registry into a sharded configuration directory
+(wikis.d/) that WikiConfigManager loads lazily.
+
+The directory holds one JSON shard per wiki family (category), or per wiki,
+an index.json mapping every wiki ID to its shard, and a summaries.json with
+the name, API URL and category needed to list and look up wikis without
+opening the shards. Settings shared by all wikis of a shard are stored once in
+its "defaults":
+
+    {
+      "defaults": {"user_agent": "WikiSecureBot/1.0 ({name})",
+                   "validation_rules": {"categories": "[[Category:"}},
+      "wikis": {
+        "wikipedia": {"name": "Wikipedia", "api_url": "https://en.wikipedia.org/api.php",
+                      "validation_rules": {"infobox": "{{Infobox"}}
+      }
+    }
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from typing import Any, Dict, List, Tuple
+
+from wiki_config_manager import (SHARD_INDEX_FILE, SHARD_INDEX_VERSION, SHARD_SUMMARIES_FILE, get_wiki_category,
+                                 write_json_atomic)
+
+# Keys that identify a wiki and are never moved into a shard's defaults
+WIKI_IDENTITY_KEYS = ["name", "api_url"]
+
+
+def shard_file_name(name: str) -> str:
+    """Turn a category or wiki ID into a shard file name."""
+    file_name = (re.sub(r"[^a-z0-9]+", "_", name.lower()).strip("_") or "wikis") + ".json"
+    # Never overwrite the index or the summaries
+    return "shard_" + file_name if file_name in (SHARD_INDEX_FILE, SHARD_SUMMARIES_FILE) else file_name
+
+
+def extract_defaults(wikis: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """
+    Move the settings all wikis of a shard share into shard-level defaults.
+
+    apply_wiki_defaults() on the result gives back the original configurations.
+
+    Args:
+        wikis: Wiki configurations keyed by wiki ID
+
+    Returns:
+        Tuple containing (defaults, wikis without the settings moved into defaults)
+    """
+    if len(wikis) < 2:
+        return {}, wikis
+    configs = list(wikis.values())
+    first = configs[0]
+    defaults = {}
+
+    for key, value in first.items():
+        if key in WIKI_IDENTITY_KEYS or key in ("user_agent", "validation_rules"):
+            continue
+        if all(key in config and config[key] == value for config in configs):
+            defaults[key] = value
+
+    # User agents that only differ by the wiki name become a "{name}" template
+    user_agent = first.get("user_agent")
+    if isinstance(user_agent, str) and "{name}" not in user_agent:
+        template = user_agent.replace(first["name"], "{name}") if first.get("name") else user_agent
+        if all(isinstance(config.get("user_agent"), str) and
+               config["user_agent"] == template.replace("{name}", config.get("name", "")) for config in configs):
+            defaults["user_agent"] = template
+
+    # Rules every wiki has, with the same specification
+    if all(isinstance(config.get("validation_rules"), dict) for config in configs):
+        common_rules = {name: spec for name, spec in first["validation_rules"].items()
+                        if all(config["validation_rules"].get(name, None) == spec for config in configs)}
+        if common_rules:
+            defaults["validation_rules"] = common_rules
+
+    stripped = {}
+    for wiki_id, config in wikis.items():
+        own = {key: value for key, value in config.items() if key not in defaults}
+        if "validation_rules" in defaults:
+            own_rules = {name: spec for name, spec in config["validation_rules"].items()
+                         if name not in defaults["validation_rules"]}
+            if own_rules:
+                own["validation_rules"] = own_rules
+        stripped[wiki_id] = own
+    return defaults, stripped
+
+
+def export_shards(config: Dict[str, Any], output_dir: str, per_wiki: bool = False) -> Dict[str, List[str]]:
+    """
+    Write a configuration as a sharded configuration directory.
+
+    The index is written last. WikiConfigManager only notices changes to the
+    directory through the index's modification time, and a process reading
+    the directory meanwhile keeps using the previous index until the new one
+    is complete.
+
+    Args:
+        config: A configuration in the wiki_config.json format
+        output_dir: Directory to write the shards and index.json to; created if needed
+        per_wiki: Write one shard per wiki instead of one per family
+
+    Returns:
+        Dictionary with shard file names as keys and the wiki IDs in each shard as values
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    shards = {}
+    categories = {}
+    for wiki_id, wiki_config in config.get("wikis", {}).items():
+        categories[wiki_id] = get_wiki_category(wiki_config)
+        shard = shard_file_name(wiki_id if per_wiki else categories[wiki_id])
+        shards.setdefault(shard, {})[wiki_id] = wiki_config
+
+    index = {"version": SHARD_INDEX_VERSION, "wikis": {}}
+    if "default_wiki" in config:
+        index["default_wiki"] = config["default_wiki"]
+    for shard, wikis in shards.items():
+        defaults, stripped = extract_defaults(wikis)
+        data = {"defaults": defaults, "wikis": stripped} if defaults else {"wikis": stripped}
+        write_json_atomic(os.path.join(output_dir, shard), data)
+    # Index and summaries in the original order of the wikis
+    summaries = {}
+    for wiki_id, wiki_config in config.get("wikis", {}).items():
+        index["wikis"][wiki_id] = shard_file_name(wiki_id if per_wiki else categories[wiki_id])
+        summaries[wiki_id] = {"name": wiki_config.get("name", wiki_id), "api_url": wiki_config.get("api_url", ""),
+                              "category": categories[wiki_id]}
+    write_json_atomic(os.path.join(output_dir, SHARD_SUMMARIES_FILE), summaries)
+    write_json_atomic(os.path.join(output_dir, SHARD_INDEX_FILE), index)
+    return {shard: list(wikis) for shard, wikis in shards.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Split a wiki configuration file into a lazily loaded shard directory')
+    parser.add_argument('config_file', nargs='?', default='wiki_config.json', help='Configuration file to split')
+    parser.add_argument('output_dir', nargs='?', default='wikis.d', help='Directory to write the shards to')
+    parser.add_argument('--per-wiki', action='store_true', help='Write one shard per wiki instead of one per family')
+    args = parser.parse_args()
+
+    try:
+        with open(args.config_file, 'r') as f:
+            config = json.load(f)
+        shards = export_shards(config, args.output_dir, per_wiki=args.per_wiki)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    print(f"Wrote {sum(len(wikis) for wikis in shards.values())} wikis in {len(shards)} shards to {args.output_dir}")
+    for shard, wikis in shards.items():
+        print(f"  {shard}: {len(wikis)} wikis")
+    print(f"Use it with: python3 scripts/wiki_secure_submission.py --config {args.output_dir} ...")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Wiki Diff
+Line-level diff between wiki and local page content that stays fast on
+multi-megabyte pages.
+
+Lines are compared by their (cached) string hashes. Common leading and
+trailing lines are trimmed, then lines that occur exactly once on both sides
+are matched up with a longest increasing subsequence and the stretches between
+them are diffed the same way (patience diff). Stretches without any unique
+line are reported as replaced rather than searched for the smallest edit,
+which keeps the run time close to linear where difflib can go quadratic.
+"""
+
+import bisect
+import os
+import tempfile
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Unified diff lines printed in a validation report; longer diffs go to a file
+DEFAULT_MAX_DIFF_LINES = 60
+
+Opcode = Tuple[str, int, int, int, int]
+
+
+def _unique_anchors(a: List[str], alo: int, ahi: int, b: List[str], blo: int, bhi: int) -> List[Tuple[int, int]]:
+    """Match lines that occur once in both ranges, keeping the longest run in the same order."""
+    counts = {}
+    for i in range(alo, ahi):
+        line = a[i]
+        entry = counts.get(line)
+        counts[line] = [i, None, 1, 0] if entry is None else [entry[0], None, entry[2] + 1, 0]
+    for j in range(blo, bhi):
+        entry = counts.get(b[j])
+        if entry is not None:
+            entry[1] = j
+            entry[3] += 1
+    pairs = sorted((i, j) for i, j, count_a, count_b in counts.values() if count_a == 1 and count_b == 1)
+    if not pairs:
+        return []
+
+    # Longest increasing subsequence of the b positions, in O(k log k)
+    tails, tail_index, previous = [], [], [-1] * len(pairs)
+    for index, (_, j) in enumerate(pairs):
+        position = bisect.bisect_left(tails, j)
+        if position == len(tails):
+            tails.append(j)
+            tail_index.append(index)
+        else:
+            tails[position] = j
+            tail_index[position] = index
+        previous[index] = tail_index[position - 1] if position else -1
+    anchors = []
+    index = tail_index[-1]
+    while index != -1:
+        anchors.append(pairs[index])
+        index = previous[index]
+    anchors.reverse()
+    return anchors
+
+
+def matching_lines(a: List[str], b: List[str]) -> List[Tuple[int, int]]:
+    """
+    Find pairs of equal lines that the diff keeps.
+
+    Args:
+        a: Lines of the old text
+        b: Lines of the new text
+
+    Returns:
+        (index in a, index in b) pairs, increasing in both
+    """
+    matches = []
+    # An explicit stack instead of recursion, so long pages cannot hit the recursion limit
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        alo, ahi, blo, bhi = stack.pop()
+        while alo < ahi and blo < bhi and a[alo] == b[blo]:
+            matches.append((alo, blo))
+            alo += 1
+            blo += 1
+        while alo < ahi and blo < bhi and a[ahi - 1] == b[bhi - 1]:
+            ahi -= 1
+            bhi -= 1
+            matches.append((ahi, bhi))
+        if alo == ahi or blo == bhi:
+            continue
+        anchors = _unique_anchors(a, alo, ahi, b, blo, bhi)
+        for i, j in anchors:
+            matches.append((i, j))
+            stack.append((alo, i, blo, j))
+            alo, blo = i + 1, j + 1
+        if anchors:
+            stack.append((alo, ahi, blo, bhi))
+    matches.sort()
+    return matches
+
+
+def diff_opcodes(a: List[str], b: List[str]) -> List[Opcode]:
+    """
+    Describe how to turn a into b, in the format of difflib.SequenceMatcher.get_opcodes().
+
+    Args:
+        a: Lines of the old text
+        b: Lines of the new text
+
+    Returns:
+        List of (tag, i1, i2, j1, j2) tuples with tags "equal", "replace", "delete" and "insert"
+    """
+    opcodes = []
+    i = j = 0
+    for match_i, match_j in matching_lines(a, b) + [(len(a), len(b))]:
+        if i < match_i and j < match_j:
+            opcodes.append(("replace", i, match_i, j, match_j))
+        elif i < match_i:
+            opcodes.append(("delete", i, match_i, j, j))
+        elif j < match_j:
+            opcodes.append(("insert", i, i, j, match_j))
+        if match_i < len(a):
+            if opcodes and opcodes[-1][0] == "equal":
+                tag, i1, _, j1, _ = opcodes[-1]
+                opcodes[-1] = ("equal", i1, match_i + 1, j1, match_j + 1)
+            else:
+                opcodes.append(("equal", match_i, match_i + 1, match_j, match_j + 1))
+        i, j = match_i + 1, match_j + 1
+    return opcodes
+
+
+def group_opcodes(opcodes: List[Opcode], context: int = 3) -> Iterator[List[Opcode]]:
+    """Split opcodes into hunks with up to context unchanged lines around each change."""
+    if not opcodes:
+        return
+    opcodes = list(opcodes)
+    # Trim unchanged lines at both ends down to the context
+    tag, i1, i2, j1, j2 = opcodes[0]
+    if tag == "equal":
+        opcodes[0] = (tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2)
+    tag, i1, i2, j1, j2 = opcodes[-1]
+    if tag == "equal":
+        opcodes[-1] = (tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context))
+
+    group = []
+    for tag, i1, i2, j1, j2 in opcodes:
+        # Unchanged stretches longer than two contexts end the hunk
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def unified_diff(a: List[str], b: List[str], fromfile: str = "wiki", tofile: str = "local",
+                 context: int = 3) -> Iterator[str]:
+    """
+    Produce unified diff lines, without line endings.
+
+    Args:
+        a: Lines of the old text
+        b: Lines of the new text
+        fromfile: Label of the old text
+        tofile: Label of the new text
+        context: Unchanged lines shown around each change
+
+    Yields:
+        The lines of the diff
+    """
+    started = False
+    for group in group_opcodes(diff_opcodes(a, b), context):
+        if not started:
+            yield f"--- {fromfile}"
+            yield f"+++ {tofile}"
+            started = True
+        first, last = group[0], group[-1]
+        a_start, a_length = first[1], last[2] - first[1]
+        b_start, b_length = first[3], last[4] - first[3]
+        # Empty ranges are numbered by the line before them, as in GNU diff
+        yield (f"@@ -{a_start + 1 if a_length else a_start},{a_length} "
+               f"+{b_start + 1 if b_length else b_start},{b_length} @@")
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for line in a[i1:i2]:
+                    yield " " + line
+                continue
+            for line in a[i1:i2]:
+                yield "-" + line
+            for line in b[j1:j2]:
+                yield "+" + line
+
+
+def summarize_diff(old_text: str, new_text: str, fromfile: str = "wiki", tofile: str = "local",
+                   max_lines: int = DEFAULT_MAX_DIFF_LINES, output_dir: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Diff two texts for a report, keeping only a bounded preview in memory.
+
+    If the unified diff is longer than max_lines, the whole diff is written to
+    a file and only its first max_lines lines are returned.
+
+    Args:
+        old_text: The old text, e.g. the wiki content
+        new_text: The new text, e.g. the local content
+        fromfile: Label of the old text
+        tofile: Label of the new text
+        max_lines: Diff lines kept in the preview
+        output_dir: Directory for the diff file; defaults to the system temp directory
+
+    Returns:
+        Dictionary with "added", "removed", "hunks", "preview" (list of lines),
+        "truncated" and "file" (path of the full diff, or None) keys
+    """
+    a = old_text.splitlines()
+    b = new_text.splitlines()
+    summary = {"added": 0, "removed": 0, "hunks": 0, "preview": [], "truncated": False, "file": None}
+    diff_file = None
+    try:
+        for number, line in enumerate(unified_diff(a, b, fromfile, tofile)):
+            if number < 2:
+                # The "---" and "+++" file headers; content lines may start with "++ " or "-- " too
+                pass
+            elif line.startswith("@@"):
+                summary["hunks"] += 1
+            elif line.startswith("+"):
+                summary["added"] += 1
+            elif line.startswith("-"):
+                summary["removed"] += 1
+
+            if diff_file is not None:
+                diff_file.write(line + "\n")
+            elif len(summary["preview"]) < max_lines:
+                summary["preview"].append(line)
+            else:
+                # Too long to show: spill the preview and the rest to a file
+                fd, summary["file"] = tempfile.mkstemp(prefix="wiki-diff-", suffix=".diff", dir=output_dir)
+                diff_file = os.fdopen(fd, 'w', encoding='utf-8')
+                for preview_line in summary["preview"]:
+                    diff_file.write(preview_line + "\n")
+                diff_file.write(line + "\n")
+                summary["truncated"] = True
+    finally:
+        if diff_file is not None:
+            diff_file.close()
+    return summary
@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+Wiki HTTP Client
+Shared keep-alive HTTP layer for talking to MediaWiki API endpoints.
+"""
+
+import codecs
+import mmap
+import os
+import secrets
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+from typing import Dict, Any, Iterator, List, Optional
+from urllib.parse import quote_plus
+
+from wiki_metrics import get_metrics
+
+DEFAULT_USER_AGENT = "WikiSecureBot/1.0 (Generic Wiki Submission Tool)"
+
+# Same limits the curl based implementation used (--connect-timeout 30 --max-time 120)
+DEFAULT_TIMEOUT = (30, 120)
+
+# Bytes of a content file mapped into memory at a time while it is streamed
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+class WikiHttpError(Exception):
+    """Raised when a request to a wiki API cannot be completed."""
+
+    def __init__(self, message: str, code: str = "http", retry_after: Optional[float] = None):
+        """
+        Initialize the WikiHttpError.
+
+        Args:
+            message: The error message
+            code: Short error code for metrics: "timeout", "network", "http-<status>" or "http"
+            retry_after: Seconds the server asked to wait in a Retry-After header, if any
+        """
+        super().__init__(message)
+        self.code = code
+        self.retry_after = retry_after
+
+
+class WikiApiError(Exception):
+    """Raised when a wiki API answers a request with an error, e.g. a failed login or edit."""
+
+    def __init__(self, message: str, code: str):
+        """
+        Initialize the WikiApiError.
+
+        Args:
+            message: The error message
+            code: The API's error code, e.g. "badtoken", or login result, e.g. "Failed"
+        """
+        super().__init__(message)
+        self.code = code
+
+
+class MaxLagError(WikiApiError):
+    """Raised when the wiki refuses a request because its database replicas lag (maxlag)."""
+
+    def __init__(self, message: str, lag: Optional[float] = None, retry_after: Optional[float] = None):
+        """
+        Initialize the MaxLagError.
+
+        Args:
+            message: The error message
+            lag: The replication lag in seconds reported by the wiki
+            retry_after: Seconds the wiki asked to wait in its Retry-After header
+        """
+        super().__init__(message, code="maxlag")
+        self.lag = lag
+        self.retry_after = retry_after
+
+
+class RateLimitedError(WikiApiError):
+    """Raised when the wiki refuses an edit because the account hit its rate limit (ratelimited)."""
+
+    def __init__(self, message: str):
+        super().__init__(message, code="ratelimited")
+
+
+class BadTokenError(WikiApiError):
+    """
+    Raised when the wiki rejects a CSRF token (badtoken), or an edit because the
+    session is no longer logged in (assertuserfailed); the request may succeed
+    with a fresh token, after logging in again if the session expired.
+    """
+
+    def __init__(self, message: str, code: str = "badtoken"):
+        super().__init__(message, code=code)
+
+
+class WrongTokenError(WikiApiError):
+    """Raised when the wiki rejects a login token (WrongToken); the login may succeed with a fresh token."""
+
+    def __init__(self, message: str):
+        super().__init__(message, code="WrongToken")
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header, given in seconds or as an HTTP date.
+
+    Args:
+        value: The header value, if any
+
+    Returns:
+        Seconds to wait, or None if the header is missing or malformed
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def raise_for_maxlag(response: requests.Response, data: Any) -> None:
+    """
+    Raise MaxLagError if a decoded API response is a maxlag error.
+
+    MediaWiki checks maxlag before running any API module, so this applies to
+    every request, unlike errors specific to a module such as badtoken.
+
+    Args:
+        response: The HTTP response, for its Retry-After header
+        data: The decoded JSON of the response
+    """
+    error = data.get("error") if isinstance(data, dict) else None
+    if isinstance(error, dict) and error.get("code") == "maxlag":
+        lag = error.get("lag")
+        raise MaxLagError(f"Wiki is currently lagging ({lag} seconds behind). Please try again later.",
+                          lag=float(lag) if lag is not None else None,
+                          retry_after=parse_retry_after(response.headers.get("Retry-After")))
+
+
+class EncodedFormValue:
+    """
+    A form value that is URL-encoded once and can be sent in many requests.
+
+    Used for page text pushed to several wikis, so large content is not
+    re-encoded for every target.
+    """
+
+    def __init__(self, value: str):
+        self.value = value
+        self.encoded = quote_plus(value).encode("ascii")
+
+    def __len__(self) -> int:
+        return len(self.value)
+
+
+class FileFormValue:
+    """
+    A form value read from a file while the request is sent.
+
+    Requests containing one are sent as multipart/form-data, so the file is
+    streamed verbatim in chunks and never held in memory as a whole, however
+    large it is.
+    """
+
+    def __init__(self, path: str, chunk_size: int = STREAM_CHUNK_SIZE):
+        """
+        Check the file and record its size.
+
+        Args:
+            path: Path to a UTF-8 encoded file
+            chunk_size: Bytes read per chunk
+
+        Raises:
+            OSError: If the file cannot be read
+            UnicodeDecodeError: If the file is not valid UTF-8
+        """
+        self.path = path
+        self.chunk_size = chunk_size
+        self.size = os.path.getsize(path)
+        # MediaWiki only accepts UTF-8; fail before anything is sent, as reading the whole file did
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        for chunk in self.iter_chunks():
+            decoder.decode(chunk)
+        decoder.decode(b"", final=True)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        """
+        Read the file chunk by chunk through a memory map.
+
+        Raises:
+            WikiHttpError: If the file changed size since it was checked
+        """
+        if self.size == 0:
+            return
+        with open(self.path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if len(mapped) != self.size:
+                    raise WikiHttpError(f"Content file '{self.path}' changed while it was being sent")
+                for offset in range(0, self.size, self.chunk_size):
+                    yield mapped[offset:offset + self.chunk_size]
+
+    def contains(self, needle: bytes) -> bool:
+        """Check whether the file contains a byte string, without reading it into memory."""
+        if self.size == 0:
+            return False
+        with open(self.path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return mapped.find(needle) != -1
+
+
+class MultipartFormBody:
+    """
+    A multipart/form-data request body that streams FileFormValue parts.
+
+    It has a length, so requests sends it with a Content-Length header
+    instead of chunked transfer encoding.
+    """
+
+    def __init__(self, data: Dict[str, Any]):
+        self.boundary = self._choose_boundary(data)
+        self.parts = []
+        for key, value in data.items():
+            header = f'--{self.boundary}\r\nContent-Disposition: form-data; name="{key}"\r\n'
+            if isinstance(value, FileFormValue):
+                header += "Content-Type: text/plain; charset=UTF-8\r\n"
+                self.parts.extend([(header + "\r\n").encode("utf-8"), value, b"\r\n"])
+            else:
+                text = value.value if isinstance(value, EncodedFormValue) else str(value)
+                self.parts.append((header + "\r\n" + text + "\r\n").encode("utf-8"))
+        self.parts.append(f"--{self.boundary}--\r\n".encode("ascii"))
+        self.content_type = f"multipart/form-data; boundary={self.boundary}"
+        self.length = sum(len(part) for part in self.parts)
+        self._chunks = self._iter_parts()
+        self._chunk = b""
+        self._offset = 0
+
+    def _choose_boundary(self, data: Dict[str, Any]) -> str:
+        """Pick a random boundary that occurs in none of the values."""
+        while True:
+            boundary = f"WikiFormBoundary{secrets.token_hex(16)}"
+            needle = boundary.encode("ascii")
+            if not any(self._contains(value, needle) for value in data.values()):
+                return boundary
+
+    @staticmethod
+    def _contains(value: Any, needle: bytes) -> bool:
+        if isinstance(value, FileFormValue):
+            return value.contains(needle)
+        text = value.value if isinstance(value, EncodedFormValue) else str(value)
+        return needle in text.encode("utf-8")
+
+    def _iter_parts(self) -> Iterator[bytes]:
+        for part in self.parts:
+            if isinstance(part, FileFormValue):
+                yield from part.iter_chunks()
+            else:
+                yield part
+
+    def __len__(self) -> int:
+        return self.length
+
+    def read(self, size: int = -1) -> bytes:
+        """Read up to size bytes of the body; all remaining bytes if size is negative."""
+        pieces = []
+        wanted = size if size is not None and size >= 0 else self.length
+        while wanted > 0:
+            if self._offset >= len(self._chunk):
+                self._chunk = next(self._chunks, None)
+                self._offset = 0
+                if self._chunk is None:
+                    self._chunk = b""
+                    break
+            piece = self._chunk[self._offset:self._offset + wanted]
+            self._offset += len(piece)
+            wanted -= len(piece)
+            pieces.append(piece)
+        return b"".join(pieces)
+
+
+def encode_form(data: Dict[str, Any]) -> bytes:
+    """
+    URL-encode form parameters, reusing the encoding of EncodedFormValue items.
+
+    Args:
+        data: Form parameters; values are strings or EncodedFormValue instances
+
+    Returns:
+        The application/x-www-form-urlencoded request body
+    """
+    parts = []
+    for key, value in data.items():
+        if isinstance(value, EncodedFormValue):
+            encoded = value.encoded
+        else:
+            encoded = quote_plus(str(value)).encode("ascii")
+        parts.append(quote_plus(key).encode("ascii") + b"=" + encoded)
+    return b"&".join(parts)
+
+
+class WikiHttpClient:
+    def __init__(self, user_agent: str = DEFAULT_USER_AGENT, timeout: Any = DEFAULT_TIMEOUT,
+                 pool_maxsize: int = 10):
+        """
+        Initialize the WikiHttpClient.
+
+        Connections are pooled per host and kept alive between requests, and
+        session cookies are held in memory for the lifetime of the client.
+
+        Args:
+            user_agent: User agent sent with every request
+            timeout: Requests timeout, either a number or a (connect, read) tuple
+            pool_maxsize: Maximum number of pooled connections per host
+        """
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.pool_maxsize = pool_maxsize
+        self.session = self._create_session()
+
+    def _create_session(self) -> requests.Session:
+        """Create a requests session with a keep-alive connection pool."""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.pool_maxsize, pool_maxsize=self.pool_maxsize)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        session.headers["User-Agent"] = self.user_agent
+        return session
+
+    def set_user_agent(self, user_agent: str) -> None:
+        """
+        Change the user agent sent with subsequent requests.
+
+        Args:
+            user_agent: The new user agent string
+        """
+        self.user_agent = user_agent
+        self.session.headers["User-Agent"] = user_agent
+
+    def clear_cookies(self) -> None:
+        """Drop all session cookies held by the client."""
+        self.session.cookies.clear()
+
+    def export_cookies(self) -> List[Dict[str, Any]]:
+        """
+        Export the session cookies as plain dictionaries.
+
+        Returns:
+            List of cookies with "name", "value", "domain", "path", "secure" and "expires" keys
+        """
+        return [
+            {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "secure": cookie.secure,
+                "expires": cookie.expires
+            }
+            for cookie in self.session.cookies
+        ]
+
+    def import_cookies(self, cookies: List[Dict[str, Any]]) -> None:
+        """
+        Load cookies previously returned by export_cookies() into the session.
+
+        Args:
+            cookies: List of cookie dictionaries
+        """
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie["name"], cookie["value"], domain=cookie.get("domain", ""), path=cookie.get("path", "/"),
+                secure=cookie.get("secure", False), expires=cookie.get("expires")
+            )
+
+    def request(self, method: str, url: str, params: Optional[Dict[str, str]] = None,
+                data: Any = None) -> requests.Response:
+        """
+        Perform an HTTP request on the pooled session.
+
+        Args:
+            method: HTTP method, e.g. "GET" or "POST"
+            url: The URL to request
+            params: Query string parameters
+            data: Form parameters (values may be EncodedFormValue or FileFormValue) or an already
+                encoded request body
+
+        Returns:
+            The response object
+
+        Raises:
+            WikiHttpError: If the request fails at the network or HTTP level
+        """
+        headers = None
+        if isinstance(data, dict) and any(isinstance(value, FileFormValue) for value in data.values()):
+            data = MultipartFormBody(data)
+            headers = {"Content-Type": data.content_type}
+        elif isinstance(data, dict) and any(isinstance(value, EncodedFormValue) for value in data.values()):
+            data = encode_form(data)
+            headers = {"Content-Type": "application/x-www-form-urlencoded"}
+        try:
+            response = self.session.request(method, url, params=params, data=data, headers=headers,
+                                            timeout=self.timeout)
+            get_metrics().add_bytes(url, sent=int(response.request.headers.get("Content-Length", 0)),
+                                    received=len(response.content))
+            response.raise_for_status()
+            return response
+        except requests.Timeout as e:
+            raise WikiHttpError(f"Request timeout: {e}", code="timeout")
+        except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+            # ChunkedEncodingError is also raised for a connection dropped mid-response
+            raise WikiHttpError(f"Network error: {e}", code="network")
+        except requests.HTTPError as e:
+            if e.response is None:
+                raise WikiHttpError(f"HTTP request failed: {e}")
+            # Sent with 429 and 503 responses by throttling proxies and overloaded servers
+            raise WikiHttpError(f"HTTP request failed: {e}", code=f"http-{e.response.status_code}",
+                                retry_after=parse_retry_after(e.response.headers.get("Retry-After")))
+        except requests.RequestException as e:
+            raise WikiHttpError(f"HTTP request failed: {e}")
+
+    def request_json(self, method: str, url: str, params: Optional[Dict[str, str]] = None,
+                     data: Any = None) -> Any:
+        """
+        Perform an HTTP request and decode the JSON response.
+
+        Args:
+            method: HTTP method, e.g. "GET" or "POST"
+            url: The URL to request
+            params: Query string parameters
+            data: Form parameters or an already encoded request body
+
+        Returns:
+            The decoded JSON response
+
+        Raises:
+            WikiHttpError: If the request fails or the response is not valid JSON
+        """
+        response = self.request(method, url, params=params, data=data)
+        try:
+            return response.json()
+        except ValueError:
+            raise WikiHttpError(f"Failed to decode JSON response from API: {response.text[:200]}")
+
+    def get_json(self, url: str, params: Dict[str, str]) -> Any:
+        """Send a GET request and decode the JSON response."""
+        return self.request_json("GET", url, params=params)
+
+    def post_json(self, url: str, data: Any) -> Any:
+        """Send a form-encoded POST request and decode the JSON response."""
+        return self.request_json("POST", url, data=data)
+
+    def close(self) -> None:
+        """Close pooled connections and drop session cookies."""
+        self.clear_cookies()
+        self.session.close()
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Wiki Logging
+Run journal for the submission bots: JSON Lines records written by a
+background thread, so logging from request and retry loops only puts a
+record on a queue.
+
+Each line is one record:
+
+    {"time": "2024-05-01T12:00:00.123Z", "level": "INFO", "message": "Page 'Foo' submitted successfully",
+     "wiki": "https://wiki.archlinux.org/api.php", "page": "Foo", "phase": "edit", "duration": 0.412,
+     "outcome": "success"}
+
+"wiki", "page", "phase", "duration" and "outcome" are only present when the
+caller passes them.
+"""
+
+import atexit
+import glob
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from logging.handlers import QueueListener, RotatingFileHandler
+from typing import Any, Dict, List, Tuple
+
+# Rotate the journal when it reaches this size, keeping this many old files
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 3
+
+# Structured fields a record may carry besides its message
+JOURNAL_FIELDS = ("wiki", "page", "phase", "duration", "outcome")
+
+
+class JsonLinesFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        """Format a record as one line of JSON."""
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) +
+                    f".{int(record.created % 1 * 1000):03d}Z",
+            "level": record.levelname,
+            "message": record.getMessage()
+        }
+        for field in JOURNAL_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = round(value, 3) if field == "duration" else value
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class JournalFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler that leaves flushing to the caller and never calls
+    tell() on the file, so a burst of records costs a single write.
+    """
+
+    def __init__(self, filename: str, max_bytes: int, backup_count: int):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.size = os.path.getsize(filename) if os.path.exists(filename) else 0
+
+    def _open(self):
+        # The journal holds page titles and redacted requests; keep it private
+        fd = os.open(self.baseFilename, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o600)
+        return os.fdopen(fd, "a", encoding=self.encoding)
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        return self.maxBytes > 0 and self.size >= self.maxBytes
+
+    def doRollover(self) -> None:
+        super().doRollover()
+        self.size = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            line = self.format(record) + self.terminator
+            self.stream.write(line)
+            self.size += len(line.encode("utf-8"))
+        except Exception:
+            self.handleError(record)
+
+    def handleError(self, record: logging.LogRecord) -> None:
+        # If we can't write to the log, continue without logging
+        pass
+
+
+class JournalListener(QueueListener):
+    def prepare(self, entry: Tuple[float, int, str, Dict[str, Any]]) -> logging.LogRecord:
+        """Turn a queued (time, level, message, fields) entry into a log record, off the caller's thread."""
+        created, level, message, fields = entry
+        record = logging.makeLogRecord(fields)
+        record.created, record.levelno, record.levelname, record.msg = \
+            created, level, logging.getLevelName(level), message
+        return record
+
+    def handle(self, record: logging.LogRecord) -> None:
+        super().handle(record)
+        # Flush once the queue is drained, batching bursts of records into one write
+        if self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+
+
+class RunJournal:
+    def __init__(self, path: str, max_bytes: int = DEFAULT_MAX_BYTES, backup_count: int = DEFAULT_BACKUP_COUNT,
+                 keep: bool = False):
+        """
+        Initialize the RunJournal. The file and writer thread are created on the first record.
+
+        Args:
+            path: The journal file; rotated files get ".1", ".2", ... appended
+            max_bytes: Rotate the journal when it reaches this size (0 never rotates)
+            backup_count: Number of rotated files to keep
+            keep: Keep the journal when it is closed, instead of deleting it
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.keep = keep
+        # Entries stay queued across flush(), so entries from other threads
+        # that arrive meanwhile are written when the writer starts again
+        self.records = queue.SimpleQueue()
+        self.listener = None
+        self.lock = threading.Lock()
+        self.close_registered = False
+
+    def _start(self) -> None:
+        """Start the writer thread."""
+        handler = JournalFileHandler(self.path, self.max_bytes, self.backup_count)
+        handler.setFormatter(JsonLinesFormatter())
+        self.listener = JournalListener(self.records, handler)
+        self.listener.start()
+        if not self.close_registered:
+            # Write out queued records, and remove the journal unless kept, when the process exits
+            atexit.register(self.close)
+            self.close_registered = True
+
+    def log(self, message: str, level: int = logging.INFO, **fields: Any) -> None:
+        """
+        Queue a record for the journal.
+
+        Args:
+            message: The message, without sensitive data
+            level: The logging level
+            **fields: Structured fields: wiki, page, phase, duration (seconds) and outcome
+        """
+        if self.listener is None:
+            with self.lock:
+                if self.listener is None:
+                    self._start()
+        # Only a tuple is built here; the writer thread makes the log record and formats it
+        self.records.put((time.time(), level, message, fields))
+
+    def flush(self) -> None:
+        """Write out every queued record and stop the writer thread; a later record starts it again."""
+        with self.lock:
+            if self.listener is None:
+                if self.records.empty():
+                    return
+                self._start()
+            self.listener.stop()
+            for handler in self.listener.handlers:
+                handler.close()
+            self.listener = None
+
+    def close(self) -> None:
+        """Flush the journal, then delete it and its rotated files unless keep is set."""
+        self.flush()
+        if self.keep:
+            return
+        for path in [self.path] + glob.glob(glob.escape(self.path) + ".[0-9]*"):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+# Journals shared by every bot of the process, by path
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_run_journal(path: str) -> RunJournal:
+    """
+    Get the journal of this process for a path, creating it on first use.
+
+    Args:
+        path: The journal file
+
+    Returns:
+        The RunJournal
+    """
+    with _journals_lock:
+        if path not in _journals:
+            _journals[path] = RunJournal(path)
+        return _journals[path]
+
+
+def read_journal(path: str) -> List[Dict[str, Any]]:
+    """
+    Read the records of a journal file.
+
+    Args:
+        path: The journal file
+
+    Returns:
+        List of records as dictionaries
+    """
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
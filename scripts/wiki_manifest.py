@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Wiki Manifest
+Loads batch manifests describing many pages to submit in one run.
+"""
+
+import csv
+import json
+import os
+from typing import Dict, List, Optional
+
+MANIFEST_FIELDS = ["title", "content_file", "summary"]
+
+
+def load_manifest(manifest_file: str, default_summary: Optional[str] = None) -> List[Dict[str, str]]:
+    """
+    Load a JSON or CSV manifest of pages.
+
+    JSON manifests are either a list of entries or an object with a "pages"
+    list. CSV manifests need a header row. Every entry needs "title" and
+    "content_file"; "summary" falls back to default_summary and any other
+    columns (such as "wiki") are passed through. Relative content file paths
+    are resolved against the manifest's directory.
+
+    Args:
+        manifest_file: Path to the manifest (.json or .csv)
+        default_summary: Edit summary for entries that don't specify one
+
+    Returns:
+        List of manifest entries
+
+    Raises:
+        ValueError: If the manifest is malformed or an entry is missing fields
+    """
+    if manifest_file.lower().endswith(".csv"):
+        with open(manifest_file, 'r', encoding='utf-8', newline='') as f:
+            entries = [dict(row) for row in csv.DictReader(f)]
+    else:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        entries = data.get("pages") if isinstance(data, dict) else data
+        if not isinstance(entries, list):
+            raise ValueError(f"Manifest '{manifest_file}' must contain a list of pages.")
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+    manifest = []
+    for index, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict):
+            raise ValueError(f"Manifest entry {index} is not an object.")
+        entry = {key: (value.strip() if isinstance(value, str) else value)
+                 for key, value in entry.items() if key is not None}
+        if not entry.get("title") or not entry.get("content_file"):
+            raise ValueError(f"Manifest entry {index} needs both 'title' and 'content_file'.")
+        if not entry.get("summary"):
+            entry["summary"] = default_summary or "Automated update for wiki content"
+        entry["content_file"] = os.path.join(base_dir, os.path.expanduser(entry["content_file"]))
+        manifest.append(entry)
+    return manifest
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+Wiki Metrics
+Per-wiki latency histograms of the bots' phases (login token, login, CSRF
+token, edit, page fetch), retry counts, error codes, bytes sent and received
+and the state of the adaptive rate limiter, exported at the end of a run as a Prometheus textfile (for
+node_exporter's textfile collector) and as a JSON summary.
+
+Metrics are collected in a process-wide registry, see get_metrics(), so the
+bots, the validator and the HTTP client all report into the same run.
+"""
+
+import atexit
+import bisect
+import os
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from wiki_config_manager import write_json_atomic
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Quantiles reported in the JSON summary
+SUMMARY_QUANTILES = (0.5, 0.9, 0.99)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        """
+        Initialize the LatencyHistogram.
+
+        Args:
+            buckets: Sorted upper bounds of the buckets, in seconds
+        """
+        self.buckets = buckets
+        # One count per bucket plus one for observations above the last bound
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Record one observation."""
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate a quantile by linear interpolation within its bucket, like Prometheus' histogram_quantile().
+
+        Args:
+            q: The quantile, between 0 and 1
+
+        Returns:
+            The estimate in seconds, or None without observations
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                # Observations above the last bound are only known to be at most the maximum
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+
+def _labels(**labels: Any) -> str:
+    """Format Prometheus labels, escaping backslashes, quotes and newlines in the values."""
+    return "{" + ",".join(
+        f'{name}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for name, value in labels.items()) + "}"
+
+
+class WikiMetrics:
+    def __init__(self):
+        """Initialize the WikiMetrics. All methods are safe to call from several threads."""
+        self.lock = threading.Lock()
+        # (wiki, phase) -> LatencyHistogram
+        self.latencies = {}
+        # (wiki, reason) -> count
+        self.retries = {}
+        # (wiki, phase, code) -> count
+        self.errors = {}
+        # wiki -> [bytes sent, bytes received]
+        self.transferred = {}
+        # wiki -> state of its rate limiter, see AdaptiveRateLimiter.state()
+        self.pacing = {}
+
+    def observe(self, wiki: str, phase: str, seconds: float) -> None:
+        """
+        Record how long a phase took.
+
+        Args:
+            wiki: The wiki's API URL
+            phase: The phase, e.g. "login" or "edit"
+            seconds: The duration
+        """
+        with self.lock:
+            histogram = self.latencies.get((wiki, phase))
+            if histogram is None:
+                histogram = self.latencies[(wiki, phase)] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def count_retry(self, wiki: str, reason: str) -> None:
+        """Count a retry, e.g. with reason "transient" or "wrongtoken"."""
+        with self.lock:
+            self.retries[(wiki, reason)] = self.retries.get((wiki, reason), 0) + 1
+
+    def count_error(self, wiki: str, phase: str, code: str) -> None:
+        """Count a failed phase by error code, e.g. an API error code such as "badtoken"."""
+        with self.lock:
+            self.errors[(wiki, phase, code)] = self.errors.get((wiki, phase, code), 0) + 1
+
+    def add_bytes(self, wiki: str, sent: int, received: int) -> None:
+        """Count bytes sent in request bodies and received in response bodies."""
+        with self.lock:
+            totals = self.transferred.setdefault(wiki, [0, 0])
+            totals[0] += sent
+            totals[1] += received
+
+    def set_pacing(self, wiki: str, state: Dict[str, Any]) -> None:
+        """Record the current state of a wiki's rate limiter."""
+        with self.lock:
+            self.pacing[wiki] = state
+
+    @contextmanager
+    def timed(self, wiki: str, phase: str) -> Iterator[None]:
+        """
+        Time a phase. A phase that raises is still timed, and its error counted
+        under the exception's "code" attribute, or its class name.
+
+        Args:
+            wiki: The wiki's API URL
+            phase: The phase, e.g. "login" or "edit"
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        except BaseException as e:
+            self.count_error(wiki, phase, getattr(e, "code", None) or type(e).__name__)
+            raise
+        finally:
+            self.observe(wiki, phase, time.perf_counter() - start)
+
+    def to_prometheus(self) -> str:
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        Returns:
+            The metrics text
+        """
+        lines = []
+        with self.lock:
+            lines.append("# HELP wiki_phase_duration_seconds Time spent in each phase of a wiki submission.")
+            lines.append("# TYPE wiki_phase_duration_seconds histogram")
+            for (wiki, phase), histogram in sorted(self.latencies.items()):
+                cumulative = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    cumulative += count
+                    lines.append(f"wiki_phase_duration_seconds_bucket{_labels(wiki=wiki, phase=phase, le=repr(bound))} "
+                                 f"{cumulative}")
+                lines.append(f"wiki_phase_duration_seconds_bucket{_labels(wiki=wiki, phase=phase, le='+Inf')} "
+                             f"{histogram.count}")
+                lines.append(f"wiki_phase_duration_seconds_sum{_labels(wiki=wiki, phase=phase)} {histogram.sum!r}")
+                lines.append(f"wiki_phase_duration_seconds_count{_labels(wiki=wiki, phase=phase)} {histogram.count}")
+
+            lines.append("# HELP wiki_retries_total Retries of failed requests.")
+            lines.append("# TYPE wiki_retries_total counter")
+            for (wiki, reason), count in sorted(self.retries.items()):
+                lines.append(f"wiki_retries_total{_labels(wiki=wiki, reason=reason)} {count}")
+
+            lines.append("# HELP wiki_errors_total Failed phases by error code.")
+            lines.append("# TYPE wiki_errors_total counter")
+            for (wiki, phase, code), count in sorted(self.errors.items()):
+                lines.append(f"wiki_errors_total{_labels(wiki=wiki, phase=phase, code=code)} {count}")
+
+            lines.append("# HELP wiki_bytes_sent_total Bytes sent in request bodies.")
+            lines.append("# TYPE wiki_bytes_sent_total counter")
+            for wiki, (sent, _) in sorted(self.transferred.items()):
+                lines.append(f"wiki_bytes_sent_total{_labels(wiki=wiki)} {sent}")
+            lines.append("# HELP wiki_bytes_received_total Bytes received in response bodies.")
+            lines.append("# TYPE wiki_bytes_received_total counter")
+            for wiki, (_, received) in sorted(self.transferred.items()):
+                lines.append(f"wiki_bytes_received_total{_labels(wiki=wiki)} {received}")
+
+            lines.append("# HELP wiki_pacing_rate_requests_per_second Request rate the wiki is paced at.")
+            lines.append("# TYPE wiki_pacing_rate_requests_per_second gauge")
+            for wiki, state in sorted(self.pacing.items()):
+                # Absent while the wiki is not paced
+                if state["rate"] is not None:
+                    lines.append(f"wiki_pacing_rate_requests_per_second{_labels(wiki=wiki)} {state['rate']!r}")
+            lines.append("# HELP wiki_pacing_wait_seconds_total Time requests waited for the rate limiter.")
+            lines.append("# TYPE wiki_pacing_wait_seconds_total counter")
+            for wiki, state in sorted(self.pacing.items()):
+                lines.append(f"wiki_pacing_wait_seconds_total{_labels(wiki=wiki)} {state['waited_seconds']!r}")
+            lines.append("# HELP wiki_pacing_slowdowns_total Push backs from the wiki that slowed the bots down.")
+            lines.append("# TYPE wiki_pacing_slowdowns_total counter")
+            for wiki, state in sorted(self.pacing.items()):
+                for reason, count in sorted(state["signals"].items()):
+                    lines.append(f"wiki_pacing_slowdowns_total{_labels(wiki=wiki, reason=reason)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def to_summary(self) -> Dict[str, Any]:
+        """
+        Summarize the metrics per wiki.
+
+        Returns:
+            Dictionary with a "wikis" key mapping each wiki's API URL to its
+            "phases" (count, total seconds, quantiles and maximum per phase),
+            "retries" (per reason), "errors" (per phase and code),
+            "bytes_sent", "bytes_received" and "pacing" (the rate limiter's
+            state, None if the wiki was not paced)
+        """
+        wikis = {}
+
+        def wiki_summary(wiki: str) -> Dict[str, Any]:
+            if wiki not in wikis:
+                wikis[wiki] = {"phases": {}, "retries": {}, "errors": {}, "bytes_sent": 0, "bytes_received": 0,
+                               "pacing": None}
+            return wikis[wiki]
+
+        with self.lock:
+            for (wiki, phase), histogram in sorted(self.latencies.items()):
+                phase_summary = {"count": histogram.count, "seconds": round(histogram.sum, 6)}
+                for q in SUMMARY_QUANTILES:
+                    phase_summary[f"p{int(q * 100)}"] = round(histogram.quantile(q), 6)
+                phase_summary["max"] = round(histogram.max, 6)
+                wiki_summary(wiki)["phases"][phase] = phase_summary
+            for (wiki, reason), count in sorted(self.retries.items()):
+                wiki_summary(wiki)["retries"][reason] = count
+            for (wiki, phase, code), count in sorted(self.errors.items()):
+                wiki_summary(wiki)["errors"].setdefault(phase, {})[code] = count
+            for wiki, (sent, received) in sorted(self.transferred.items()):
+                wiki_summary(wiki)["bytes_sent"], wiki_summary(wiki)["bytes_received"] = sent, received
+            for wiki, state in sorted(self.pacing.items()):
+                wiki_summary(wiki)["pacing"] = dict(state, signals=dict(state["signals"]))
+        return {"wikis": wikis}
+
+    def write_prometheus(self, path: str) -> None:
+        """
+        Write the metrics as a Prometheus textfile.
+
+        The file is replaced atomically, as the textfile collector requires.
+
+        Args:
+            path: The file to write, which must end in ".prom" for the textfile collector
+        """
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.to_prometheus())
+            # Readable by node_exporter, which usually runs as another user
+            os.chmod(temp_path, 0o644)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def write_summary(self, path: str) -> None:
+        """
+        Write the JSON summary of the metrics.
+
+        Args:
+            path: The file to write
+        """
+        write_json_atomic(path, self.to_summary())
+
+
+# The registry the bots, validator and HTTP client report into
+_metrics = WikiMetrics()
+
+
+def get_metrics() -> WikiMetrics:
+    """
+    Get the process-wide metrics registry.
+
+    Returns:
+        The WikiMetrics
+    """
+    return _metrics
+
+
+def export_at_exit(textfile: Optional[str] = None, summary_file: Optional[str] = None) -> None:
+    """
+    Write the process-wide metrics when the process exits, whether the run succeeded or not.
+
+    Args:
+        textfile: Prometheus textfile to write, if any
+        summary_file: JSON summary file to write, if any
+    """
+    def export() -> None:
+        try:
+            if textfile:
+                _metrics.write_prometheus(textfile)
+            if summary_file:
+                _metrics.write_summary(summary_file)
+        except OSError as e:
+            print(f"Warning: Could not write metrics: {e}", file=sys.stderr)
+
+    if textfile or summary_file:
+        atexit.register(export)
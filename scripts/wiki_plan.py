@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Wiki Plan
+Finds which pages of a manifest would change before any edit is made.
+
+Every manifest entry names a wiki (a configured wiki ID or an API URL), a page
+title and a content file. The latest revision's SHA-1 and size of every page
+are fetched in batched queries, several batches in flight per wiki at once,
+and compared with the local files. No login is needed and nothing is edited.
+The result is a changeset of pages to create, update or leave unchanged,
+with the byte delta of each.
+"""
+
+import argparse
+import json
+import sys
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from wiki_async_engine import AsyncSubmissionEngine
+from wiki_config_manager import WikiConfigManager, DEFAULT_MAX_IN_FLIGHT
+from wiki_http_client import FileFormValue, WikiHttpClient, WikiHttpError
+from wiki_manifest import load_manifest
+from wiki_rate_limiter import get_rate_limiter
+from wiki_validator import WikiValidator, content_digest
+
+# Actions of a changeset, in report order
+PLAN_ACTIONS = ("create", "update", "unchanged", "error")
+
+PLAN_MARKERS = {"create": "+", "update": "~", "unchanged": "=", "error": "!"}
+
+
+def failed_change(entry: Dict[str, Any], error: Optional[str]) -> Dict[str, Any]:
+    """The change of a manifest entry that could not be planned. See compare_entry()."""
+    return {"title": entry["title"], "content_file": entry["content_file"], "action": "error",
+            "local_bytes": None, "remote_bytes": None, "byte_delta": None, "revid": None, "error": error}
+
+
+def compare_entry(entry: Dict[str, Any], revision: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Decide what submitting one manifest entry would do to its page.
+
+    Args:
+        entry: Manifest entry with "title" and "content_file" keys
+        revision: The page's latest revision with "revid", "size" and "sha1" keys, None if it is missing
+
+    Returns:
+        Change with "title", "content_file", "action", "local_bytes", "remote_bytes",
+        "byte_delta", "revid" and "error" keys
+    """
+    try:
+        # Hashed the way MediaWiki hashes the saved text
+        sha1, size = content_digest(FileFormValue(entry["content_file"]))
+    except (OSError, ValueError, WikiHttpError) as e:
+        return failed_change(entry, f"Cannot read content file: {e}")
+    change = dict(failed_change(entry, None), local_bytes=size)
+    if revision is None:
+        change.update(action="create", byte_delta=size)
+        return change
+    change["revid"] = revision.get("revid")
+    change["remote_bytes"] = revision.get("size")
+    if change["remote_bytes"] is not None:
+        change["byte_delta"] = size - change["remote_bytes"]
+    # A hidden SHA-1 (deleted revision) cannot be compared, so the page counts as changed
+    unchanged = revision.get("sha1") == sha1 and change["remote_bytes"] in (None, size)
+    change["action"] = "unchanged" if unchanged else "update"
+    return change
+
+
+class WikiPlanner:
+    def __init__(self, config_manager: Optional[WikiConfigManager] = None,
+                 http_client: Optional[WikiHttpClient] = None,
+                 log_message: Optional[Callable[[str], None]] = None):
+        """
+        Initialize the WikiPlanner.
+
+        Args:
+            config_manager: Configuration used to resolve wiki IDs and concurrency limits
+            http_client: Client used for API requests; a new pooled client is created if omitted
+            log_message: Optional logging callback taking a message string, e.g. for retries
+        """
+        self.config_manager = config_manager or WikiConfigManager()
+        self.validator = WikiValidator(http_client=http_client)
+        self.log_message = log_message
+        # Batches in flight per wiki; None for each wiki's "max_in_flight"
+        self.max_in_flight = None
+
+    def resolve_wiki(self, wiki: str) -> str:
+        """
+        Resolve a manifest's wiki to its API URL.
+
+        Args:
+            wiki: A configured wiki ID or an API URL
+
+        Returns:
+            The API URL
+
+        Raises:
+            ValueError: If the wiki is neither a URL nor a configured wiki ID
+        """
+        if not wiki:
+            raise ValueError("No wiki given and no default wiki configured.")
+        if wiki.startswith(("https://", "http://")):
+            return wiki
+        wiki_config = self.config_manager.get_wiki_config(wiki)
+        if not wiki_config or not wiki_config.get("api_url"):
+            raise ValueError(f"Wiki '{wiki}' not found in configuration.")
+        return wiki_config["api_url"]
+
+    def get_max_in_flight(self, wiki_api_url: str) -> int:
+        """Get how many batches may be in flight at once against a wiki."""
+        if self.max_in_flight:
+            return self.max_in_flight
+        try:
+            wiki_id = self.config_manager.find_wiki_id_by_api_url(wiki_api_url)
+        except Exception:
+            # No usable configuration file; the default applies
+            wiki_id = None
+        if wiki_id is None:
+            return DEFAULT_MAX_IN_FLIGHT
+        return self.config_manager.get_max_in_flight(wiki_id)
+
+    def _plan_batch(self, wiki_api_url: str, titles: List[str],
+                    manifest: List[Dict[str, Any]], indexes: Dict[str, List[int]]) -> Dict[int, Dict[str, Any]]:
+        """Fetch the revisions of one batch of titles and compare them with the local files."""
+        with get_rate_limiter(wiki_api_url).paced():
+            # Raises on failure, so a page that could not be looked up is not taken for a new one
+            revisions = dict(self.validator.fetch_revision_infos(wiki_api_url, titles, batch_size=len(titles),
+                                                                 raise_errors=True))
+        return {index: compare_entry(manifest[index], revisions.get(title))
+                for title in titles for index in indexes[title]}
+
+    def plan(self, manifest: List[Dict[str, Any]], default_wiki: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Find what submitting a manifest would change, without editing anything.
+
+        Titles are grouped per wiki and packed into as few action=query requests
+        as the wiki allows (see WikiValidator.get_title_batch_size()). The
+        batches run concurrently, up to the wiki's "max_in_flight" at once, and
+        transient failures are retried. Local files are hashed while other
+        batches are in flight.
+
+        Args:
+            manifest: Entries with "title", "content_file" and optional "wiki" keys
+            default_wiki: Wiki ID or API URL for entries without a "wiki"; defaults to
+                the configuration's default wiki
+
+        Returns:
+            Dictionary with "pages" (one change per entry, in manifest order, see
+            compare_entry(), plus "wiki" and "api_url" keys), "summary" (pages per
+            action and the total "byte_delta") and "seconds"
+        """
+        start = time.monotonic()
+        changes = [None] * len(manifest)
+        wikis = [entry.get("wiki") or default_wiki or self.config_manager.get_default_wiki() for entry in manifest]
+        api_urls = {}
+        resolve_errors = {}
+        # API URL -> title -> indexes of the entries for that page
+        titles_by_wiki = {}
+        for index, (entry, wiki) in enumerate(zip(manifest, wikis)):
+            if wiki not in api_urls:
+                try:
+                    api_urls[wiki] = self.resolve_wiki(wiki)
+                except ValueError as e:
+                    api_urls[wiki] = None
+                    resolve_errors[wiki] = str(e)
+            if api_urls[wiki] is None:
+                changes[index] = failed_change(entry, resolve_errors[wiki])
+            else:
+                titles_by_wiki.setdefault(api_urls[wiki], {}).setdefault(entry["title"], []).append(index)
+
+        engine = AsyncSubmissionEngine(log_message=self.log_message)
+        jobs = []
+        for wiki_api_url, indexes in titles_by_wiki.items():
+            engine.set_limit(wiki_api_url, self.get_max_in_flight(wiki_api_url))
+            batch_size = self.validator.get_title_batch_size(wiki_api_url)
+            titles = list(indexes)
+            for offset in range(0, len(titles), batch_size):
+                batch = titles[offset:offset + batch_size]
+                jobs.append({"wiki": wiki_api_url, "name": f"a batch of {len(batch)} titles",
+                             "func": self._plan_batch, "args": (wiki_api_url, batch, manifest, indexes)})
+
+        for job, outcome in zip(jobs, engine.run(jobs)):
+            wiki_api_url, batch, _, indexes = job["args"]
+            if outcome["error"] is None:
+                for index, change in outcome["result"].items():
+                    changes[index] = change
+                continue
+            for title in batch:
+                for index in indexes[title]:
+                    changes[index] = failed_change(manifest[index], f"Could not fetch the page: {outcome['error']}")
+
+        changes = [dict(change, wiki=wiki, api_url=api_urls[wiki]) for change, wiki in zip(changes, wikis)]
+        summary = {action: 0 for action in PLAN_ACTIONS}
+        for change in changes:
+            summary[change["action"]] += 1
+        summary["byte_delta"] = sum(change["byte_delta"] or 0 for change in changes
+                                    if change["action"] in ("create", "update"))
+        return {"pages": changes, "summary": summary, "seconds": round(time.monotonic() - start, 3)}
+
+
+def print_plan(plan: Dict[str, Any], verbose: bool = False) -> None:
+    """Print a changeset; unchanged pages are only listed if verbose."""
+    wikis = {change["wiki"] for change in plan["pages"]}
+    print(f"  {'':2}{'Action':<11}{'Bytes':>10}  Page")
+    for action in PLAN_ACTIONS:
+        if action == "unchanged" and not verbose:
+            continue
+        for change in plan["pages"]:
+            if change["action"] != action:
+                continue
+            delta = f"{change['byte_delta']:+,}" if change["byte_delta"] is not None else "-"
+            page = f"{change['wiki']}: {change['title']}" if len(wikis) > 1 else change["title"]
+            print(f"  {PLAN_MARKERS[action]:2}{action:<11}{delta:>10}  {page}")
+            if change["error"]:
+                print(f"    \033[0;31m✗\033[0m {change['error']}")
+
+    summary = plan["summary"]
+    print(f"\nPlan: {summary['create']} to create, {summary['update']} to update, {summary['unchanged']} unchanged, "
+          f"{summary['error']} failed ({summary['byte_delta']:+,} bytes, {plan['seconds']:.1f} seconds)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Show which pages of a manifest would change, without editing')
+    parser.add_argument('manifest',
+                        help='JSON or CSV manifest of pages (wiki, title, content_file); "wiki" is a wiki ID or API URL')
+    parser.add_argument('--wiki', type=str,
+                        help='Wiki ID or API URL of entries without a "wiki" (default: the configuration\'s default wiki)')
+    parser.add_argument('--max-in-flight', type=int,
+                        help='Concurrent lookups per wiki (default: each wiki\'s "max_in_flight" from the configuration)')
+    parser.add_argument('--output', metavar='PATH', help='Also save the changeset as JSON')
+    parser.add_argument('--verbose', '-v', action='store_true', help='List unchanged pages too')
+    parser.add_argument('--detailed-exitcode', action='store_true',
+                        help='Exit with status 2 if any page would be created or updated')
+    parser.add_argument('--config', default='wiki_config.json',
+                        help='Wiki configuration file, or a sharded configuration directory such as wikis.d '
+                             '(default: wiki_config.json)')
+
+    args = parser.parse_args()
+
+    try:
+        manifest = load_manifest(args.manifest)
+    except Exception as e:
+        print(f"\033[0;31m[ERROR]\033[0m Failed to load manifest {args.manifest}: {e}")
+        sys.exit(1)
+
+    planner = WikiPlanner(WikiConfigManager(config_file=args.config),
+                          log_message=lambda message: print(message, file=sys.stderr))
+    planner.max_in_flight = args.max_in_flight
+    try:
+        plan = planner.plan(manifest, args.wiki)
+    except Exception as e:
+        print(f"\033[0;31m[ERROR]\033[0m {e}")
+        sys.exit(1)
+    finally:
+        planner.validator.http_client.close()
+
+    print(f"\033[0;34m[INFO]\033[0m Changes for {len(manifest)} pages of {args.manifest}:")
+    print_plan(plan, args.verbose)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(plan, f, indent=2)
+        print(f"\nChangeset saved to {args.output}")
+
+    if plan["summary"]["error"]:
+        sys.exit(1)
+    if args.detailed_exitcode and (plan["summary"]["create"] or plan["summary"]["update"]):
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Wiki Rate Limiter
+Adaptive per-wiki pacing of the submission bots' API requests.
+
+Every request to a wiki goes through the wiki's AdaptiveRateLimiter, a token
+bucket whose rate follows the wiki's feedback with additive increase and
+multiplicative decrease: maxlag errors, throttling (HTTP 429 and 503),
+ratelimited edits and slow responses halve the rate and hold every request to
+the wiki for as long as the server asked, while error-free responses raise
+the rate again step by step. A wiki that never pushes back is not paced at
+all, unless it has a max_rate.
+
+Limiters are kept in a process-wide registry, see get_rate_limiter(), so all
+bots and threads talking to one wiki share its pacing. Their state is
+reported to the metrics and shows up in the run summary.
+"""
+
+import collections
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+from wiki_http_client import MaxLagError, RateLimitedError, WikiApiError, WikiHttpError
+from wiki_metrics import get_metrics
+from wiki_retry import RATELIMIT_DELAY
+
+# Lowest rate, in requests per second, a wiki is paced at
+MIN_RATE = 0.2
+
+# Requests per second the rate grows by for every second of error-free responses
+RATE_INCREASE = 0.5
+
+# Share of the rate kept when the wiki pushes back
+RATE_DECREASE = 0.5
+
+# Mean response time, in seconds, above which a wiki counts as overloaded.
+# Well above a normal edit, so a distant but healthy wiki is not slowed down.
+LATENCY_TARGET = 5.0
+
+# Weight of the latest response time in the moving average
+LATENCY_SMOOTHING = 0.2
+
+# The rate is cut at most once per this many seconds, so the errors of
+# requests that were already in flight count as one push back
+DECREASE_INTERVAL = 1.0
+
+# Seconds of request history used to measure the request rate of a wiki
+# that was not paced yet
+RATE_WINDOW = 5.0
+
+
+class AdaptiveRateLimiter:
+    def __init__(self, wiki: str, max_rate: Optional[float] = None, min_rate: float = MIN_RATE,
+                 latency_target: float = LATENCY_TARGET):
+        """
+        Initialize the AdaptiveRateLimiter. All methods are safe to call from several threads.
+
+        Args:
+            wiki: The wiki's API URL
+            max_rate: Highest rate in requests per second, None for no limit
+            min_rate: Lowest rate in requests per second
+            latency_target: Mean response time in seconds above which the rate is cut
+        """
+        self.wiki = wiki
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.latency_target = latency_target
+        self.lock = threading.Lock()
+        # Requests per second; None until the wiki pushes back, unless max_rate is set
+        self.rate = max_rate
+        self.tokens = 1.0
+        # Time up to which tokens have been added; in the future while the wiki is held
+        self.updated = time.monotonic()
+        self.hold_until = 0.0
+        self.last_decrease = float("-inf")
+        self.last_increase = self.updated
+        # Moving average of the response time, None before the first response
+        self.latency = None
+        # Send times of the last RATE_WINDOW seconds
+        self.sent = collections.deque()
+        self.requests = 0
+        self.waited = 0.0
+        # Push backs by reason: "maxlag", "throttled", "ratelimited" or "latency"
+        self.signals = {}
+
+    def _refill(self, now: float) -> None:
+        """Add the tokens earned since the last update. Called with the lock held."""
+        if self.rate is not None and now > self.updated:
+            # Up to one second of requests may be sent at once
+            self.tokens = min(max(1.0, self.rate), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def _observed_rate(self, now: float) -> float:
+        """Requests per second over the last RATE_WINDOW seconds. Called with the lock held."""
+        if not self.sent:
+            return self.min_rate
+        return len(self.sent) / max(1.0, now - self.sent[0])
+
+    def _decrease(self, now: float, reason: str, hold: float) -> None:
+        """Cut the rate and hold requests after a push back. Called with the lock held."""
+        self.signals[reason] = self.signals.get(reason, 0) + 1
+        self._refill(now)
+        if now - self.last_decrease >= DECREASE_INTERVAL:
+            self.last_decrease = now
+            current = self.rate if self.rate is not None else self._observed_rate(now)
+            self.rate = max(self.min_rate, current * RATE_DECREASE)
+            # No burst right after a push back
+            self.tokens = min(self.tokens, 0.0)
+            self.updated = max(self.updated, now)
+        if hold > 0:
+            self.hold_until = max(self.hold_until, now + hold)
+            # Tokens are earned again once the hold is over
+            self.updated = max(self.updated, self.hold_until)
+
+    def _report(self) -> None:
+        """Report the state to the metrics. Called with the lock held."""
+        get_metrics().set_pacing(self.wiki, self._state())
+
+    def _state(self) -> Dict[str, Any]:
+        """The state returned by state(). Called with the lock held."""
+        return {
+            "rate": round(self.rate, 3) if self.rate is not None else None,
+            "max_rate": self.max_rate,
+            "requests": self.requests,
+            "waited_seconds": round(self.waited, 3),
+            "latency": round(self.latency, 6) if self.latency is not None else None,
+            "signals": dict(self.signals)
+        }
+
+    def set_max_rate(self, max_rate: Optional[float]) -> None:
+        """
+        Change the highest rate.
+
+        Args:
+            max_rate: Highest rate in requests per second, None for no limit
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.max_rate = max_rate
+            if max_rate is not None:
+                self.rate = max_rate if self.rate is None else min(self.rate, max_rate)
+            self._report()
+
+    def acquire(self) -> float:
+        """
+        Wait until a request may be sent to the wiki.
+
+        Returns:
+            The seconds waited
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.requests += 1
+            self.sent.append(now)
+            while self.sent[0] < now - RATE_WINDOW:
+                self.sent.popleft()
+            wait = max(0.0, self.hold_until - now)
+            if self.rate is not None:
+                self._refill(now)
+                self.tokens -= 1
+                if self.tokens < 0:
+                    wait = max(wait, self.updated - now - self.tokens / self.rate)
+            self.waited += wait
+            self._report()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def record_latency(self, seconds: float) -> None:
+        """
+        Record the response time of a successful request, cutting the rate if the
+        wiki is overloaded and raising it otherwise.
+
+        Args:
+            seconds: The response time
+        """
+        with self.lock:
+            now = time.monotonic()
+            if self.latency is None:
+                self.latency = seconds
+            else:
+                self.latency += LATENCY_SMOOTHING * (seconds - self.latency)
+            if self.latency > self.latency_target:
+                self._decrease(now, "latency", 0.0)
+            elif self.rate is not None:
+                # Additive increase, counting only time the wiki was not held
+                since = max(self.last_increase, self.last_decrease, self.hold_until)
+                if now > since:
+                    self._refill(now)
+                    self.rate += RATE_INCREASE * (now - since)
+                    if self.max_rate is not None:
+                        self.rate = min(self.rate, self.max_rate)
+            self.last_increase = now
+            self._report()
+
+    def slow_down(self, reason: str, hold: float = 0.0) -> None:
+        """
+        Cut the rate after the wiki pushed back.
+
+        Args:
+            reason: The kind of push back, e.g. "maxlag"
+            hold: Seconds no request may be sent to the wiki, e.g. its Retry-After
+        """
+        with self.lock:
+            self._decrease(time.monotonic(), reason, hold)
+            self._report()
+
+    def record_error(self, error: BaseException) -> None:
+        """
+        Slow down if a failed request shows that the wiki is busy; other errors are ignored.
+
+        Args:
+            error: The exception the request raised
+        """
+        if isinstance(error, MaxLagError):
+            self.slow_down("maxlag", max(error.lag or 0.0, error.retry_after or 0.0))
+        elif isinstance(error, RateLimitedError):
+            self.slow_down("ratelimited", RATELIMIT_DELAY)
+        elif isinstance(error, WikiHttpError) and error.code in ("http-429", "http-503"):
+            self.slow_down("throttled", error.retry_after or 0.0)
+
+    @contextmanager
+    def paced(self) -> Iterator[None]:
+        """Wait for a request slot, then feed the request's outcome back into the rate."""
+        self.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        except (WikiApiError, WikiHttpError) as e:
+            self.record_error(e)
+            raise
+        self.record_latency(time.monotonic() - start)
+
+    def state(self) -> Dict[str, Any]:
+        """
+        Get the current pacing state.
+
+        Returns:
+            Dictionary with "rate" (requests per second, None while not paced),
+            "max_rate", "requests", "waited_seconds", "latency" (moving average
+            of the response time) and "signals" (push backs by reason)
+        """
+        with self.lock:
+            return self._state()
+
+
+# Limiters by wiki API URL, shared by every bot of the process
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(wiki: str) -> AdaptiveRateLimiter:
+    """
+    Get the process-wide rate limiter of a wiki, creating it on first use.
+
+    Args:
+        wiki: The wiki's API URL
+
+    Returns:
+        The AdaptiveRateLimiter
+    """
+    with _limiters_lock:
+        limiter = _limiters.get(wiki)
+        if limiter is None:
+            limiter = _limiters[wiki] = AdaptiveRateLimiter(wiki)
+        return limiter
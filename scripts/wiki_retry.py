@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Wiki Retry
+Retry policy of the submission bots and the async submission engine.
+
+Errors are classified by type and API error code rather than by message:
+lagged replicas, throttling, rate limits, read-only mode and network
+failures are retried; rejected CSRF tokens are refreshed and the request is
+resent at once; everything else fails immediately. Waits use decorrelated
+jitter, so bots that failed together do not retry together, and never fall
+short of what the server asked for in Retry-After or the maxlag lag.
+"""
+
+import random
+import time
+from typing import Any, Callable, Optional
+
+from wiki_http_client import (BadTokenError, MaxLagError, RateLimitedError, WikiApiError, WikiHttpError,
+                              WrongTokenError)
+
+# HTTP statuses worth retrying: throttling and temporary server-side failures
+RETRYABLE_HTTP_STATUSES = {"http-429": "throttled", "http-500": "transient", "http-502": "transient",
+                           "http-503": "throttled", "http-504": "transient"}
+
+# MediaWiki's $wgRateLimits count edits per minute, so a rate limited edit
+# cannot succeed sooner than this
+RATELIMIT_DELAY = 60.0
+
+
+class RetryPolicy:
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 120.0,
+                 seed: Optional[int] = None):
+        """
+        Initialize the RetryPolicy.
+
+        Args:
+            max_attempts: Attempts per call before giving up on a retryable error; a CSRF
+                token refresh does not count
+            base_delay: Shortest delay in seconds before a retry
+            max_delay: Longest delay in seconds before a retry, also capping server-requested waits
+            seed: Seed of the jitter, for repeatable delays in tests
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.random = random.Random(seed)
+
+    def retry_reason(self, error: BaseException) -> Optional[str]:
+        """
+        Classify an error.
+
+        Args:
+            error: The exception raised by an attempt
+
+        Returns:
+            "badtoken" if the request may succeed with a fresh CSRF token;
+            "maxlag", "throttled", "ratelimited", "readonly" or "transient" if it
+            may succeed later; None if retrying cannot help
+        """
+        if isinstance(error, BadTokenError):
+            return "badtoken"
+        if isinstance(error, MaxLagError):
+            return "maxlag"
+        if isinstance(error, RateLimitedError):
+            return "ratelimited"
+        if isinstance(error, WrongTokenError):
+            # Resending a rejected login token cannot succeed; authenticate() fetches a new one
+            return None
+        if isinstance(error, WikiApiError):
+            return "readonly" if error.code == "readonly" else None
+        if isinstance(error, WikiHttpError):
+            if error.code in ("timeout", "network"):
+                return "transient"
+            return RETRYABLE_HTTP_STATUSES.get(error.code)
+        return None
+
+    def next_delay(self, previous: float, error: BaseException) -> float:
+        """
+        Pick the delay before the next retry.
+
+        Uses decorrelated jitter: a random delay between base_delay and three
+        times the previous delay, capped at max_delay. The delay is raised to
+        the server's Retry-After or the reported replication lag, if longer.
+
+        Args:
+            previous: The previous delay, or 0 before the first retry
+            error: The exception that is being retried
+
+        Returns:
+            The delay in seconds
+        """
+        delay = min(self.max_delay, self.random.uniform(self.base_delay, max(self.base_delay, previous * 3)))
+        server_delay = max(getattr(error, "retry_after", None) or 0.0, getattr(error, "lag", None) or 0.0)
+        if isinstance(error, RateLimitedError):
+            server_delay = max(server_delay, RATELIMIT_DELAY)
+        return max(delay, min(server_delay, self.max_delay))
+
+    def call(self, func: Callable[..., Any], *args: Any,
+             refresh_token: Optional[Callable[[], str]] = None,
+             on_retry: Optional[Callable[[int, BaseException, str, float], None]] = None, **kwargs: Any) -> Any:
+        """
+        Call a function, retrying the errors worth retrying.
+
+        Args:
+            func: The function to call
+            *args: Positional arguments of func
+            refresh_token: Returns a fresh CSRF token when func fails with badtoken. The
+                token must be passed to func as the csrf_token keyword argument; it is
+                refreshed once per call. Without it, badtoken is not retried.
+            on_retry: Called before each retry with the attempt number, the error,
+                the retry reason and the delay in seconds
+            **kwargs: Keyword arguments of func
+
+        Returns:
+            The return value of func
+
+        Raises:
+            The last error, if it is not worth retrying or max_attempts is reached
+        """
+        attempt = 0
+        delay = 0.0
+        token_refreshed = False
+        while True:
+            attempt += 1
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                reason = self.retry_reason(e)
+                if reason == "badtoken":
+                    if refresh_token is None or token_refreshed or "csrf_token" not in kwargs:
+                        raise
+                    token_refreshed = True
+                    # A token refresh is not a failed attempt, and needs no wait
+                    attempt -= 1
+                    if on_retry:
+                        on_retry(attempt + 1, e, reason, 0.0)
+                    kwargs["csrf_token"] = refresh_token()
+                    continue
+                if reason is None or attempt >= self.max_attempts:
+                    raise
+                delay = self.next_delay(delay, e)
+                if on_retry:
+                    on_retry(attempt, e, reason, delay)
+                time.sleep(delay)
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+Wiki Rules
+Typed validation rules and the compiled matcher that evaluates them against
+page text.
+
+Rules are configured per wiki under "validation_rules". A plain string is a
+literal rule; a dictionary selects the rule type:
+
+    "related_articles": "{{Related articles"
+    "no_duplicate_numbering": {"type": "literal", "pattern": "===1. ", "negate": true}
+    "heading_style": {"type": "regex", "pattern": "(?m)^== [^=]+ ==$"}
+    "has_sections": {"type": "count", "pattern": "==", "min": 2, "max": 200}
+"""
+
+import functools
+import json
+import re
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set
+
+RULE_TYPES = ["literal", "regex", "count"]
+
+# Rules that were negated by name before typed rules existed; plain-string
+# values with these names keep that meaning
+LEGACY_NEGATED_RULES = ["no_duplicate_numbering"]
+
+# Below this many patterns, separate substring scans (C search with early exit)
+# beat a single regex pass over the text; see benchmarks/bench_rules.py
+SINGLE_PASS_MIN_PATTERNS = 20
+
+# Compiled regexes kept per matcher, one per set of patterns still being searched for
+REGEX_CACHE_SIZE = 128
+
+
+def build_trie_regex(patterns: Iterable[str]) -> str:
+    """
+    Build a regex matching any of the patterns, factored by common prefixes.
+
+    At every position the longest pattern that matches there is returned.
+    Factoring makes the regex engine test each character once per position
+    instead of once per pattern.
+
+    Args:
+        patterns: Non-empty literal strings
+
+    Returns:
+        The regular expression source
+    """
+    trie = {}
+    for pattern in patterns:
+        node = trie
+        for char in pattern:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        if len(branches) == 1 and "" not in node:
+            return branches[0]
+        body = "(?:" + "|".join(branches) + ")"
+        # A pattern ends here, so the longer continuations are optional
+        return body + "?" if "" in node else body
+
+    return emit(trie)
+
+
+class PatternMatcher:
+    def __init__(self, patterns: Iterable[str], single_pass: Optional[bool] = None):
+        """
+        Compile a set of literal patterns for repeated searches.
+
+        Args:
+            patterns: The literal strings to look for
+            single_pass: Force (True) or disable (False) the single regex pass;
+                by default it is used for SINGLE_PASS_MIN_PATTERNS patterns or more
+        """
+        unique = set(patterns)
+        self.has_empty = "" in unique
+        unique.discard("")
+        # Shortest first, so an absent pattern rules out every pattern containing it
+        self.patterns = sorted(unique, key=lambda pattern: (len(pattern), pattern))
+        self.contained = {p: frozenset(q for q in self.patterns if q in p) for p in self.patterns}
+        self.containing = {p: frozenset(q for q in self.patterns if p in q) for p in self.patterns}
+        if single_pass is None:
+            single_pass = len(self.patterns) >= SINGLE_PASS_MIN_PATTERNS
+        self.single_pass = single_pass
+        self._regexes = {}
+
+    def find(self, text: str) -> Set[str]:
+        """
+        Find which patterns occur in a text.
+
+        Args:
+            text: The text to search
+
+        Returns:
+            The set of patterns that occur at least once
+        """
+        found = self._find_single_pass(text) if self.single_pass else self._find_by_scans(text)
+        if self.has_empty:
+            found.add("")
+        return found
+
+    def _find_by_scans(self, text: str) -> Set[str]:
+        """Search for each pattern separately, skipping patterns already ruled out."""
+        found, absent = set(), set()
+        for pattern in self.patterns:
+            if pattern in absent:
+                continue
+            if pattern in text:
+                found.add(pattern)
+            else:
+                absent |= self.containing[pattern]
+        return found
+
+    def _find_single_pass(self, text: str) -> Set[str]:
+        """Walk the text once, dropping patterns from the search as soon as they are found."""
+        found = set()
+        remaining = frozenset(self.patterns)
+        pos = 0
+        while remaining:
+            match = self._regex(remaining).search(text, pos)
+            if match is None:
+                break
+            # Shorter patterns matching at the same position are contained in the match
+            found |= self.contained[match.group()]
+            remaining = remaining - found
+            pos = match.start() + 1
+        return found
+
+    def _regex(self, remaining: FrozenSet[str]):
+        """Get the compiled regex for the patterns still being searched for."""
+        regex = self._regexes.get(remaining)
+        if regex is None:
+            if len(self._regexes) >= REGEX_CACHE_SIZE:
+                self._regexes.clear()
+            regex = self._regexes[remaining] = re.compile(build_trie_regex(remaining))
+        return regex
+
+
+@functools.lru_cache(maxsize=64)
+def get_pattern_matcher(patterns: FrozenSet[str]) -> PatternMatcher:
+    """
+    Get the cached matcher for a set of patterns, compiling it on first use.
+
+    Args:
+        patterns: The literal strings to look for
+
+    Returns:
+        The shared PatternMatcher instance
+    """
+    return PatternMatcher(patterns)
+
+
+class ValidationRule:
+    def __init__(self, name: str, rule_type: str, pattern: str, negate: bool = False,
+                 min_count: Optional[int] = None, max_count: Optional[int] = None, regex: bool = False):
+        """
+        Initialize a compiled validation rule.
+
+        Args:
+            name: The rule name reported in validation results
+            rule_type: One of RULE_TYPES
+            pattern: Literal text, or a regular expression for "regex" rules and regex counts
+            negate: Whether the rule passes when the check fails
+            min_count: Minimum number of occurrences for "count" rules
+            max_count: Maximum number of occurrences for "count" rules
+            regex: Whether a "count" rule counts regex matches instead of literal occurrences
+
+        Raises:
+            ValueError: If the rule type or bounds are invalid, or the regex does not compile
+        """
+        if rule_type not in RULE_TYPES:
+            raise ValueError(f"Invalid validation rule '{name}': unknown type '{rule_type}'")
+        if rule_type == "count" and min_count is None and max_count is None:
+            raise ValueError(f"Invalid validation rule '{name}': count rules need 'min' or 'max'")
+        self.name = name
+        self.rule_type = rule_type
+        self.pattern = pattern
+        self.negate = negate
+        self.min_count = min_count
+        self.max_count = max_count
+        self.compiled = None
+        if rule_type == "regex" or (rule_type == "count" and regex):
+            try:
+                self.compiled = re.compile(pattern)
+            except re.error as e:
+                raise ValueError(f"Invalid validation rule '{name}': bad regular expression: {e}")
+
+    def count(self, text: str) -> int:
+        """Count occurrences, stopping once the maximum is exceeded."""
+        if self.compiled is None:
+            return text.count(self.pattern)
+        occurrences = 0
+        for _ in self.compiled.finditer(text):
+            occurrences += 1
+            if self.max_count is not None and occurrences > self.max_count:
+                break
+        return occurrences
+
+    def evaluate(self, text: str, present: Set[str]) -> bool:
+        """
+        Check the rule against a text.
+
+        Args:
+            text: The text to check
+            present: Literal patterns found in the text by the rule set's PatternMatcher
+
+        Returns:
+            Whether the rule passes
+        """
+        if self.rule_type == "literal":
+            result = self.pattern in present
+        elif self.rule_type == "regex":
+            result = self.compiled.search(text) is not None
+        else:
+            occurrences = self.count(text)
+            result = ((self.min_count is None or occurrences >= self.min_count) and
+                      (self.max_count is None or occurrences <= self.max_count))
+        return result != self.negate
+
+
+def parse_rule(name: str, spec: Any) -> ValidationRule:
+    """
+    Parse one entry of a wiki's "validation_rules".
+
+    Args:
+        name: The rule name
+        spec: A literal pattern string, or a dictionary with "type", "pattern" and
+            optional "negate", "min", "max" and "regex" keys
+
+    Returns:
+        The compiled rule
+
+    Raises:
+        ValueError: If the rule is malformed
+    """
+    if isinstance(spec, str):
+        return ValidationRule(name, "literal", spec, negate=name in LEGACY_NEGATED_RULES)
+    if not isinstance(spec, dict) or not isinstance(spec.get("pattern"), str):
+        raise ValueError(f"Invalid validation rule '{name}': expected a string or an object with a 'pattern'")
+    try:
+        min_count = int(spec["min"]) if spec.get("min") is not None else None
+        max_count = int(spec["max"]) if spec.get("max") is not None else None
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid validation rule '{name}': 'min' and 'max' must be integers")
+    return ValidationRule(name, spec.get("type", "literal"), spec["pattern"], negate=bool(spec.get("negate", False)),
+                          min_count=min_count, max_count=max_count, regex=bool(spec.get("regex", False)))
+
+
+class RuleSet:
+    def __init__(self, rules: List[ValidationRule]):
+        """
+        Initialize a set of compiled rules.
+
+        All literal rules share one PatternMatcher, so they cost a single
+        search of the text together.
+
+        Args:
+            rules: The compiled rules, in reporting order
+        """
+        self.rules = rules
+        self.matcher = PatternMatcher(rule.pattern for rule in rules if rule.rule_type == "literal")
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def evaluate(self, text: str) -> Dict[str, bool]:
+        """
+        Check every rule against a text.
+
+        Args:
+            text: The text to check
+
+        Returns:
+            Dictionary with rule names as keys and whether each rule passes as values
+        """
+        present = self.matcher.find(text)
+        return {rule.name: rule.evaluate(text, present) for rule in self.rules}
+
+
+def compile_rules(validation_rules: Dict[str, Any]) -> RuleSet:
+    """
+    Compile a wiki's "validation_rules" configuration.
+
+    Args:
+        validation_rules: Dictionary of rule names to rule specifications
+
+    Returns:
+        The compiled rule set
+
+    Raises:
+        ValueError: If any rule is malformed
+    """
+    return RuleSet([parse_rule(name, spec) for name, spec in validation_rules.items()])
+
+
+@functools.lru_cache(maxsize=64)
+def _compile_rules_json(rules_json: str) -> RuleSet:
+    # A list of [name, spec] pairs, so the rules keep their configured order
+    return compile_rules(dict(json.loads(rules_json)))
+
+
+def get_rule_set(validation_rules: Any) -> RuleSet:
+    """
+    Get a compiled rule set for a rules configuration, compiling it once per distinct configuration.
+
+    Prefer WikiConfigManager.get_validation_rules() for configured wikis, which
+    is cached by wiki ID and avoids serializing the configuration.
+
+    Args:
+        validation_rules: A RuleSet, or a "validation_rules" dictionary
+
+    Returns:
+        The compiled rule set
+    """
+    if isinstance(validation_rules, RuleSet):
+        return validation_rules
+    # Only the specifications are sorted; the order of the rules is part of the key
+    return _compile_rules_json(json.dumps(list((validation_rules or {}).items()), sort_keys=True))
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Wiki Search
+Fuzzy search over the wiki registry by ID, name and host, backed by a
+trigram index that is built once per configuration and cached on disk by
+WikiConfigManager.
+"""
+
+import heapq
+import re
+from array import array
+from collections import Counter
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Bump when the layout of the serialized index changes
+SEARCH_INDEX_VERSION = 1
+
+# Trigrams found in more than this share of wikis (e.g. "wik") barely narrow a
+# search, so they are skipped while rarer trigrams of the query remain
+COMMON_TRIGRAM_SHARE = 0.25
+
+# A wiki must contain at least this share of the query's trigrams to be a match
+# (as with pg_trgm's default similarity threshold)
+MIN_TRIGRAM_SHARE = 0.3
+
+TOKEN_PATTERN = re.compile(r"[^\W_]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into lowercase words, at punctuation, underscores and dots.
+
+    Args:
+        text: The text
+
+    Returns:
+        List of words
+    """
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def token_trigrams(tokens: Iterable[str]) -> Set[str]:
+    """Get the trigrams of words padded with spaces, so prefixes and suffixes weigh more."""
+    trigrams = set()
+    for token in tokens:
+        padded = f" {token} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+def wiki_search_tokens(wiki_id: str, wiki_config: Dict[str, Any]) -> Set[str]:
+    """Get the searchable words of a wiki: its ID, name and API host."""
+    api_url = wiki_config.get("api_url", "")
+    host = api_url.split("/", 3)[2] if api_url.count("/") >= 2 else ""
+    return set(tokenize(wiki_id)) | set(tokenize(wiki_config.get("name", ""))) | set(tokenize(host))
+
+
+def _positions(postings: Dict[str, bytes], key: str) -> memoryview:
+    """View a posting list, stored as the bytes of an unsigned int array, without copying it."""
+    return memoryview(postings.get(key, b"")).cast('I')
+
+
+class WikiSearchIndex:
+    def __init__(self, wikis: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Build a search index over wikis.
+
+        Args:
+            wikis: Wiki configurations or summaries (with "name" and "api_url") keyed by wiki ID
+        """
+        self.wiki_ids = []
+        # Lowercase wiki ID to its position, built on the first search
+        self.id_positions = None
+        # Number of distinct trigrams per wiki, to prefer tight matches
+        trigram_counts = array('I')
+        # Trigram to the positions in wiki_ids of the wikis containing it, kept
+        # as bytes so loading a cached index does not convert every list
+        postings = {}
+        for position, (wiki_id, wiki_config) in enumerate((wikis or {}).items()):
+            trigrams = token_trigrams(wiki_search_tokens(wiki_id, wiki_config))
+            self.wiki_ids.append(wiki_id)
+            trigram_counts.append(len(trigrams))
+            for trigram in trigrams:
+                postings.setdefault(trigram, []).append(position)
+        self.trigram_counts = trigram_counts.tobytes()
+        self.postings = {key: array('I', value).tobytes() for key, value in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.wiki_ids)
+
+    def search(self, query: str, limit: int = 10) -> List[Tuple[str, float]]:
+        """
+        Find the wikis best matching a query.
+
+        Wikis are ranked by the share of the query's trigrams they contain,
+        plus one for an exact ID match, so typos and partial words still
+        match. Words are padded with spaces before splitting them into
+        trigrams, so whole words rank above words merely containing them. Ties
+        go to the wiki with the least other text.
+
+        Args:
+            query: Free text, e.g. "arch", "wikipedia.org" or "wikipeda"
+            limit: Maximum number of matches
+
+        Returns:
+            List of (wiki_id, score) tuples, best first
+        """
+        query_tokens = tokenize(query)
+        if not query_tokens or not self.wiki_ids:
+            return []
+        trigrams = token_trigrams(query_tokens)
+        present = sorted((trigram for trigram in trigrams if trigram in self.postings),
+                         key=lambda trigram: len(self.postings[trigram]))
+        if not present:
+            return []
+        common = COMMON_TRIGRAM_SHARE * len(self.wiki_ids) * 4
+        selective = [trigram for trigram in present if len(self.postings[trigram]) <= common] or present
+        # Trigrams no wiki contains still count against every wiki
+        total = len(selective) + len(trigrams) - len(present)
+
+        # Counter counts in C, which keeps this fast with tens of thousands of postings
+        counts = Counter(chain.from_iterable(_positions(self.postings, trigram) for trigram in selective))
+        needed = max(1, int(total * MIN_TRIGRAM_SHARE + 0.5))
+
+        if self.id_positions is None:
+            self.id_positions = {wiki_id.lower(): position for position, wiki_id in enumerate(self.wiki_ids)}
+        position = self.id_positions.get("_".join(query_tokens))
+        if position is not None and counts[position] >= needed:
+            counts[position] += total
+
+        best = heapq.nlargest(limit, counts.values())
+        if not best or best[0] < needed:
+            return []
+        cutoff = max(best[-1], needed)
+        above = [position for position, count in counts.items() if count > cutoff]
+        # Ties go to the wiki with the least other text
+        trigram_counts = memoryview(self.trigram_counts).cast('I')
+        above.sort(key=lambda position: (-counts[position], trigram_counts[position]))
+        tied = heapq.nsmallest(limit - len(above), (position for position, count in counts.items() if count == cutoff),
+                               key=trigram_counts.__getitem__)
+        return [(self.wiki_ids[position], round(counts[position] / total, 3)) for position in above + tied]
+
+    def to_state(self) -> Dict[str, Any]:
+        """
+        Serialize the index into plain values marshal can store.
+
+        Returns:
+            The serialized index
+        """
+        return {
+            "version": SEARCH_INDEX_VERSION,
+            "wiki_ids": self.wiki_ids,
+            "trigram_counts": self.trigram_counts,
+            "postings": self.postings
+        }
+
+    @classmethod
+    def from_state(cls, state: Any) -> Optional["WikiSearchIndex"]:
+        """
+        Restore an index serialized with to_state().
+
+        Args:
+            state: The serialized index
+
+        Returns:
+            The index, or None if the state is from an incompatible version
+        """
+        if not isinstance(state, dict) or state.get("version") != SEARCH_INDEX_VERSION:
+            return None
+        index = cls()
+        index.wiki_ids = state["wiki_ids"]
+        index.trigram_counts = state["trigram_counts"]
+        index.postings = state["postings"]
+        return index
@@ -7,28 +7,41 @@ It also includes post-submission validation to verify the content was uploaded c
 Works with any MediaWiki-based wiki through a configurable system.
 """
 
-import subprocess
-import json
 import time
 import sys
 import argparse
 import getpass
 import os
 import secrets
-import requests
 from typing import Dict, List, Optional, Any, Tuple
 
 # Import our custom modules
-from wiki_config_manager import WikiConfigManager
+from wiki_config_manager import WikiConfigManager, DEFAULT_MAXLAG
+from wiki_async_engine import AsyncSubmissionEngine
+from wiki_logging import get_run_journal
+from wiki_metrics import export_at_exit, get_metrics
+from wiki_http_client import (BadTokenError, RateLimitedError, WikiApiError, WikiHttpClient, WrongTokenError,
+                              EncodedFormValue, FileFormValue, raise_for_maxlag)
+from wiki_rate_limiter import get_rate_limiter
+from wiki_retry import RetryPolicy
+from wiki_session_cache import WikiSessionCache, ANONYMOUS_CSRF_TOKEN
 from wiki_selector import WikiSelector
 from wiki_validator import WikiValidator
 
 class EnhancedSecureWikiBot:
     def __init__(self):
         self.username = None
-        self.log_file = f"/tmp/wiki_submission_{os.getpid()}.log"  # Use process ID for unique file
-        self.session = None
+        self.log_file = f"/tmp/wiki_submission_{os.getpid()}.jsonl"  # Use process ID for unique file
+        # Shared by every bot of this process; removed at exit unless keep is set
+        self.journal = get_run_journal(self.log_file)
+        self.metrics = get_metrics()
+        self.retry_policy = RetryPolicy()
         self.current_wiki_config = {}
+        self.http_client = WikiHttpClient(user_agent="WikiSecureBot/1.0 (Generic Wiki Submission Tool)")
+        self.session_cache = None
+        self.skip_unchanged = True
+        # Sent as the maxlag parameter of every request, None to send none
+        self.maxlag = DEFAULT_MAXLAG
         
     def set_wiki_config(self, wiki_config: Dict[str, Any]) -> None:
         """
@@ -38,17 +51,31 @@ class EnhancedSecureWikiBot:
             wiki_config: Dictionary containing wiki configuration
         """
         self.current_wiki_config = wiki_config
+        # Use the user agent from the wiki config for all subsequent requests
+        self.http_client.set_user_agent(
+            wiki_config.get("user_agent", "WikiSecureBot/1.0 (Generic Wiki Submission Tool)")
+        )
+        # Pacing settings; "maxlag" may be null to send no maxlag parameter
+        self.maxlag = wiki_config.get("maxlag", DEFAULT_MAXLAG)
+        if wiki_config.get("max_rate") is not None:
+            get_rate_limiter(self.current_api_url()).set_max_rate(float(wiki_config["max_rate"]))
         
-    def log_message(self, message: str) -> None:
-        """Logs messages to a file with a timestamp, excluding sensitive data."""
-        timestamp = time.strftime("%Y-%m-%d %H:%M:%S UTC")
-        log_entry = f"[{timestamp}] {message}"
-        try:
-            with open(self.log_file, "a") as f:
-                f.write(log_entry + "\n")
-        except Exception:
-            # If we can't write to log, continue without logging
-            pass
+    def current_api_url(self) -> str:
+        """Get the API URL of the current wiki."""
+        return self.current_wiki_config.get("api_url", "https://wiki.archlinux.org/api.php")
+
+    def log_message(self, message: str, **fields: Any) -> None:
+        """
+        Log a message to the run journal, excluding sensitive data.
+        
+        The record is queued and written by a background thread, so this
+        never blocks on the file.
+        
+        Args:
+            message: The message
+            **fields: Structured fields: wiki, page, phase, duration (seconds) and outcome
+        """
+        self.journal.log(message, **fields)
             
     def secure_clear_string(self, s: str) -> None:
         """Securely clear a string from memory by overwriting with random data."""
@@ -60,279 +87,554 @@ class EnhancedSecureWikiBot:
             # Clear the random data
             del s
             
-    def run_curl_command(self, data_params: Dict[str, str], method: str = "POST", 
-                        expect_json: bool = True, initial_cookies: bool = False,
-                        urlencode_params: Dict[str, str] = None) -> Any:
-        """Helper function to execute curl commands and parse JSON responses."""
-        # Create cookies file with process ID for unique file
-        cookies_file = f"/tmp/wiki_cookies_{os.getpid()}.txt"
-        
-        # Use API URL from current wiki config
-        wiki_api_url = self.current_wiki_config.get("api_url", "https://wiki.archlinux.org/api.php")
-        cmd = ["curl", "-s", "-X", method, wiki_api_url]
+    def _redact_params(self, params: Dict[str, str]) -> Dict[str, str]:
+        """Return a copy of request parameters safe for logging."""
+        redacted = {}
+        for key, value in params.items():
+            if key in ["lgpassword", "lgtoken", "token"]:
+                redacted[key] = "***"
+            elif key == "text" and isinstance(value, FileFormValue):
+                redacted[key] = f"<{len(value)} bytes from {value.path}>"
+            elif key == "text":
+                redacted[key] = f"<{len(value)} characters>"
+            else:
+                redacted[key] = value
+        return redacted
 
+    def api_request(self, data_params: Dict[str, str], method: str = "POST",
+                    expect_json: bool = True, initial_cookies: bool = False,
+                    urlencode_params: Dict[str, str] = None) -> Any:
+        """Helper function to send an API request over the pooled session and parse JSON responses."""
         if initial_cookies:
-            # For the very first login token request, we don't have cookies yet
-            cmd.extend(["-c", cookies_file])
-        else:
-            # For subsequent requests, read and write cookies
-            cmd.extend(["-b", cookies_file, "-c", cookies_file])
+            # The login token request starts a fresh session
+            self.http_client.clear_cookies()
 
-        # Add data parameters
-        for key, value in data_params.items():
-            # URL encode sensitive parameters
-            if key in ["lgtoken", "lgpassword", "text", "summary", "token"]:
-                cmd.extend(["--data-urlencode", f"{key}={value}"])
-            else:
-                cmd.extend(["-d", f"{key}={value}"])
-                
-        # Add additional URL-encoded parameters
-        if urlencode_params:
-            for key, value in urlencode_params.items():
-                cmd.extend(["--data-urlencode", f"{key}={value}"])
-        
-        # Add user agent from current wiki config or default
-        user_agent = self.current_wiki_config.get("user_agent", "WikiSecureBot/1.0 (Generic Wiki Submission Tool)")
-        cmd.extend(["--user-agent", user_agent])
-        
-        # Add timeout options
-        cmd.extend(["--connect-timeout", "30", "--max-time", "120"])
+        # Use API URL from current wiki config
+        wiki_api_url = self.current_wiki_config.get("api_url", "https://wiki.archlinux.org/api.php")
 
-        self.log_message(f"Executing secure curl command: {' '.join(cmd[:3] + ['***' if '=' in x and any(sensitive in x.lower() for sensitive in ['password', 'token']) else x for x in cmd[3:]])}")
-        process = subprocess.run(cmd, capture_output=True, text=True, check=False)
+        params = dict(data_params)
+        if urlencode_params:
+            params.update(urlencode_params)
+        if self.maxlag is not None:
+            # Lets the wiki refuse the request while its replicas lag, instead of adding to their load
+            params["maxlag"] = str(self.maxlag)
 
-        if process.returncode != 0:
-            self.log_message(f"Curl command failed with exit code {process.returncode}: {process.stderr}")
-            raise Exception(f"Curl command failed: {process.stderr}")
+        self.log_message(f"Sending secure {method} request to {wiki_api_url}: {self._redact_params(params)}",
+                         wiki=wiki_api_url, phase="request")
+        # Paced per wiki; refusals and slow responses slow down every bot talking to it
+        with get_rate_limiter(wiki_api_url).paced():
+            if method.upper() == "GET":
+                response = self.http_client.request(method, wiki_api_url, params=params)
+            else:
+                response = self.http_client.request(method, wiki_api_url, data=params)
 
-        if expect_json:
-            try:
-                return json.loads(process.stdout)
-            except json.JSONDecodeError:
-                self.log_message(f"Failed to decode JSON response: {process.stdout}")
-                raise Exception("Failed to decode JSON response from API.")
-        return process.stdout
+            if expect_json:
+                try:
+                    data = response.json()
+                except ValueError:
+                    self.log_message(f"Failed to decode JSON response: {response.text}")
+                    raise Exception("Failed to decode JSON response from API.")
+                raise_for_maxlag(response, data)
+                return data
+            return response.text
 
     def get_login_token(self) -> str:
         """Get login token from Wiki API."""
-        self.log_message("Attempting to get login token...")
-        response = self.run_curl_command(
-            {"action": "query", "meta": "tokens", "type": "login", "format": "json"}, 
-            initial_cookies=True
-        )
-        token = response.get("query", {}).get("tokens", {}).get("logintoken")
-        if not token:
-            self.log_message(f"Failed to get login token. Response: {response}")
-            raise Exception("Could not retrieve login token.")
-        self.log_message("Login token obtained.")
-        return token
+        with self.metrics.timed(self.current_api_url(), "login_token"):
+            self.log_message("Attempting to get login token...")
+            response = self.api_request(
+                {"action": "query", "meta": "tokens", "type": "login", "format": "json"}, 
+                initial_cookies=True
+            )
+            token = response.get("query", {}).get("tokens", {}).get("logintoken")
+            if not token:
+                self.log_message(f"Failed to get login token. Response: {response}")
+                raise WikiApiError("Could not retrieve login token.", code="notoken")
+            self.log_message("Login token obtained.")
+            return token
 
     def login(self, login_token: str, password: str) -> str:
         """Login to Wiki API. Returns 'Success' on success, raises exception on failure."""
-        self.log_message(f"Attempting to log in as {self.username}...")
-        response = self.run_curl_command(
-            {
-                "action": "login",
-                "lgname": self.username,
-                "format": "json"
-            },
-            urlencode_params={
-                "lgpassword": password,
-                "lgtoken": login_token
-            }
-        )
-        result = response.get("login", {}).get("result")
-        if result != "Success":
-            reason = response.get("login", {}).get("reason", "Unknown reason")
-            # Log more details about the response for debugging
-            self.log_message(f"Login failed. Full response: {response}")
-            raise Exception(f"Login failed: {reason}. Response: {response}")
-        self.log_message("Login successful.")
-        return result
+        with self.metrics.timed(self.current_api_url(), "login"):
+            self.log_message(f"Attempting to log in as {self.username}...")
+            response = self.api_request(
+                {
+                    "action": "login",
+                    "lgname": self.username,
+                    "format": "json"
+                },
+                urlencode_params={
+                    "lgpassword": password,
+                    "lgtoken": login_token
+                }
+            )
+            result = response.get("login", {}).get("result")
+            if result != "Success":
+                reason = response.get("login", {}).get("reason", "Unknown reason")
+                # Log more details about the response for debugging
+                self.log_message(f"Login failed. Full response: {response}", phase="login", outcome="failed")
+                if result == "WrongToken":
+                    raise WrongTokenError(f"Login failed: {reason}. Response: {response}")
+                raise WikiApiError(f"Login failed: {reason}. Response: {response}", code=result or "unknown")
+            self.log_message("Login successful.", phase="login", outcome="success")
+            return result
 
     def get_csrf_token(self) -> str:
         """Get CSRF token for editing."""
-        self.log_message("Attempting to get CSRF token...")
-        response = self.run_curl_command({
-            "action": "query", 
-            "meta": "tokens", 
-            "type": "csrf", 
-            "format": "json"
-        })
-        token = response.get("query", {}).get("tokens", {}).get("csrftoken")
-        if not token:
-            self.log_message(f"Failed to get CSRF token. Response: {response}")
-            raise Exception("Could not retrieve CSRF token.")
-        self.log_message("CSRF token obtained.")
-        return token
-
-    def submit_wiki_page(self, title: str, content: str, summary: str, 
-                        csrf_token: str, is_bot_edit: bool = True) -> None:
-        """Submit page content to Wiki."""
-        self.log_message(f"Attempting to submit page: '{title}' with summary: '{summary}'...")
-        params = {
-            "action": "edit",
-            "title": title,
-            "format": "json"
-        }
-        if is_bot_edit:
-            params["bot"] = "1"
+        with self.metrics.timed(self.current_api_url(), "csrf_token"):
+            self.log_message("Attempting to get CSRF token...")
+            response = self.api_request({
+                "action": "query", 
+                "meta": "tokens", 
+                "type": "csrf", 
+                "format": "json"
+            })
+            token = response.get("query", {}).get("tokens", {}).get("csrftoken")
+            if not token:
+                self.log_message(f"Failed to get CSRF token. Response: {response}")
+                raise WikiApiError("Could not retrieve CSRF token.", code="notoken")
+            self.log_message("CSRF token obtained.")
+            return token
 
-        response = self.run_curl_command(
-            params,
-            urlencode_params={
-                "text": content,
-                "summary": summary,
-                "token": csrf_token
+    def submit_wiki_page(self, title: str, content: Any, summary: str, 
+                        csrf_token: str, is_bot_edit: bool = True) -> Dict[str, Any]:
+        """Submit page content (a string, EncodedFormValue or FileFormValue) to Wiki. Returns the "edit" object of the API response."""
+        with self.metrics.timed(self.current_api_url(), "edit"):
+            self.log_message(f"Attempting to submit page: '{title}' with summary: '{summary}'...")
+            params = {
+                "action": "edit",
+                "title": title,
+                # Refused with assertuserfailed instead of being saved logged out if the session expired
+                "assert": "user",
+                "format": "json"
             }
-        )
-        result = response.get("edit", {}).get("result")
-        if result != "Success":
-            error_code = response.get("error", {}).get("code", "N/A")
-            error_info = response.get("error", {}).get("info", "Unknown error")
-            self.log_message(f"Edit failed for '{title}': {error_code} - {error_info}. Full response: {response}")
+            if is_bot_edit:
+                params["bot"] = "1"
+
+            start = time.monotonic()
+            response = self.api_request(
+                params,
+                urlencode_params={
+                    "text": content,
+                    "summary": summary,
+                    "token": csrf_token
+                }
+            )
+            result = response.get("edit", {}).get("result")
+            if result != "Success":
+                error_code = response.get("error", {}).get("code", "N/A")
+                error_info = response.get("error", {}).get("info", "Unknown error")
+                self.log_message(f"Edit failed for '{title}': {error_code} - {error_info}. Full response: {response}",
+                                 wiki=self.current_wiki_config.get("api_url"), page=title, phase="edit",
+                                 duration=time.monotonic() - start, outcome=error_code)
             
-            # Handle specific error cases
-            if error_code == "badtoken":
-                raise Exception("CSRF token is invalid. Please get a new CSRF token and try again.")
-            elif error_code == "maxlag":
-                raise Exception("Wiki is currently lagging. Please try again later.")
-            elif error_code == "spamdetected":
-                raise Exception("Content detected as spam. Please review your content.")
-            elif error_code == "abusefilter":
-                raise Exception("Content blocked by abuse filter. Please review your content.")
-            else:
-                raise Exception(f"Edit failed: {error_code} - {error_info}")
+                # Handle specific error cases
+                if error_code == "badtoken":
+                    raise BadTokenError("CSRF token is invalid. Please get a new CSRF token and try again.")
+                elif error_code == "assertuserfailed":
+                    raise BadTokenError("Session is no longer logged in. Please log in again.", code=error_code)
+                elif error_code == "ratelimited":
+                    error = RateLimitedError(f"Edit failed: {error_code} - {error_info}")
+                    # Further edits would hit the same per-account limit
+                    get_rate_limiter(self.current_api_url()).record_error(error)
+                    raise error
+                elif error_code == "spamdetected":
+                    raise WikiApiError("Content detected as spam. Please review your content.", code=error_code)
+                elif error_code == "abusefilter":
+                    raise WikiApiError("Content blocked by abuse filter. Please review your content.", code=error_code)
+                else:
+                    raise WikiApiError(f"Edit failed: {error_code} - {error_info}", code=error_code)
                 
-        self.log_message(f"Page '{title}' submitted successfully. New revision ID: {response.get('edit',{}).get('newrevid')}")
+            self.log_message(f"Page '{title}' submitted successfully. New revision ID: {response.get('edit',{}).get('newrevid')}",
+                             wiki=self.current_wiki_config.get("api_url"), page=title, phase="edit",
+                             duration=time.monotonic() - start, outcome="success")
+            return response.get("edit", {})
 
-    def exponential_backoff(self, func, *args, max_retries: int = 3, **kwargs) -> Any:
-        """Execute function with exponential backoff for transient errors."""
-        retry_count = 0
-        delay = 1
+    def is_page_unchanged(self, title: str, content: Any) -> bool:
+        """
+        Check whether the current wiki already has this exact content, so the edit can be skipped.
         
-        while retry_count < max_retries:
-            try:
-                return func(*args, **kwargs)
-            except Exception as e:
-                retry_count += 1
-                if retry_count < max_retries:
-                    error_msg = str(e).lower()
-                    # Check if this is a transient error
-                    if any(keyword in error_msg for keyword in ["maxlag", "timeout", "network"]):
-                        self.log_message(f"Attempt {retry_count} failed with transient error. Retrying in {delay} seconds...")
-                        time.sleep(delay)
-                        delay *= 2  # Exponential backoff
-                        continue
-                    elif "wrongtoken" in error_msg.lower():
-                        self.log_message(f"Attempt {retry_count} failed with wrong token error. Retrying with fresh token...")
-                        time.sleep(delay)
-                        delay *= 2  # Exponential backoff
-                        continue
-                    else:
-                        # Non-transient error, don't retry
-                        raise e
-                else:
-                    self.log_message(f"Failed after {max_retries} attempts")
-                    raise Exception(f"Failed after {max_retries} attempts: {e}")
+        Compares the latest revision's SHA-1 and size with the local content
+        without downloading the page. Always False when skip_unchanged is off.
+        """
+        if not self.skip_unchanged:
+            return False
+        wiki_api_url = self.current_wiki_config.get("api_url", "https://wiki.archlinux.org/api.php")
+        validator = WikiValidator(http_client=self.http_client)
+        if validator.is_content_unchanged(wiki_api_url, title, content):
+            self.log_message(f"Page '{title}' already matches the local content. Skipping edit",
+                             wiki=wiki_api_url, page=title, phase="check", outcome="unchanged")
+            return True
+        return False
+
+    def exponential_backoff(self, func, *args, refresh_token=None, **kwargs) -> Any:
+        """
+        Execute function, retrying errors the retry policy classifies as retryable.
+        
+        Waits grow with decorrelated jitter and honour Retry-After and maxlag
+        lag values. See RetryPolicy.call() for refresh_token.
+        """
+        wiki_api_url = self.current_api_url()
         
-        return None
+        def on_retry(attempt: int, error: BaseException, reason: str, delay: float) -> None:
+            self.log_message(f"Attempt {attempt} failed ({reason}): {error}. Retrying in {delay:.1f} seconds...",
+                             phase="retry", outcome=reason)
+            self.metrics.count_retry(wiki_api_url, reason)
+        
+        try:
+            return self.retry_policy.call(func, *args, refresh_token=refresh_token, on_retry=on_retry, **kwargs)
+        except Exception as e:
+            if self.retry_policy.retry_reason(e) is not None:
+                self.log_message(f"Giving up after {self.retry_policy.max_attempts} attempts: {e}",
+                                 phase="retry", outcome="failed")
+            raise
+
+    def refresh_csrf_token(self, password: Optional[str] = None) -> str:
+        """
+        Replace a CSRF token the wiki rejected and update the cached session.
+        
+        If the session expired, the wiki hands out the anonymous token, so the
+        bot logs in again instead of saving edits logged out.
+        
+        Args:
+            password: Password for logging in again; prompted for if needed and not given
+        """
+        self.log_message("CSRF token rejected. Refreshing token...")
+        csrf_tok = self.exponential_backoff(self.get_csrf_token)
+        if csrf_tok == ANONYMOUS_CSRF_TOKEN:
+            self.log_message("Session expired. Logging in again")
+            if password is None:
+                prompted = self.prompt_password()
+                try:
+                    self.authenticate(prompted)
+                finally:
+                    self.secure_clear_string(prompted)
+                    prompted = None
+            else:
+                self.authenticate(password)
+            csrf_tok = self.exponential_backoff(self.get_csrf_token)
+        self.save_session(csrf_tok)
+        return csrf_tok
 
     def cleanup(self) -> None:
         """Cleanup temporary files and clear sensitive data."""
-        # Create cookies file with process ID for unique file
-        cookies_file = f"/tmp/wiki_cookies_{os.getpid()}.txt"
-        
         print("\033[0;34m[SECURITY]\033[0m Cleaning up temporary files...")
         self.log_message("Cleaning up temporary files")
         
-        # Remove temporary files
-        try:
-            if os.path.exists(cookies_file):
-                os.remove(cookies_file)
-            if os.path.exists(self.log_file):
-                os.remove(self.log_file)
-        except Exception as e:
-            self.log_message(f"Error during cleanup: {e}")
+        # Drop the session cookies and pooled connections
+        self.http_client.close()
         
         print("\033[0;34m[SECURITY]\033[0m Cleanup completed")
         self.log_message("Cleanup completed")
+        # Write the queued records out now; the journal itself is removed at exit unless kept
+        self.journal.flush()
 
-    def submit_content(self, page_title: str, content_file: str, edit_summary: str) -> None:
-        """Main function to submit content to Wiki with secure credential handling."""
+    def prompt_username(self) -> None:
+        """Prompt for the username."""
+        print("\n\033[0;34m[SECURITY]\033[0m Please enter your Wiki username:")
+        self.username = input().strip()
+        
+        # Validate username
+        if not self.username:
+            raise Exception("Username cannot be empty")
+
+    def prompt_password(self) -> str:
+        """Prompt for the password securely and return it."""
+        print("\n\033[0;34m[SECURITY]\033[0m Please enter your Wiki password (input will be hidden):")
+        password = getpass.getpass("")
+        
+        # Validate password
+        if not password:
+            raise Exception("Password cannot be empty")
+        
+        print("\033[0;34m[SECURITY]\033[0m Credentials received. Proceeding with authentication...")
+        self.log_message("Credentials received. Proceeding with authentication")
+        return password
+
+    def prompt_credentials(self) -> str:
+        """Prompt for the username and password. Sets the username and returns the password."""
+        self.prompt_username()
+        return self.prompt_password()
+
+    def restore_cached_session(self) -> Optional[str]:
+        """
+        Reuse a cached session for the current wiki if it is still accepted.
+        
+        The cached cookies are checked with a single meta=tokens request; a
+        logged-out session gets the anonymous token back.
+        
+        Returns:
+            A CSRF token for the restored session, or None if a full login is needed
+        """
+        if not self.session_cache:
+            return None
+        wiki_api_url = self.current_wiki_config.get("api_url", "https://wiki.archlinux.org/api.php")
+        entry = self.session_cache.load(wiki_api_url, self.username)
+        if not entry:
+            return None
+        
+        self.log_message("Found cached session. Checking that it is still valid...")
+        self.http_client.clear_cookies()
+        self.http_client.import_cookies(entry["cookies"])
+        try:
+            csrf_tok = self.get_csrf_token()
+        except Exception as e:
+            self.log_message(f"Cached session check failed: {e}")
+            csrf_tok = None
+        
+        if not csrf_tok or csrf_tok == ANONYMOUS_CSRF_TOKEN:
+            self.log_message("Cached session is no longer valid. Falling back to full login")
+            self.session_cache.invalidate(wiki_api_url, self.username)
+            self.http_client.clear_cookies()
+            return None
+        
+        print("\033[0;34m[SECURITY]\033[0m Reusing cached session; no password needed")
+        self.log_message("Reusing cached session")
+        self.save_session(csrf_tok)
+        return csrf_tok
+
+    def save_session(self, csrf_token: str) -> None:
+        """Store the current session in the session cache, if enabled."""
+        if not self.session_cache:
+            return
+        wiki_api_url = self.current_wiki_config.get("api_url", "https://wiki.archlinux.org/api.php")
         try:
-            # Read content from file
-            with open(content_file, 'r', encoding='utf-8') as f:
-                content = f.read()
+            self.session_cache.store(wiki_api_url, self.username, self.http_client.export_cookies(), csrf_token)
+        except Exception as e:
+            # A cache write failure must not fail the submission
+            self.log_message(f"Failed to update session cache: {e}")
+
+    def authenticate(self, password: str) -> None:
+        """Log in to the current wiki, retrying when the login token is rejected."""
+        login_success = False
+        login_attempts = 0
+        max_login_attempts = 3
+        
+        while not login_success and login_attempts < max_login_attempts:
+            login_attempts += 1
+            try:
+                login_tok = self.exponential_backoff(self.get_login_token)
+                self.exponential_backoff(self.login, login_tok, password)
+                login_success = True
+            except WrongTokenError:
+                if login_attempts >= max_login_attempts:
+                    raise
+                # A fresh login token is all it takes; waiting would not help
+                self.log_message(f"Login attempt {login_attempts} failed with wrong token. Retrying...",
+                                 phase="retry", outcome="wrongtoken")
+                self.metrics.count_retry(self.current_api_url(), "wrongtoken")
+
+    def submit_prepared_content(self, page_title: str, content: EncodedFormValue, edit_summary: str,
+                                password: str) -> Dict[str, Any]:
+        """
+        Log in and submit already read and encoded content to the current wiki.
+        
+        Used when pushing one file to several wikis, where credentials are
+        prompted for once and the content is read and encoded once.
+        
+        Returns:
+            The "edit" object of the API response, or {"skipped": True} if the
+            page is already up to date
+        """
+        self.log_message(f"Starting secure Wiki submission process for page: {page_title}")
+        try:
+            if self.is_page_unchanged(page_title, content.value):
+                return {"skipped": True}
+            csrf_tok = self.restore_cached_session()
+            if not csrf_tok:
+                self.authenticate(password)
+                csrf_tok = self.exponential_backoff(self.get_csrf_token)
+                self.save_session(csrf_tok)
+            edit = self.exponential_backoff(self.submit_wiki_page, page_title, content, edit_summary,
+                                            csrf_token=csrf_tok,
+                                            refresh_token=lambda: self.refresh_csrf_token(password))
+            self.log_message("Wiki submission completed successfully!")
+            return edit
+        except Exception as e:
+            self.log_message(f"An unrecoverable error occurred: {e}")
+            raise e
+
+    def submit_content(self, page_title: str, content_file: str, edit_summary: str) -> Dict[str, Any]:
+        """
+        Main function to submit content to Wiki with secure credential handling.
+        
+        Returns:
+            The "edit" section of the API response, or {"skipped": True} if the
+            page already held the content
+        """
+        try:
+            # Stream the content from the file instead of reading it into memory
+            content = FileFormValue(content_file)
             
             self.log_message(f"Starting secure Wiki submission process for page: {page_title}")
             
-            # Prompt for username
-            print("\n\033[0;34m[SECURITY]\033[0m Please enter your Wiki username:")
-            self.username = input().strip()
-            
-            # Validate username
-            if not self.username:
-                raise Exception("Username cannot be empty")
-            
-            # Prompt for password securely
-            print("\n\033[0;34m[SECURITY]\033[0m Please enter your Wiki password (input will be hidden):")
-            password = getpass.getpass("")
-            
-            # Validate password
-            if not password:
-                raise Exception("Password cannot be empty")
-            
-            print("\033[0;34m[SECURITY]\033[0m Credentials received. Proceeding with authentication...")
-            self.log_message("Credentials received. Proceeding with authentication")
-            
-            # Step 1 & 2: Get login token and login with retry for WrongToken errors
-            login_success = False
-            login_attempts = 0
-            max_login_attempts = 3
-            
-            while not login_success and login_attempts < max_login_attempts:
-                login_attempts += 1
-                try:
-                    login_tok = self.get_login_token()
-                    self.login(login_tok, password)
-                    login_success = True
-                except Exception as e:
-                    if "wrongtoken" in str(e).lower() and login_attempts < max_login_attempts:
-                        self.log_message(f"Login attempt {login_attempts} failed with wrong token. Retrying...")
-                        time.sleep(1)
-                        continue
-                    else:
-                        raise e
+            # Nothing to do, and no credentials needed, if the wiki already has this content
+            if self.is_page_unchanged(page_title, content):
+                print(f"\033[0;34m[INFO]\033[0m Page '{page_title}' already matches '{content_file}'. Edit skipped.")
+                return {"skipped": True}
             
-            # Securely clear password after use
-            self.secure_clear_string(password)
-            del password
+            self.prompt_username()
             
-            # Step 3: Get CSRF token
-            csrf_tok = self.exponential_backoff(self.get_csrf_token)
+            # Only ask for the password if there is no valid cached session
+            csrf_tok = self.restore_cached_session()
+            if not csrf_tok:
+                password = self.prompt_password()
+                
+                # Step 1 & 2: Get login token and login
+                self.authenticate(password)
+                
+                # Securely clear password after use
+                self.secure_clear_string(password)
+                del password
+                
+                # Step 3: Get CSRF token
+                csrf_tok = self.exponential_backoff(self.get_csrf_token)
+                self.save_session(csrf_tok)
             
             # Step 4: Submit the page
-            self.exponential_backoff(
+            edit = self.exponential_backoff(
                 self.submit_wiki_page, 
                 page_title, 
                 content, 
                 edit_summary, 
-                csrf_tok
+                csrf_token=csrf_tok,
+                refresh_token=self.refresh_csrf_token
             )
             
             self.log_message("Wiki submission completed successfully!")
             print("\033[0;32m[INFO]\033[0m Edit submitted successfully!")
             print(f"Page '{page_title}' has been updated with content from '{content_file}'")
             print(f"Edit summary: {edit_summary}")
+            return edit
             
         except Exception as e:
             self.log_message(f"An unrecoverable error occurred: {e}")
             raise e
         finally:
+            self.log_message("Script finished.")
             # Cleanup
             self.cleanup()
-            self.log_message("Script finished.")
+
+def submit_to_wikis(targets: List[Tuple[str, Dict[str, Any]]], page_title: str, content_file: str,
+                    edit_summary: str, validate: bool = True, skip_unchanged: bool = True,
+                    session_cache: Optional[WikiSessionCache] = None) -> List[Dict[str, Any]]:
+    """
+    Push one content file to several wikis concurrently.
+    
+    Credentials are prompted for once and the content is read and URL-encoded
+    once. Every wiki gets its own bot and authenticated session, and all
+    targets run at the same time, so the total time is close to that of the
+    slowest wiki.
+    
+    Args:
+        targets: List of (wiki_id, wiki_config) tuples
+        page_title: Title of the wiki page to edit
+        content_file: Path to the file containing the content
+        edit_summary: Edit summary for the wiki edit
+        validate: Whether to validate each successful submission
+        skip_unchanged: Whether to skip wikis that already have this content
+        session_cache: Cache whose sessions are reused, and updated, for every wiki; None to always log in
+        
+    Returns:
+        One result per target with "wiki_id", "name", "status", "revid", "content_match",
+        "seconds" and "error" keys
+    """
+    with open(content_file, 'r', encoding='utf-8') as f:
+        content = EncodedFormValue(f.read())
+    
+    prompt_bot = EnhancedSecureWikiBot()
+    password = prompt_bot.prompt_credentials()
+    username = prompt_bot.username
+    prompt_bot.cleanup()
+    
+    def submit_to_wiki(wiki_id: str, wiki_config: Dict[str, Any], password: str) -> Dict[str, Any]:
+        start = time.monotonic()
+        result = {"wiki_id": wiki_id, "name": wiki_config.get("name", wiki_id), "status": "failed",
+                  "revid": None, "content_match": None, "seconds": 0.0, "error": None}
+        bot = EnhancedSecureWikiBot()
+        bot.username = username
+        bot.skip_unchanged = skip_unchanged
+        bot.session_cache = session_cache
+        bot.set_wiki_config(wiki_config)
+        try:
+            edit = bot.submit_prepared_content(page_title, content, edit_summary, password)
+            if edit.get("skipped"):
+                result["status"] = "skipped"
+            else:
+                result["status"] = "unchanged" if "nochange" in edit else "success"
+            result["revid"] = edit.get("newrevid")
+            if validate:
+                validator = WikiValidator(http_client=bot.http_client)
+                result["content_match"], _ = validator.validate_revision(
+                    wiki_config["api_url"], page_title, content_file, wiki_config.get("validation_rules", {}),
+                    revid=result["revid"]
+                )
+        except Exception as e:
+            result["error"] = str(e)
+        finally:
+            bot.cleanup()
+            result["seconds"] = time.monotonic() - start
+        return result
+    
+    # One session per wiki, all wikis at once
+    engine = AsyncSubmissionEngine(max_retries=1)
+    for wiki_id, _ in targets:
+        engine.set_limit(wiki_id, 1)
+    try:
+        outcomes = engine.run([
+            {"wiki": wiki_id, "name": wiki_id, "func": submit_to_wiki, "args": (wiki_id, wiki_config, password)}
+            for wiki_id, wiki_config in targets
+        ])
+    finally:
+        # Securely clear password after use
+        prompt_bot.secure_clear_string(password)
+        password = None
+    
+    return [outcome["result"] for outcome in outcomes]
+
+def print_fanout_report(results: List[Dict[str, Any]], page_title: str) -> None:
+    """Print a combined per-wiki result table for a multi-wiki submission."""
+    print(f"\n\033[0;34m[INFO]\033[0m Results for page '{page_title}':")
+    print(f"  {'Wiki':<36}{'Status':<11}{'Revision':>10}{'Validated':>11}{'Seconds':>9}")
+    for result in results:
+        revid = result["revid"] if result["revid"] is not None else "-"
+        if result["content_match"] is None:
+            validated = "-"
+        else:
+            validated = "yes" if result["content_match"] else "no"
+        print(f"  {result['name'][:35]:<36}{result['status']:<11}{revid:>10}{validated:>11}{result['seconds']:>9.2f}")
+        if result["error"]:
+            print(f"    \033[0;31m✗\033[0m {result['error']}")
+    
+    succeeded = sum(1 for result in results if result["status"] != "failed")
+    print(f"\n{succeeded} of {len(results)} wikis updated successfully")
+
+def resolve_fanout_targets(config_manager: WikiConfigManager, wiki_selector: WikiSelector,
+                           wiki_ids: Optional[str], category: Optional[str]) -> List[Tuple[str, Dict[str, Any]]]:
+    """
+    Resolve --wikis / --all-in-category into a list of (wiki_id, wiki_config) tuples.
+    
+    Raises:
+        Exception: If a wiki ID or the category is unknown
+    """
+    targets = []
+    if wiki_ids:
+        for wiki_id in [value.strip() for value in wiki_ids.split(",") if value.strip()]:
+            wiki_config = config_manager.get_wiki_config(wiki_id)
+            if not wiki_config:
+                raise Exception(f"Wiki '{wiki_id}' not found in configuration.")
+            targets.append((wiki_id, wiki_config))
+    if category:
+        categorized_wikis = config_manager.get_wikis_by_category()
+        matches = [name for name in categorized_wikis if name.lower() == category.lower()]
+        if not matches:
+            raise Exception(f"Unknown category '{category}'. Available: {', '.join(categorized_wikis)}")
+        for wiki_id in categorized_wikis[matches[0]]:
+            if wiki_id not in [target[0] for target in targets]:
+                targets.append((wiki_id, config_manager.get_wiki_config(wiki_id)))
+    if not targets:
+        raise Exception("No wikis selected.")
+    return targets
 
 def main():
     parser = argparse.ArgumentParser(description='Enhanced Secure Wiki Submission Script')
@@ -350,14 +652,65 @@ def main():
                        help='Specify a custom wiki API URL')
     parser.add_argument('--add-wiki', action='store_true',
                        help='Interactively add a new wiki to the configuration')
+    parser.add_argument('--wikis', type=str,
+                       help='Push the content to several wikis at once (comma-separated wiki IDs)')
+    parser.add_argument('--all-in-category', type=str, metavar='CATEGORY',
+                       help='Push the content to every configured wiki in a category (e.g. "Fandom")')
+    parser.add_argument('--maxlag', type=int, metavar='SECONDS',
+                       help=f'Replication lag at which the wikis should refuse requests (default: each wiki\'s '
+                            f'"maxlag" from the configuration, or {DEFAULT_MAXLAG})')
+    parser.add_argument('--max-rate', type=float, metavar='REQUESTS',
+                       help='Highest request rate per second against each wiki (default: each wiki\'s "max_rate"; '
+                            'without one the rate only follows the wiki\'s feedback)')
+    parser.add_argument('--session-cache', action='store_true',
+                       help='Reuse an encrypted cached login session between runs (requires the cryptography package)')
+    parser.add_argument('--force', action='store_true',
+                       help='Submit even if the wiki page already has the same content')
+    parser.add_argument('--keep-log', action='store_true',
+                       help='Keep the JSON Lines run journal (/tmp/wiki_submission_<pid>.jsonl) after the run')
+    parser.add_argument('--metrics-textfile', metavar='PATH',
+                       help='Write per-wiki latency, retry, error, byte and pacing metrics as a Prometheus textfile at exit')
+    parser.add_argument('--metrics-json', metavar='PATH',
+                       help='Write a JSON summary of the same metrics at exit')
+    parser.add_argument('--config', default='wiki_config.json',
+                       help='Wiki configuration file, or a sharded configuration directory such as wikis.d '
+                            '(default: wiki_config.json)')
     
     args = parser.parse_args()
     
     # Initialize components
-    config_manager = WikiConfigManager()
+    config_manager = WikiConfigManager(config_file=args.config)
     wiki_selector = WikiSelector(config_manager)
     wiki_validator = WikiValidator()
     bot = EnhancedSecureWikiBot()
+    if args.keep_log:
+        # Shared by the bots of every wiki in a multi-wiki submission
+        bot.journal.keep = True
+        print(f"\033[0;34m[INFO]\033[0m Run journal: {bot.log_file}")
+    export_at_exit(args.metrics_textfile, args.metrics_json)
+    # Pacing settings given on the command line win over those of the wikis
+    pacing_overrides = {}
+    if args.maxlag is not None:
+        pacing_overrides["maxlag"] = args.maxlag
+    if args.max_rate is not None:
+        pacing_overrides["max_rate"] = args.max_rate
+    
+    if args.wikis or args.all_in_category:
+        try:
+            targets = resolve_fanout_targets(config_manager, wiki_selector, args.wikis, args.all_in_category)
+            targets = [(wiki_id, dict(wiki_config, **pacing_overrides)) for wiki_id, wiki_config in targets]
+            print(f"\n\033[0;34m[INFO]\033[0m Selected wikis: {', '.join(config['name'] for _, config in targets)}")
+            results = submit_to_wikis(targets, args.page_title, args.content_file, args.edit_summary,
+                                      skip_unchanged=not args.force,
+                                      session_cache=WikiSessionCache() if args.session_cache else None)
+        except Exception as e:
+            print(f"\n\033[0;31m[ERROR]\033[0m {e}")
+            sys.exit(1)
+        print_fanout_report(results, args.page_title)
+        print("\033[0;34m[SECURITY]\033[0m All credentials have been cleared from memory")
+        if any(result["status"] == "failed" for result in results):
+            sys.exit(1)
+        return
     
     try:
         # Handle wiki selection
@@ -398,25 +751,33 @@ def main():
                 sys.exit(1)
         
         # Set wiki configuration for the bot
-        bot.set_wiki_config(wiki_config)
+        bot.set_wiki_config(dict(wiki_config, **pacing_overrides))
+        if args.session_cache:
+            bot.session_cache = WikiSessionCache()
+        bot.skip_unchanged = not args.force
         
         # Show selected wiki
         print(f"\n\033[0;34m[INFO]\033[0m Selected wiki: {wiki_config['name']}")
         
         # Submit content
-        bot.submit_content(args.page_title, args.content_file, args.edit_summary)
+        edit = bot.submit_content(args.page_title, args.content_file, args.edit_summary)
         print("\n\033[0;34m[SECURITY]\033[0m Process completed successfully!")
         print("\033[0;34m[SECURITY]\033[0m All credentials have been cleared from memory")
         print("\033[0;34m[SECURITY]\033[0m Temporary files have been cleaned up")
         
         # Validate submission
         print("\n\033[0;34m[VALIDATION]\033[0m Starting post-submission validation...")
-        validation_rules = wiki_config.get("validation_rules", {})
-        success, validation_details = wiki_validator.validate_submission(
+        if config_manager.get_wiki_config(wiki_id):
+            validation_rules = config_manager.get_validation_rules(wiki_id)
+        else:
+            validation_rules = wiki_config.get("validation_rules", {})
+        # Compare the new revision's hash; the page is only downloaded if it differs
+        success, validation_details = wiki_validator.validate_revision(
             wiki_config["api_url"], 
             args.page_title, 
             args.content_file, 
-            validation_rules
+            validation_rules,
+            revid=edit.get("newrevid")
         )
         
         wiki_validator.print_validation_report(success, validation_details, wiki_config["name"])
@@ -4,10 +4,17 @@ Wiki Selector
 Handles wiki selection and registration for the Secure Wiki Automation Tool.
 """
 
+import argparse
 import sys
 import re
-from typing import Dict, Any, Optional, Tuple
-from wiki_config_manager import WikiConfigManager
+from typing import Dict, Any, List, Optional, Tuple
+from wiki_config_manager import WikiConfigManager, categorize_wikis
+
+# Registries with more wikis than this are searched instead of listed in full
+MAX_LISTED_WIKIS = 100
+
+# Matches shown for a search typed at the selection prompt
+SEARCH_RESULTS_SHOWN = 20
 
 class WikiSelector:
     def __init__(self, config_manager: WikiConfigManager):
@@ -29,70 +36,41 @@ class WikiSelector:
         """
         # Load configurations
         self.merged_config = self.config_manager.merge_configs()
-        wiki_list = self.config_manager.get_wiki_list()
+        # Names and URLs only, so a sharded configuration loads just the chosen wiki's shard
+        wiki_list = self.config_manager.get_wiki_summaries()
         
         if not wiki_list:
             raise Exception("No wikis available in configuration.")
         
-        # Group wikis by category for better presentation
-        categorized_wikis = self._categorize_wikis(wiki_list)
+        # Group wikis by category for better presentation; registries too
+        # large to list are searched instead
+        if len(wiki_list) <= MAX_LISTED_WIKIS:
+            groups = {f"{category} Wikis": wiki_ids
+                      for category, wiki_ids in self.config_manager.get_wikis_by_category().items()}
+        else:
+            groups = {}
         
-        # Display categorized wiki list
+        # Display categorized wiki list, Wikimedia Foundation wikis first and other wikis last
         print("\nSelect a wiki:")
-        option_number = 1
-        option_map = {}
-        
-        # Display Wikimedia Foundation wikis first
-        if "Wikimedia Foundation" in categorized_wikis:
-            print("\nWikimedia Foundation Wikis:")
-            for wiki_id in categorized_wikis["Wikimedia Foundation"]:
-                wiki_config = wiki_list[wiki_id]
-                print(f"{option_number}. {wiki_config['name']} ({wiki_config['api_url']})")
-                option_map[str(option_number)] = wiki_id
-                option_number += 1
+        if not groups:
+            print(f"\n{len(wiki_list)} wikis are configured.")
+        option_map, option_number = self._print_options(groups, wiki_list)
         
-        # Display Technology wikis
-        if "Technology" in categorized_wikis:
-            print("\nTechnology Wikis:")
-            for wiki_id in categorized_wikis["Technology"]:
-                wiki_config = wiki_list[wiki_id]
-                print(f"{option_number}. {wiki_config['name']} ({wiki_config['api_url']})")
-                option_map[str(option_number)] = wiki_id
-                option_number += 1
-        
-        # Display Fandom wikis
-        if "Fandom" in categorized_wikis:
-            print("\nFandom Wikis:")
-            for wiki_id in categorized_wikis["Fandom"]:
-                wiki_config = wiki_list[wiki_id]
-                print(f"{option_number}. {wiki_config['name']} ({wiki_config['api_url']})")
-                option_map[str(option_number)] = wiki_id
-                option_number += 1
-        
-        # Display Other wikis
-        if "Other" in categorized_wikis:
-            print("\nOther Wikis:")
-            for wiki_id in categorized_wikis["Other"]:
-                wiki_config = wiki_list[wiki_id]
-                print(f"{option_number}. {wiki_config['name']} ({wiki_config['api_url']})")
-                option_map[str(option_number)] = wiki_id
-                option_number += 1
-        
-        # Add custom options
-        print(f"\n{option_number}. Custom Wiki URL")
-        option_map[str(option_number)] = "custom_url"
-        option_number += 1
-        
-        print(f"{option_number}. Add New Wiki")
-        option_map[str(option_number)] = "add_wiki"
-        
-        # Get user choice
+        # Get user choice; anything that is not an option number searches the wikis
         while True:
             try:
-                choice = input(f"\nEnter your choice (1-{option_number}): ").strip()
+                choice = input(f"\nEnter your choice (1-{option_number}) or part of a wiki's name to search: ").strip()
                 if choice in option_map:
                     selected_wiki_id = option_map[choice]
                     break
+                elif choice and not choice.isdigit():
+                    matches = [wiki_id for wiki_id, score in
+                               self.config_manager.search_wikis(choice, limit=SEARCH_RESULTS_SHOWN)]
+                    if matches:
+                        option_map, option_number = self._print_options({f"Wikis matching '{choice}'": matches},
+                                                                        wiki_list)
+                    else:
+                        print(f"No wikis match '{choice}'.")
                 else:
                     print("Invalid choice. Please try again.")
             except KeyboardInterrupt:
@@ -112,6 +90,40 @@ class WikiSelector:
             else:
                 raise Exception(f"Wiki configuration for '{selected_wiki_id}' not found.")
     
+    def _print_options(self, groups: Dict[str, List[str]],
+                       wiki_list: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, str], int]:
+        """
+        Print numbered wikis under headings, followed by the custom URL and add wiki options.
+        
+        Args:
+            groups: Dictionary with headings as keys and lists of wiki IDs as values
+            wiki_list: Names and API URLs of the wikis by wiki ID
+            
+        Returns:
+            Tuple containing (option number to wiki ID or special option, last option number)
+        """
+        option_number = 1
+        option_map = {}
+        
+        for heading, wiki_ids in groups.items():
+            if not wiki_ids:
+                continue
+            print(f"\n{heading}:")
+            for wiki_id in wiki_ids:
+                wiki_config = wiki_list[wiki_id]
+                print(f"{option_number}. {wiki_config['name']} ({wiki_config['api_url']})")
+                option_map[str(option_number)] = wiki_id
+                option_number += 1
+        
+        # Add custom options
+        print(f"\n{option_number}. Custom Wiki URL")
+        option_map[str(option_number)] = "custom_url"
+        option_number += 1
+        
+        print(f"{option_number}. Add New Wiki")
+        option_map[str(option_number)] = "add_wiki"
+        return option_map, option_number
+    
     def _categorize_wikis(self, wiki_list: Dict[str, Dict[str, Any]]) -> Dict[str, list]:
         """
         Categorize wikis for better presentation.
@@ -122,36 +134,7 @@ class WikiSelector:
         Returns:
             Dictionary with categories as keys and lists of wiki IDs as values
         """
-        categories = {
-            "Wikimedia Foundation": [],
-            "Technology": [],
-            "Fandom": [],
-            "Other": []
-        }
-        
-        for wiki_id, wiki_config in wiki_list.items():
-            wiki_name = wiki_config.get("name", "").lower()
-            
-            # Wikimedia Foundation wikis
-            if any(name in wiki_name for name in ["wikipedia", "wiktionary", "wikibooks", 
-                                                  "wikiquote", "wikisource", "wikiversity", 
-                                                  "wikidata", "wikimedia commons"]):
-                categories["Wikimedia Foundation"].append(wiki_id)
-            
-            # Technology wikis
-            elif any(name in wiki_name for name in ["arch wiki", "ubuntu wiki", "debian wiki", 
-                                                    "gentoo wiki", "fedora wiki", "python wiki"]):
-                categories["Technology"].append(wiki_id)
-            
-            # Fandom wikis
-            elif "fandom" in wiki_name:
-                categories["Fandom"].append(wiki_id)
-            
-            # Other wikis
-            else:
-                categories["Other"].append(wiki_id)
-        
-        return categories
+        return categorize_wikis(wiki_list)
     
     def _handle_custom_url(self) -> Tuple[str, Dict[str, Any]]:
         """
@@ -164,6 +147,13 @@ class WikiSelector:
             try:
                 api_url = input("Enter the wiki API URL (e.g., https://wiki.example.com/api.php): ").strip()
                 if self.config_manager.validate_api_url(api_url):
+                    # Reuse the configured entry, with its user agent and rules, if there is one
+                    existing_id = self.config_manager.find_wiki_id_by_api_url(api_url)
+                    if existing_id:
+                        existing_config = self.config_manager.get_wiki_config(existing_id)
+                        print(f"Using configured wiki '{existing_id}' ({existing_config.get('name', existing_id)})")
+                        return existing_id, existing_config
+                    
                     # Extract domain name for wiki ID
                     domain_match = re.search(r"https://([^/]+)", api_url)
                     if domain_match:
@@ -262,8 +252,32 @@ class WikiSelector:
         return wiki_id, wiki_config
 
 def main():
-    """Main function for testing the WikiSelector."""
-    config_manager = WikiConfigManager()
+    """Select a wiki interactively, or print the wikis matching --find."""
+    parser = argparse.ArgumentParser(description='Select a configured wiki')
+    parser.add_argument('--config', default='wiki_config.json',
+                        help='Wiki configuration file or sharded configuration directory (default: wiki_config.json)')
+    parser.add_argument('--find', metavar='QUERY',
+                        help="Print the wikis best matching QUERY (part of an ID, name or host) and exit")
+    parser.add_argument('--limit', type=int, default=10, help='Maximum number of matches printed by --find')
+    args = parser.parse_args()
+    
+    config_manager = WikiConfigManager(config_file=args.config)
+    
+    if args.find is not None:
+        try:
+            matches = config_manager.search_wikis(args.find, limit=args.limit)
+            summaries = config_manager.get_wiki_summaries()
+        except Exception as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        if not matches:
+            print(f"No wikis match '{args.find}'", file=sys.stderr)
+            sys.exit(1)
+        for wiki_id, score in matches:
+            wiki_config = summaries.get(wiki_id, {})
+            print(f"{wiki_id}\t{wiki_config.get('name', wiki_id)}\t{wiki_config.get('api_url', '')}\t{score:.2f}")
+        return
+    
     wiki_selector = WikiSelector(config_manager)
     
     try:
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Wiki Session Cache
+Opt-in, encrypted on-disk cache of authenticated wiki sessions, so repeat
+runs can skip the login token / login / CSRF token round trips.
+
+Only session cookies and the CSRF token are cached, never passwords.
+Entries are encrypted with Fernet (requires the "cryptography" package) and
+keyed by wiki API URL and username. The key is never stored next to the
+entries: it comes from $WIKI_SESSION_CACHE_KEY or a key file in the tool's
+configuration directory, so a copy of the cache directory alone is useless.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Dict, Any, List, Optional
+
+from wiki_config_manager import get_cache_dir, get_config_dir
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+    InvalidToken = Exception
+
+# How long a cached session is trusted before a full login is forced
+DEFAULT_SESSION_TTL = 12 * 60 * 60
+
+# The CSRF token MediaWiki hands out to logged-out sessions
+ANONYMOUS_CSRF_TOKEN = "+\\"
+
+# Name of the key file; also the name earlier versions used inside the cache directory
+SESSION_KEY_FILE = "session.key"
+
+
+class WikiSessionCache:
+    def __init__(self, cache_dir: Optional[str] = None, key: Optional[bytes] = None,
+                 ttl: int = DEFAULT_SESSION_TTL, key_file: Optional[str] = None):
+        """
+        Initialize the WikiSessionCache.
+
+        Args:
+            cache_dir: Directory for cache entries; defaults to a "sessions" directory in the tool's cache dir
+            key: Fernet key; defaults to $WIKI_SESSION_CACHE_KEY or the key file
+            ttl: Seconds a cached session stays valid
+            key_file: Key file used when neither key nor $WIKI_SESSION_CACHE_KEY is given, created
+                if missing; defaults to "session.key" in the tool's configuration directory
+
+        Raises:
+            RuntimeError: If the cryptography package is not installed
+            ValueError: If the key file is inside the cache directory
+        """
+        if Fernet is None:
+            raise RuntimeError("The session cache requires the 'cryptography' package (pip install cryptography).")
+        self.cache_dir = os.path.abspath(cache_dir or os.path.join(get_cache_dir(), "sessions"))
+        self.key_file = os.path.abspath(key_file or os.path.join(get_config_dir(), SESSION_KEY_FILE))
+        if os.path.commonpath([self.cache_dir, self.key_file]) == self.cache_dir:
+            raise ValueError("The session cache key file must not be inside the cache directory.")
+        self.ttl = ttl
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        self._remove_legacy_key()
+        self.fernet = Fernet(key or self._load_key())
+
+    def _remove_legacy_key(self) -> None:
+        """Delete the key file earlier versions kept among the entries; their entries are discarded on load."""
+        try:
+            os.remove(os.path.join(self.cache_dir, SESSION_KEY_FILE))
+        except FileNotFoundError:
+            pass
+
+    def _load_key(self) -> bytes:
+        """Get the encryption key from the environment or the key file, creating the file if needed."""
+        env_key = os.environ.get("WIKI_SESSION_CACHE_KEY")
+        if env_key:
+            return env_key.encode("ascii")
+
+        key_file = self.key_file
+        os.makedirs(os.path.dirname(key_file), mode=0o700, exist_ok=True)
+        try:
+            with open(key_file, 'rb') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            pass
+
+        key = Fernet.generate_key()
+        try:
+            # O_EXCL so concurrent first runs don't overwrite each other's key
+            fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            with open(key_file, 'rb') as f:
+                return f.read().strip()
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key)
+        return key
+
+    def _entry_path(self, api_url: str, username: str) -> str:
+        """Get the cache file for a wiki and user without exposing either in the file name."""
+        digest = hashlib.sha256(f"{api_url}\0{username}".encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.session")
+
+    def load(self, api_url: str, username: str) -> Optional[Dict[str, Any]]:
+        """
+        Load a cached session.
+
+        Args:
+            api_url: The API URL of the wiki
+            username: The wiki username
+
+        Returns:
+            Dictionary with "cookies", "csrf_token" and "expires_at" keys, or None if
+            there is no usable entry
+        """
+        path = self._entry_path(api_url, username)
+        try:
+            with open(path, 'rb') as f:
+                entry = json.loads(self.fernet.decrypt(f.read()).decode("utf-8"))
+        except FileNotFoundError:
+            return None
+        except (InvalidToken, ValueError) as e:
+            print(f"Warning: Discarding unreadable session cache entry: {e}", file=sys.stderr)
+            self.invalidate(api_url, username)
+            return None
+
+        if entry.get("api_url") != api_url or entry.get("username") != username:
+            return None
+        if entry.get("expires_at", 0) <= time.time():
+            self.invalidate(api_url, username)
+            return None
+        return entry
+
+    def store(self, api_url: str, username: str, cookies: List[Dict[str, Any]], csrf_token: str) -> None:
+        """
+        Store an authenticated session.
+
+        Args:
+            api_url: The API URL of the wiki
+            username: The wiki username
+            cookies: Session cookies as returned by WikiHttpClient.export_cookies()
+            csrf_token: The session's CSRF token
+        """
+        entry = {
+            "api_url": api_url,
+            "username": username,
+            "cookies": cookies,
+            "csrf_token": csrf_token,
+            "expires_at": time.time() + self.ttl
+        }
+        path = self._entry_path(api_url, username)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.fernet.encrypt(json.dumps(entry).encode("utf-8")))
+        os.replace(temp_path, path)
+
+    def invalidate(self, api_url: str, username: str) -> None:
+        """Remove the cached session of a wiki and user, if any."""
+        try:
+            os.remove(self._entry_path(api_url, username))
+        except FileNotFoundError:
+            pass
@@ -4,22 +4,148 @@ Wiki Validator
 Handles configurable validation for different wiki styles.
 """
 
-import requests
+import hashlib
 import sys
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple
+
+from wiki_diff import DEFAULT_MAX_DIFF_LINES, summarize_diff
+from wiki_http_client import FileFormValue, MaxLagError, WikiHttpClient, WikiHttpError
+from wiki_metrics import get_metrics
+from wiki_rules import get_rule_set
+
+# Characters PHP's rtrim() removes; MediaWiki strips these from the end of saved text
+TRAILING_WHITESPACE = " \t\n\r\0\x0b"
+TRAILING_WHITESPACE_BYTES = TRAILING_WHITESPACE.encode("ascii")
+
+# Titles per action=query request; accounts with the apihighlimits right may send 500
+DEFAULT_TITLE_BATCH_SIZE = 50
+HIGH_LIMIT_TITLE_BATCH_SIZE = 500
+
+def normalize_content(content: str) -> str:
+    """
+    Normalize page text the way MediaWiki does when saving it.
+    
+    Line endings become "\n" and trailing whitespace is removed, so the result
+    hashes to the same value as the stored revision.
+    
+    Args:
+        content: The page text
+        
+    Returns:
+        The normalized text
+    """
+    return content.replace("\r\n", "\n").replace("\r", "\n").rstrip(TRAILING_WHITESPACE)
+
+def content_sha1(content: str) -> str:
+    """
+    Compute the SHA-1 MediaWiki reports for a revision with this text.
+    
+    Args:
+        content: The page text
+        
+    Returns:
+        Hex digest of the normalized UTF-8 encoded text
+    """
+    return hashlib.sha1(normalize_content(content).encode("utf-8")).hexdigest()
+
+def content_digest(content: Any) -> Tuple[str, int]:
+    """
+    Compute the SHA-1 and byte size MediaWiki reports for a revision with this text.
+    
+    Args:
+        content: The page text, or a FileFormValue whose file is hashed chunk by chunk
+        
+    Returns:
+        Tuple of (hex digest, size in bytes) of the normalized UTF-8 encoded text
+    """
+    if isinstance(content, FileFormValue):
+        return _stream_digest(content.iter_chunks())
+    normalized = normalize_content(content).encode("utf-8")
+    return hashlib.sha1(normalized).hexdigest(), len(normalized)
+
+def _stream_digest(chunks: Iterable[bytes]) -> Tuple[str, int]:
+    """Hash UTF-8 chunks as normalize_content() would normalize their concatenation."""
+    digest = hashlib.sha1()
+    size = 0
+    carry = b""
+    # Whitespace that is only hashed if more text follows it
+    pending = b""
+    for chunk in chunks:
+        data = carry + chunk
+        carry = b""
+        if data.endswith(b"\r"):
+            # May be the first half of a \r\n split across chunks
+            carry = b"\r"
+            data = data[:-1]
+        data = data.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+        stripped = data.rstrip(TRAILING_WHITESPACE_BYTES)
+        if stripped:
+            digest.update(pending)
+            digest.update(stripped)
+            size += len(pending) + len(stripped)
+            pending = data[len(stripped):]
+        else:
+            pending += data
+    return digest.hexdigest(), size
+
+def revision_matches_content(revision: Optional[Dict[str, Any]], content: Any) -> bool:
+    """
+    Check whether a revision's size and SHA-1 match the given text.
+    
+    Args:
+        revision: Dictionary with "size" and "sha1" keys, as returned by fetch_revision_info()
+        content: The local content, as a string or a FileFormValue
+        
+    Returns:
+        True if the revision holds exactly this content, False otherwise or if unknown
+    """
+    if not revision or not revision.get("sha1"):
+        return False
+    sha1, size = content_digest(content)
+    if revision.get("size") is not None and revision["size"] != size:
+        return False
+    return revision["sha1"] == sha1
+
+def _revision_content(revision: Dict[str, Any]) -> Optional[str]:
+    """Get the text of a revision from either the legacy or the slots response format."""
+    if "*" in revision:
+        return revision["*"]
+    main = revision.get("slots", {}).get("main", {})
+    return main.get("*", main.get("content"))
+
+def _batches(items: Iterable[Any], batch_size: int) -> Iterator[List[Any]]:
+    """Split an iterable into lists of at most batch_size items without materializing it."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
 
 class WikiValidator:
-    def __init__(self):
-        """Initialize the WikiValidator."""
-        pass
+    def __init__(self, http_client: Optional[WikiHttpClient] = None):
+        """
+        Initialize the WikiValidator.
+        
+        Args:
+            http_client: Client used for API requests; a new pooled client is created if omitted
+        """
+        self.http_client = http_client or WikiHttpClient()
+        self.title_batch_sizes = {}
+        # Mismatch diffs longer than this are written to a file in diff_dir (temp dir if None)
+        self.max_diff_lines = DEFAULT_MAX_DIFF_LINES
+        self.diff_dir = None
     
-    def fetch_wiki_page(self, wiki_api_url: str, page_title: str) -> Optional[str]:
+    def fetch_wiki_page(self, wiki_api_url: str, page_title: str, revid: Optional[int] = None) -> Optional[str]:
         """
         Fetch the content of a page from a wiki.
         
         Args:
             wiki_api_url: The API URL of the wiki
             page_title: The title of the page to fetch
+            revid: Revision to fetch instead of the latest one
             
         Returns:
             The content of the page, or None if fetching failed
@@ -32,10 +158,12 @@ class WikiValidator:
                 "prop": "revisions",
                 "rvprop": "content"
             }
+            if revid:
+                del params["titles"]
+                params["revids"] = str(revid)
             
-            response = requests.get(wiki_api_url, params=params)
-            response.raise_for_status()
-            data = response.json()
+            with get_metrics().timed(wiki_api_url, "fetch"):
+                data = self.http_client.get_json(wiki_api_url, params)
             
             pages = data.get("query", {}).get("pages", {})
             if not pages:
@@ -53,19 +181,245 @@ class WikiValidator:
                 return None
                 
             # Get the latest revision content
-            content = revisions[0].get("*")
-            if content is None:
-                return None
-                
-            return content
+            return _revision_content(revisions[0])
             
-        except requests.RequestException as e:
+        except WikiHttpError as e:
             print(f"Error fetching page: {e}", file=sys.stderr)
             return None
         except Exception as e:
             print(f"Unexpected error: {e}", file=sys.stderr)
             return None
     
+    def fetch_revision_info(self, wiki_api_url: str, page_title: str,
+                            revid: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Fetch the ID, size and SHA-1 of a page's latest revision without its content.
+        
+        Args:
+            wiki_api_url: The API URL of the wiki
+            page_title: The title of the page
+            revid: Revision to look up instead of the latest one
+            
+        Returns:
+            Dictionary with "revid", "size" and "sha1" keys, or None if the page is
+            missing or the request failed
+        """
+        try:
+            params = {
+                "action": "query",
+                "format": "json",
+                "titles": page_title,
+                "prop": "revisions",
+                "rvprop": "sha1|size|ids"
+            }
+            if revid:
+                del params["titles"]
+                params["revids"] = str(revid)
+            
+            with get_metrics().timed(wiki_api_url, "check"):
+                data = self.http_client.get_json(wiki_api_url, params)
+            
+            pages = data.get("query", {}).get("pages", {})
+            for page in pages.values():
+                revisions = page.get("revisions", [])
+                if "missing" in page or not revisions:
+                    return None
+                return {
+                    "revid": revisions[0].get("revid"),
+                    "size": revisions[0].get("size"),
+                    "sha1": revisions[0].get("sha1")
+                }
+            return None
+            
+        except WikiHttpError as e:
+            print(f"Error fetching revision info: {e}", file=sys.stderr)
+            return None
+        except Exception as e:
+            print(f"Unexpected error: {e}", file=sys.stderr)
+            return None
+    
+    def is_content_unchanged(self, wiki_api_url: str, page_title: str, content: Any) -> bool:
+        """
+        Check whether a page already holds exactly this content.
+        
+        Only the revision's SHA-1 and size cross the wire, not the page text.
+        
+        Args:
+            wiki_api_url: The API URL of the wiki
+            page_title: The title of the page
+            content: The local content, as a string or a FileFormValue
+            
+        Returns:
+            True if the latest revision matches the content, False otherwise or if unknown
+        """
+        return revision_matches_content(self.fetch_revision_info(wiki_api_url, page_title), content)
+    
+    def get_title_batch_size(self, wiki_api_url: str) -> int:
+        """
+        Get how many titles one action=query request may carry on a wiki.
+        
+        The limit is 500 if the client's session has the apihighlimits right
+        (bots and sysops) and 50 otherwise. It is looked up once per wiki, so
+        call this after logging in.
+        
+        Args:
+            wiki_api_url: The API URL of the wiki
+            
+        Returns:
+            The maximum number of titles per request
+        """
+        if wiki_api_url not in self.title_batch_sizes:
+            rights = []
+            try:
+                params = {
+                    "action": "query",
+                    "format": "json",
+                    "meta": "userinfo",
+                    "uiprop": "rights"
+                }
+                data = self.http_client.get_json(wiki_api_url, params)
+                rights = data.get("query", {}).get("userinfo", {}).get("rights", [])
+            except WikiHttpError as e:
+                print(f"Warning: Could not look up API limits, using {DEFAULT_TITLE_BATCH_SIZE} titles per request: {e}",
+                      file=sys.stderr)
+            if "apihighlimits" in rights:
+                self.title_batch_sizes[wiki_api_url] = HIGH_LIMIT_TITLE_BATCH_SIZE
+            else:
+                self.title_batch_sizes[wiki_api_url] = DEFAULT_TITLE_BATCH_SIZE
+        return self.title_batch_sizes[wiki_api_url]
+    
+    def _query_title_batch(self, wiki_api_url: str, titles: List[str], rvprop: str, follow_redirects: bool,
+                           raise_errors: bool = False) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Query the latest revision of up to one batch of titles, following continuations.
+        
+        Yields each requested title with its page (None if missing, invalid or
+        unavailable) as soon as a response completes it. With raise_errors, a
+        failed request raises instead of marking its titles unavailable, and
+        a maxlag error raises MaxLagError.
+        """
+        params = {
+            "action": "query",
+            "format": "json",
+            "titles": "|".join(titles),
+            "prop": "revisions",
+            "rvprop": rvprop
+        }
+        if follow_redirects:
+            params["redirects"] = "1"
+        
+        # Final page title -> requested titles that resolve to it
+        pending = None
+        try:
+            while True:
+                # POST, since 500 long titles can exceed URL length limits
+                with get_metrics().timed(wiki_api_url, "fetch"):
+                    data = self.http_client.post_json(wiki_api_url, params)
+                if "error" in data:
+                    error = data["error"]
+                    if raise_errors and error.get("code") == "maxlag":
+                        # Worth retrying, unlike the other API errors
+                        lag = error.get("lag")
+                        raise MaxLagError(f"Wiki is currently lagging ({lag} seconds behind).",
+                                          lag=float(lag) if lag is not None else None)
+                    raise WikiHttpError(f"API error: {error.get('info', error)}")
+                query = data.get("query", {})
+                
+                if pending is None:
+                    normalized = {item["from"]: item["to"] for item in query.get("normalized", [])}
+                    redirects = {item["from"]: item["to"] for item in query.get("redirects", [])}
+                    pending = {}
+                    for title in titles:
+                        resolved = normalized.get(title, title)
+                        resolved = redirects.get(resolved, resolved)
+                        pending.setdefault(resolved, []).append(title)
+                
+                for page in query.get("pages", {}).values():
+                    if page.get("title") not in pending:
+                        continue
+                    if "missing" in page or "invalid" in page:
+                        result = None
+                    elif page.get("revisions"):
+                        result = page
+                    else:
+                        # Revisions of this page come in a later continuation
+                        continue
+                    for title in pending.pop(page["title"]):
+                        yield title, result
+                
+                if "continue" not in data or not pending:
+                    break
+                params.update(data["continue"])
+        except WikiHttpError as e:
+            if raise_errors:
+                raise
+            print(f"Error fetching pages: {e}", file=sys.stderr)
+        
+        # Whatever is left was never returned, or the request failed
+        unresolved = pending.values() if pending is not None else [titles]
+        for requested in unresolved:
+            for title in requested:
+                yield title, None
+    
+    def iter_page_revisions(self, wiki_api_url: str, titles: Iterable[str], rvprop: str = "ids|sha1|size",
+                            follow_redirects: bool = False, batch_size: Optional[int] = None,
+                            raise_errors: bool = False) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Fetch the latest revision of many pages, packing titles into few requests.
+        
+        Titles are sent "|"-joined, up to the wiki's per-request limit, and
+        continuations are followed. Results are yielded per page as their
+        response arrives, not necessarily in input order, so memory use does
+        not grow with the number of titles.
+        
+        Args:
+            wiki_api_url: The API URL of the wiki
+            titles: Page titles as requested; they are normalized by the wiki
+            rvprop: Revision properties to fetch
+            follow_redirects: Whether to resolve redirects to their target pages
+            batch_size: Titles per request; defaults to get_title_batch_size()
+            raise_errors: Raise WikiHttpError (MaxLagError for a lagged wiki) if a request
+                fails, instead of yielding None for its titles as for missing pages
+            
+        Yields:
+            Tuples of (requested title, page dictionary with a "revisions" list or None)
+        """
+        batch_size = batch_size or self.get_title_batch_size(wiki_api_url)
+        for batch in _batches(titles, batch_size):
+            yield from self._query_title_batch(wiki_api_url, batch, rvprop, follow_redirects, raise_errors)
+    
+    def fetch_wiki_pages(self, wiki_api_url: str, titles: Iterable[str], follow_redirects: bool = False,
+                         batch_size: Optional[int] = None) -> Iterator[Tuple[str, Optional[str]]]:
+        """
+        Fetch the content of many pages in batched requests. See iter_page_revisions().
+        
+        Yields:
+            Tuples of (requested title, page content or None)
+        """
+        for title, page in self.iter_page_revisions(wiki_api_url, titles, "ids|content",
+                                                    follow_redirects, batch_size):
+            yield title, _revision_content(page["revisions"][0]) if page else None
+    
+    def fetch_revision_infos(self, wiki_api_url: str, titles: Iterable[str], batch_size: Optional[int] = None,
+                             raise_errors: bool = False) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Fetch the ID, size and SHA-1 of many pages in batched requests. See iter_page_revisions().
+        
+        Yields:
+            Tuples of (requested title, dictionary with "revid", "size" and "sha1" keys or None)
+        """
+        for title, page in self.iter_page_revisions(wiki_api_url, titles, "ids|sha1|size", batch_size=batch_size,
+                                                    raise_errors=raise_errors):
+            if page is None:
+                yield title, None
+                continue
+            revision = page["revisions"][0]
+            yield title, {
+                "revid": revision.get("revid"),
+                "size": revision.get("size"),
+                "sha1": revision.get("sha1")
+            }
+    
     def read_local_file(self, file_path: str) -> Optional[str]:
         """
         Read the content of a local file.
@@ -84,28 +438,22 @@ class WikiValidator:
             print(f"Error reading local file: {e}", file=sys.stderr)
             return None
     
-    def check_wiki_specific_features(self, content: str, validation_rules: Dict[str, str]) -> Dict[str, bool]:
+    def check_wiki_specific_features(self, content: str, validation_rules: Any) -> Dict[str, bool]:
         """
         Check if the content has wiki-specific features based on validation rules.
         
         Args:
             content: The content to check
-            validation_rules: Dictionary of validation rules
+            validation_rules: Dictionary of validation rules, or a compiled RuleSet
             
         Returns:
             Dictionary with rule names as keys and boolean results as values
         """
-        checks = {}
-        for rule_name, pattern in validation_rules.items():
-            # Special handling for no_duplicate_numbering rule
-            if rule_name == "no_duplicate_numbering":
-                checks[rule_name] = pattern not in content
-            else:
-                checks[rule_name] = pattern in content
-        return checks
+        # Compiled once per rule set; all literal rules are found in one search
+        return get_rule_set(validation_rules).evaluate(content)
     
     def validate_submission(self, wiki_api_url: str, page_title: str, content_file: str, 
-                          validation_rules: Dict[str, str]) -> Tuple[bool, Dict[str, Any]]:
+                          validation_rules: Any) -> Tuple[bool, Dict[str, Any]]:
         """
         Validate that the submitted content matches the local file and meets wiki-specific criteria.
         
@@ -113,11 +461,98 @@ class WikiValidator:
             wiki_api_url: The API URL of the wiki
             page_title: The title of the page that was submitted
             content_file: Path to the local content file
-            validation_rules: Dictionary of wiki-specific validation rules
+            validation_rules: Dictionary of wiki-specific validation rules, or a compiled RuleSet
             
         Returns:
             Tuple containing (success, validation_details)
         """
+        # Fetch content from wiki
+        wiki_content = self.fetch_wiki_page(wiki_api_url, page_title)
+        return self.compare_content(wiki_content, content_file, validation_rules)
+    
+    def validate_revision(self, wiki_api_url: str, page_title: str, content_file: str,
+                          validation_rules: Any, revid: Optional[int] = None) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Validate a submission by comparing the saved revision's SHA-1 with the local file.
+        
+        Only the revision's hash and size are fetched. The page text is downloaded
+        only if the hashes differ, to report what does not match.
+        
+        Args:
+            wiki_api_url: The API URL of the wiki
+            page_title: The title of the page that was submitted
+            content_file: Path to the local content file
+            validation_rules: Dictionary of wiki-specific validation rules, or a compiled RuleSet
+            revid: The "newrevid" of the edit; the latest revision is checked if omitted
+            
+        Returns:
+            Tuple containing (success, validation_details); validation_details["method"]
+            is "sha1" or "content" depending on how the content was compared
+        """
+        local_content = self.read_local_file(content_file)
+        revision = self.fetch_revision_info(wiki_api_url, page_title, revid)
+        
+        if local_content is not None and revision_matches_content(revision, local_content):
+            # Identical text, so the wiki-side checks give the same results as the local ones
+            features = self.check_wiki_specific_features(local_content, validation_rules) if validation_rules else {}
+            validation_details = {
+                "content_match": True,
+                "wiki_features": features,
+                "local_features": dict(features),
+                "content_lengths": {
+                    "wiki": len(normalize_content(local_content)),
+                    "local": len(local_content)
+                },
+                "method": "sha1"
+            }
+            return True, validation_details
+        
+        wiki_content = self.fetch_wiki_page(wiki_api_url, page_title, revid)
+        success, validation_details = self.compare_content(wiki_content, content_file, validation_rules)
+        validation_details["method"] = "content"
+        return success, validation_details
+    
+    def validate_submissions(self, wiki_api_url: str, submissions: Iterable[Tuple[str, str]],
+                             validation_rules: Any,
+                             batch_size: Optional[int] = None) -> Iterator[Tuple[str, bool, Dict[str, Any]]]:
+        """
+        Validate many submitted pages, fetching their content in batched requests.
+        
+        Args:
+            wiki_api_url: The API URL of the wiki
+            submissions: Tuples of (page title, path to the local content file)
+            validation_rules: Dictionary of wiki-specific validation rules, or a compiled RuleSet
+            batch_size: Titles per request; defaults to get_title_batch_size()
+            
+        Yields:
+            Tuples of (page title, success, validation_details) as each batch arrives
+        """
+        batch_size = batch_size or self.get_title_batch_size(wiki_api_url)
+        for batch in _batches(submissions, batch_size):
+            content_files = {}
+            for title, content_file in batch:
+                content_files.setdefault(title, []).append(content_file)
+            titles = list(content_files)
+            for title, page in self._query_title_batch(wiki_api_url, titles, "ids|content", False):
+                wiki_content = _revision_content(page["revisions"][0]) if page else None
+                for content_file in content_files[title]:
+                    success, validation_details = self.compare_content(wiki_content, content_file, validation_rules)
+                    yield title, success, validation_details
+    
+    def compare_content(self, wiki_content: Optional[str], content_file: str,
+                        validation_rules: Any) -> Tuple[bool, Dict[str, Any]]:
+        """
+        Compare fetched wiki content with a local file and check wiki-specific criteria.
+        
+        Args:
+            wiki_content: The content of the wiki page, or None if it could not be fetched
+            content_file: Path to the local content file
+            validation_rules: Dictionary of wiki-specific validation rules, or a compiled RuleSet
+            
+        Returns:
+            Tuple containing (success, validation_details); on a mismatch validation_details["diff"]
+            holds the summarize_diff() result for the wiki and local text
+        """
         validation_details = {
             "content_match": False,
             "wiki_features": {},
@@ -128,8 +563,6 @@ class WikiValidator:
             }
         }
         
-        # Fetch content from wiki
-        wiki_content = self.fetch_wiki_page(wiki_api_url, page_title)
         if wiki_content is None:
             return False, validation_details
             
@@ -145,7 +578,10 @@ class WikiValidator:
         # Check wiki-specific features
         if validation_rules:
             validation_details["wiki_features"] = self.check_wiki_specific_features(wiki_content, validation_rules)
-            validation_details["local_features"] = self.check_wiki_specific_features(local_content, validation_rules)
+            if local_content == wiki_content:
+                validation_details["local_features"] = dict(validation_details["wiki_features"])
+            else:
+                validation_details["local_features"] = self.check_wiki_specific_features(local_content, validation_rules)
         
         # Compare content (simplified comparison)
         # Remove whitespace differences for comparison
@@ -153,6 +589,10 @@ class WikiValidator:
         local_content_stripped = local_content.strip()
         
         validation_details["content_match"] = wiki_content_stripped == local_content_stripped
+        if not validation_details["content_match"]:
+            validation_details["diff"] = summarize_diff(
+                wiki_content_stripped, local_content_stripped, fromfile="wiki", tofile=content_file,
+                max_lines=self.max_diff_lines, output_dir=self.diff_dir)
         
         # Overall success is based on content matching
         success = validation_details["content_match"]
@@ -172,12 +612,21 @@ class WikiValidator:
         print(f"\n\033[0;34m[VALIDATION]\033[0m Validation report for {wiki_name}:")
         
         # Content match result
-        if validation_details["content_match"]:
+        if validation_details["content_match"] and validation_details.get("method") == "sha1":
+            print("\033[0;32m✓\033[0m Content matches between local file and wiki page (revision SHA-1)")
+        elif validation_details["content_match"]:
             print("\033[0;32m✓\033[0m Content matches between local file and wiki page")
         else:
             print("\033[0;31m✗\033[0m Content differs between local file and wiki page")
             print(f"  Local content length: {validation_details['content_lengths']['local']} characters")
             print(f"  Wiki content length: {validation_details['content_lengths']['wiki']} characters")
+            diff = validation_details.get("diff")
+            if diff:
+                print(f"  Changed lines: +{diff['added']} -{diff['removed']} in {diff['hunks']} hunk(s)")
+                for line in diff["preview"]:
+                    print(f"    {line}")
+                if diff["file"]:
+                    print(f"  ... diff truncated, full diff written to {diff['file']}")
         
         # Wiki-specific features
         wiki_features = validation_details.get("wiki_features", {})
@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Wiki Watch
+Watches a directory of content files for saves that change their content.
+
+On Linux the directory tree is watched with inotify, called through ctypes,
+so a watch costs nothing while no file changes. Elsewhere, or if inotify is
+unavailable, the tree is scanned every poll interval. A burst of events, such
+as an editor writing, renaming and touching a file on save, is debounced into
+one batch, and files whose content hashes the same as before (touch-only
+changes, saves without edits) are dropped.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from wiki_http_client import FileFormValue, WikiHttpError
+from wiki_validator import content_digest
+
+# Seconds without events after which a burst of saves is complete
+DEBOUNCE = 0.25
+
+# Longest a burst is collected, so a file written continuously is still pushed
+MAX_DEBOUNCE = 2.0
+
+# Seconds between scans when inotify is unavailable
+POLL_INTERVAL = 1.0
+
+# inotify(7) event masks
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+
+# Finished writes, files renamed into place (atomic saves) and new files or directories
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+# struct inotify_event without its name: wd, mask, cookie, len
+INOTIFY_EVENT = struct.Struct("iIII")
+
+# Editor swap, backup and temporary files, which are never pushed
+IGNORED_SUFFIXES = ("~", ".swp", ".swx", ".tmp", ".part")
+
+
+def is_content_file(path: str) -> bool:
+    """Check whether a path looks like a content file rather than an editor's hidden or temporary file."""
+    name = os.path.basename(path)
+    return bool(name) and not name.startswith((".", "#")) and not name.endswith(IGNORED_SUFFIXES)
+
+
+def page_title_for_file(directory: str, path: str) -> str:
+    """
+    Derive a page title from a content file's path below the watched directory.
+
+    The extension is dropped, subdirectories become subpages and underscores
+    become spaces, so "Bluetooth/Headset_profiles.md" is "Bluetooth/Headset profiles".
+
+    Args:
+        directory: The watched directory
+        path: Path of the content file
+
+    Returns:
+        The page title
+    """
+    relative = os.path.splitext(os.path.relpath(path, directory))[0]
+    return relative.replace(os.sep, "/").replace("_", " ")
+
+
+def _scan(directory: str) -> Dict[str, Tuple[int, int, int]]:
+    """Map every content file below a directory to its (mtime, size, inode) signature."""
+    signatures = {}
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [name for name in dirs if not name.startswith(".")]
+        for name in files:
+            path = os.path.join(root, name)
+            if not is_content_file(path):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            signatures[path] = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+    return signatures
+
+
+class PollingWatcher:
+    def __init__(self, directory: str, poll_interval: float = POLL_INTERVAL):
+        """
+        Initialize the PollingWatcher, which finds changes by scanning the tree.
+
+        Args:
+            directory: The directory to watch, with its subdirectories
+            poll_interval: Seconds between scans
+        """
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.signatures = _scan(directory)
+        self.stopped = threading.Event()
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        Wait for files to be written.
+
+        Args:
+            timeout: Seconds to wait at most, None to wait until a file is written or stop() is called
+
+        Returns:
+            Paths of the files written, empty on timeout or after stop()
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.stopped.is_set():
+            signatures = _scan(self.directory)
+            changed = {path for path, signature in signatures.items() if self.signatures.get(path) != signature}
+            self.signatures = signatures
+            if changed:
+                return changed
+            interval = self.poll_interval
+            if deadline is not None:
+                interval = min(interval, deadline - time.monotonic())
+                if interval <= 0:
+                    break
+            self.stopped.wait(interval)
+        return set()
+
+    def stop(self) -> None:
+        """Make wait() return at once, from any thread."""
+        self.stopped.set()
+
+    def close(self) -> None:
+        """Release the watcher's resources."""
+        self.stop()
+
+
+class InotifyWatcher:
+    def __init__(self, directory: str):
+        """
+        Initialize the InotifyWatcher, which is told about changes by the kernel.
+
+        Args:
+            directory: The directory to watch, with its subdirectories
+
+        Raises:
+            OSError: If inotify is unavailable on this system or the watch limit is reached
+        """
+        # Checked before loading anything: elsewhere there is no inotify, and no C library to find
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, f"inotify is not available on {sys.platform}")
+        libc_name = ctypes.util.find_library("c")
+        if libc_name is None:
+            raise OSError(errno.ENOENT, "The C library was not found")
+        libc = ctypes.CDLL(libc_name, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError(errno.ENOSYS, "inotify is not available on this system")
+        self.libc = libc
+        self.directory = directory
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}")
+        # Written to by stop(), so a blocked wait() returns
+        self.wakeup_read, self.wakeup_write = os.pipe()
+        # Watched directory by watch descriptor
+        self.directories = {}
+        try:
+            self._add_tree(directory)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watch(self, directory: str) -> None:
+        """Watch one directory."""
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, f"Cannot watch '{directory}': {os.strerror(error)}")
+        self.directories[wd] = directory
+
+    def _add_tree(self, directory: str) -> Set[str]:
+        """Watch a directory and its subdirectories; returns the content files already in them."""
+        files = set()
+        for root, dirs, names in os.walk(directory):
+            dirs[:] = [name for name in dirs if not name.startswith(".")]
+            self._add_watch(root)
+            files.update(os.path.join(root, name) for name in names)
+        return files
+
+    def _read_events(self) -> Set[str]:
+        """Read the queued events and return the paths they name."""
+        changed = set()
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b"\0")
+            offset += INOTIFY_EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                # Events were lost; every file may have changed
+                changed.update(_scan(self.directory))
+                continue
+            if mask & IN_IGNORED:
+                self.directories.pop(wd, None)
+                continue
+            directory = self.directories.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & IN_ISDIR:
+                if not os.path.basename(path).startswith("."):
+                    try:
+                        # Files written before the new directory was watched count too
+                        changed.update(self._add_tree(path))
+                    except OSError as e:
+                        print(f"Warning: {e}", file=sys.stderr)
+            else:
+                changed.add(path)
+        return {path for path in changed if is_content_file(path)}
+
+    def wait(self, timeout: Optional[float] = None) -> Set[str]:
+        """
+        Wait for files to be written. See PollingWatcher.wait().
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            readable, _, _ = select.select([self.fd, self.wakeup_read], [], [], remaining)
+            if self.wakeup_read in readable or not readable:
+                return set()
+            changed = self._read_events()
+            if changed:
+                return changed
+
+    def stop(self) -> None:
+        """Make wait() return at once, from any thread."""
+        os.write(self.wakeup_write, b"\0")
+
+    def close(self) -> None:
+        """Stop watching and close the inotify descriptor."""
+        for fd in (self.fd, self.wakeup_read, self.wakeup_write):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+
+class ContentWatcher:
+    def __init__(self, directory: str, paths: Optional[Iterable[str]] = None, debounce: float = DEBOUNCE,
+                 poll_interval: Optional[float] = None):
+        """
+        Initialize the ContentWatcher and hash the files already in the directory.
+
+        Args:
+            directory: The directory of content files to watch, with its subdirectories
+            paths: Only report these files, e.g. those of a manifest; None for every content file
+            debounce: Seconds without events after which a burst of saves is reported
+            poll_interval: Scan the directory this often instead of using inotify; None to use
+                inotify where available and fall back to scanning every POLL_INTERVAL seconds
+        """
+        self.directory = os.path.abspath(directory)
+        if not os.path.isdir(self.directory):
+            raise ValueError(f"'{directory}' is not a directory.")
+        self.paths = None if paths is None else {os.path.abspath(path) for path in paths}
+        self.debounce = debounce
+        self.watcher = None
+        if poll_interval is None:
+            try:
+                self.watcher = InotifyWatcher(self.directory)
+            except OSError as e:
+                print(f"Warning: Cannot use inotify, scanning every {POLL_INTERVAL:g} seconds instead: {e}",
+                      file=sys.stderr)
+                poll_interval = POLL_INTERVAL
+        if self.watcher is None:
+            self.watcher = PollingWatcher(self.directory, poll_interval)
+        self.stopped = False
+        # Content hash of every watched file as last seen
+        self.digests = {}
+        for path in _scan(self.directory):
+            if self._is_watched(path):
+                self.digests[path] = self._digest(path)
+
+    @property
+    def backend(self) -> str:
+        """The way changes are detected, "inotify" or "polling"."""
+        return "inotify" if isinstance(self.watcher, InotifyWatcher) else "polling"
+
+    def _is_watched(self, path: str) -> bool:
+        return self.paths is None or path in self.paths
+
+    def _digest(self, path: str) -> Optional[Tuple[str, int]]:
+        """Hash a file as MediaWiki hashes saved text; None if it cannot be read (yet)."""
+        try:
+            return content_digest(FileFormValue(path))
+        except (OSError, ValueError, WikiHttpError):
+            # Gone again, or still being written with a partial UTF-8 sequence
+            return None
+
+    def changes(self, timeout: Optional[float] = None) -> List[str]:
+        """
+        Wait for files whose content changed.
+
+        Events are collected until none arrived for the debounce time (at most
+        MAX_DEBOUNCE seconds), then every file they name is hashed and only
+        those whose content differs from the last time are returned.
+
+        Args:
+            timeout: Seconds to wait at most, None to wait until a change or stop()
+
+        Returns:
+            Sorted paths of the changed files, empty on timeout or after stop()
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.stopped:
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                break
+            candidates = self.watcher.wait(remaining)
+            if not candidates:
+                continue
+            burst_end = time.monotonic() + MAX_DEBOUNCE
+            while not self.stopped:
+                more = self.watcher.wait(min(self.debounce, max(0.0, burst_end - time.monotonic())))
+                if not more:
+                    break
+                candidates |= more
+            changed = []
+            for path in sorted(candidates):
+                if not self._is_watched(path):
+                    continue
+                digest = self._digest(path)
+                if digest is not None and digest != self.digests.get(path):
+                    self.digests[path] = digest
+                    changed.append(path)
+            if changed:
+                return changed
+        return []
+
+    def forget(self, path: str) -> None:
+        """Forget a file's content, so its next save is reported even if the content is the same."""
+        self.digests.pop(os.path.abspath(path), None)
+
+    def __iter__(self) -> Iterator[List[str]]:
+        """Yield each batch of changed files until stop() is called."""
+        while not self.stopped:
+            changed = self.changes()
+            if changed:
+                yield changed
+
+    def stop(self) -> None:
+        """Stop watching; a waiting changes() returns at once. May be called from any thread."""
+        self.stopped = True
+        self.watcher.stop()
+
+    def close(self) -> None:
+        """Stop watching and release the watcher's resources."""
+        self.stop()
+        self.watcher.close()
@@ -7,15 +7,41 @@ import unittest
 import json
 import os
 import tempfile
+import shutil
+import subprocess
 import sys
+import threading
+import time
+import tracemalloc
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest.mock import patch, mock_open, MagicMock
 
 # Add the scripts directory to the path so we can import our modules
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'scripts'))
+# The mock MediaWiki server lives with the benchmarks
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'benchmarks'))
 
 from wiki_config_manager import WikiConfigManager
+from wiki_config_shards import export_shards
 from wiki_selector import WikiSelector
-from wiki_validator import WikiValidator
+from wiki_validator import WikiValidator, normalize_content, content_sha1, content_digest
+from wiki_http_client import (WikiHttpClient, WikiHttpError, WikiApiError, FileFormValue, BadTokenError,
+                              MaxLagError, RateLimitedError, WrongTokenError)
+from wiki_automated_submission import StandardWikiBot
+from wiki_manifest import load_manifest
+from wiki_retry import RetryPolicy
+from wiki_rate_limiter import AdaptiveRateLimiter
+from wiki_async_engine import AsyncSubmissionEngine
+from wiki_secure_submission import EnhancedSecureWikiBot, submit_to_wikis, resolve_fanout_targets
+from wiki_session_cache import WikiSessionCache, Fernet
+from wiki_rules import PatternMatcher, get_pattern_matcher, compile_rules, get_rule_set
+from wiki_diff import diff_opcodes, unified_diff, summarize_diff
+from wiki_logging import RunJournal, read_journal
+from wiki_metrics import LatencyHistogram, WikiMetrics, get_metrics
+from wiki_plan import WikiPlanner
+from wiki_watch import ContentWatcher, page_title_for_file
+from mock_mediawiki import FaultProfile, MockMediaWiki
 
 class TestWikiConfigManager(unittest.TestCase):
     """Test cases for WikiConfigManager"""
@@ -46,15 +72,23 @@ class TestWikiConfigManager(unittest.TestCase):
         self.temp_user_config_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.json')
         self.temp_user_config_file.close()
         
+        self.cache_dir = tempfile.mkdtemp()
         self.config_manager = WikiConfigManager(
             config_file=self.temp_config_file.name,
-            user_config_file=self.temp_user_config_file.name
+            user_config_file=self.temp_user_config_file.name,
+            cache_dir=self.cache_dir
         )
     
     def tearDown(self):
         """Tear down test fixtures after each test method."""
         os.unlink(self.temp_config_file.name)
         os.unlink(self.temp_user_config_file.name)
+        shutil.rmtree(self.cache_dir)
+    
+    def touch_config(self, offset: int):
+        """Move the main config file's modification time to mark it as changed."""
+        stat = os.stat(self.temp_config_file.name)
+        os.utime(self.temp_config_file.name, ns=(stat.st_atime_ns, stat.st_mtime_ns + offset))
     
     def test_load_config(self):
         """Test loading configuration from file."""
@@ -71,6 +105,137 @@ class TestWikiConfigManager(unittest.TestCase):
         merged_config = self.config_manager.merge_configs()
         self.assertEqual(merged_config, self.test_config)
     
+    def test_merge_configs_reloads_only_changed_files(self):
+        """Test that the merged config is reused until a configuration file changes."""
+        merged_config = self.config_manager.merge_configs()
+        with patch('wiki_config_manager.json.load') as mock_load:
+            self.assertIs(self.config_manager.merge_configs(), merged_config)
+            self.config_manager.get_wiki_list()
+            self.config_manager.get_default_wiki()
+            mock_load.assert_not_called()
+        
+        with open(self.temp_user_config_file.name, 'w') as f:
+            json.dump({"default_wiki": "mywiki", "wikis": {"mywiki": {"name": "My Wiki"}}}, f)
+        self.assertEqual(self.config_manager.get_default_wiki(), "mywiki")
+        self.assertEqual(self.config_manager.get_wiki_config("mywiki"), {"name": "My Wiki"})
+    
+    def test_merge_configs_disk_cache(self):
+        """Test that a new manager loads unchanged files from the on-disk cache."""
+        self.config_manager.merge_configs()
+        second_manager = WikiConfigManager(config_file=self.temp_config_file.name,
+                                           user_config_file=self.temp_user_config_file.name,
+                                           cache_dir=self.cache_dir)
+        with patch('wiki_config_manager.json.load') as mock_load:
+            self.assertEqual(second_manager.merge_configs(), self.test_config)
+            mock_load.assert_not_called()
+        
+        # A changed file invalidates the cache entry
+        self.touch_config(10 ** 9)
+        third_manager = WikiConfigManager(config_file=self.temp_config_file.name,
+                                          user_config_file=self.temp_user_config_file.name,
+                                          cache_dir=self.cache_dir)
+        with patch('wiki_config_manager.json.load', wraps=json.load) as mock_load:
+            self.assertEqual(third_manager.merge_configs(), self.test_config)
+            mock_load.assert_called()
+    
+    def test_indexed_lookups(self):
+        """Test lookups by API URL, host and category."""
+        with open(self.temp_user_config_file.name, 'w') as f:
+            json.dump({"wikis": {
+                "archwiki_de": {"name": "Arch Wiki (de)", "api_url": "https://wiki.archlinux.de/api.php"},
+                "internal": {"name": "Internal", "api_url": "https://wiki.example.com/api.php", "category": "Company"},
+                "memory_alpha": {"name": "Memory Alpha", "api_url": "https://memory-alpha.fandom.com/api.php",
+                                 "family": "fandom"}
+            }}, f)
+        
+        self.assertEqual(self.config_manager.find_wiki_id_by_api_url("https://Wiki.ArchLinux.org:443//api.php"),
+                         "archwiki")
+        self.assertIsNone(self.config_manager.find_wiki_id_by_api_url("https://wiki.archlinux.org/index.php"))
+        self.assertEqual(self.config_manager.find_wiki_ids_by_host("WIKI.EXAMPLE.COM"), ["internal"])
+        self.assertEqual(self.config_manager.find_wiki_ids_by_host("unknown.org"), [])
+        
+        categories = self.config_manager.get_wikis_by_category()
+        self.assertEqual(list(categories), ["Wikimedia Foundation", "Technology", "Fandom", "Company", "Other"])
+        self.assertEqual(categories["Technology"], ["archwiki", "archwiki_de"])
+        self.assertEqual(categories["Fandom"], ["memory_alpha"])
+        self.assertEqual(categories["Company"], ["internal"])
+        
+        # Indexes are reused until the configuration changes
+        self.assertIs(self.config_manager.get_index("host"), self.config_manager.get_index("host"))
+        with open(self.temp_user_config_file.name, 'w') as f:
+            json.dump({"wikis": {}}, f)
+        self.assertEqual(self.config_manager.find_wiki_ids_by_host("wiki.example.com"), [])
+    
+    def test_search_wikis(self):
+        """Test fuzzy search ranking and the on-disk search index cache."""
+        with open(self.temp_user_config_file.name, 'w') as f:
+            json.dump({"wikis": {
+                "archwiki_de": {"name": "Arch Wiki (de)", "api_url": "https://wiki.archlinux.de/api.php"},
+                "memory_alpha": {"name": "Memory Alpha", "api_url": "https://memory-alpha.fandom.com/api.php"},
+                "wikipedia": {"name": "Wikipedia", "api_url": "https://en.wikipedia.org/api.php"}
+            }}, f)
+        
+        self.assertEqual(sorted(self.config_manager.search_wikis("arch")), [("archwiki", 1.0), ("archwiki_de", 1.0)])
+        self.assertEqual(self.config_manager.search_wikis("memory-alpha.fandom.com")[0], ("memory_alpha", 1.0))
+        # Typos still match, and an exact ID ranks first
+        self.assertEqual(self.config_manager.search_wikis("wikipeda")[0][0], "wikipedia")
+        self.assertEqual(self.config_manager.search_wikis("ArchWiki_DE")[0], ("archwiki_de", 2.0))
+        self.assertEqual(len(self.config_manager.search_wikis("arch", limit=1)), 1)
+        self.assertEqual(self.config_manager.search_wikis("zzzz"), [])
+        self.assertEqual(self.config_manager.search_wikis(" -- "), [])
+        
+        # A new process loads the index from the cache instead of building it
+        second_manager = WikiConfigManager(config_file=self.temp_config_file.name,
+                                           user_config_file=self.temp_user_config_file.name,
+                                           cache_dir=self.cache_dir)
+        with patch('wiki_search.wiki_search_tokens', side_effect=AssertionError("index rebuilt")):
+            self.assertEqual(second_manager.search_wikis("memry alpha")[0][0], "memory_alpha")
+        
+        # ...until the configuration changes
+        with open(self.temp_user_config_file.name, 'w') as f:
+            json.dump({"wikis": {}}, f)
+        self.assertEqual([wiki_id for wiki_id, score in second_manager.search_wikis("arch")], ["archwiki"])
+    
+    def test_sharded_config_loads_only_needed_shard(self):
+        """Test that a sharded configuration loads just the shard of the requested wiki."""
+        shard_dir = os.path.join(self.cache_dir, "wikis.d")
+        config = json.loads(json.dumps(self.test_config))
+        for index in range(3):
+            config["wikis"][f"fandom{index}"] = {
+                "name": f"Fandom Wiki {index}", "api_url": f"https://wiki{index}.fandom.com/api.php",
+                "user_agent": f"WikiSecureBot/1.0 (Fandom Wiki {index})", "max_in_flight": 2,
+                "validation_rules": {"infobox": "{{Infobox", f"rule{index}": "=="}
+            }
+        shards = export_shards(config, shard_dir)
+        self.assertEqual(shards["fandom.json"], ["fandom0", "fandom1", "fandom2"])
+        with open(os.path.join(shard_dir, "fandom.json")) as f:
+            fandom_shard = json.load(f)
+        self.assertEqual(fandom_shard["defaults"], {"max_in_flight": 2, "user_agent": "WikiSecureBot/1.0 ({name})",
+                                                    "validation_rules": {"infobox": "{{Infobox"}})
+        self.assertEqual(fandom_shard["wikis"]["fandom1"]["validation_rules"], {"rule1": "=="})
+        
+        config_manager = WikiConfigManager(config_file=shard_dir, user_config_file=self.temp_user_config_file.name)
+        self.assertEqual(config_manager.get_wiki_config("fandom1"), config["wikis"]["fandom1"])
+        self.assertEqual(config_manager.loaded_shards, {"fandom.json"})
+        self.assertEqual(config_manager.find_wiki_id_by_api_url("https://wiki2.fandom.com/api.php"), "fandom2")
+        self.assertEqual(config_manager.get_wikis_by_category()["Technology"], ["archwiki"])
+        self.assertEqual(config_manager.loaded_shards, {"fandom.json"})
+        self.assertEqual(config_manager.get_default_wiki(), "archwiki")
+        self.assertEqual(config_manager.get_wiki_list(), config["wikis"])
+        self.assertEqual(list(config_manager.get_wiki_list()), list(config["wikis"]))
+    
+    def test_sharded_repository_config_round_trip(self):
+        """Test that the shipped wiki_config.json loads the same from shards."""
+        config_file = os.path.join(os.path.dirname(__file__), '..', 'wiki_config.json')
+        with open(config_file) as f:
+            config = json.load(f)
+        shard_dir = os.path.join(self.cache_dir, "wikis.d")
+        export_shards(config, shard_dir)
+        config_manager = WikiConfigManager(config_file=shard_dir, user_config_file=self.temp_user_config_file.name)
+        for wiki_id, wiki_config in config["wikis"].items():
+            self.assertEqual(config_manager.get_wiki_config(wiki_id), wiki_config)
+        self.assertEqual(len(config_manager.get_validation_rules("archwiki")), 4)
+    
     def test_get_wiki_config(self):
         """Test getting configuration for a specific wiki."""
         wiki_config = self.config_manager.get_wiki_config("archwiki")
@@ -91,6 +256,62 @@ class TestWikiConfigManager(unittest.TestCase):
         default_wiki = self.config_manager.get_default_wiki()
         self.assertEqual(default_wiki, "archwiki")
     
+    def test_add_wiki_concurrent_writers(self):
+        """Test that concurrent processes adding wikis neither lose updates nor corrupt the file."""
+        writers, wikis_per_writer = 32, 4
+        script = (
+            "import sys\n"
+            f"sys.path.insert(0, {os.path.join(os.path.dirname(__file__), '..', 'scripts')!r})\n"
+            "from wiki_config_manager import WikiConfigManager\n"
+            "manager = WikiConfigManager(config_file=sys.argv[1], user_config_file=sys.argv[2], use_disk_cache=False)\n"
+            f"for index in range({wikis_per_writer}):\n"
+            "    wiki_id = f'writer{sys.argv[3]}_{index}'\n"
+            "    manager.add_wiki(wiki_id, {'name': wiki_id, 'api_url': f'https://{wiki_id}.example.org/api.php'})\n"
+        )
+        os.unlink(self.temp_user_config_file.name)
+        processes = [subprocess.Popen([sys.executable, "-c", script, self.temp_config_file.name,
+                                       self.temp_user_config_file.name, str(writer)])
+                     for writer in range(writers)]
+        for process in processes:
+            self.assertEqual(process.wait(timeout=60), 0)
+        
+        with open(self.temp_user_config_file.name) as f:
+            user_wikis = json.load(f)["wikis"]
+        self.assertEqual(len(user_wikis), writers * wikis_per_writer)
+        self.assertEqual(len(self.config_manager.get_wiki_list()), writers * wikis_per_writer + 1)
+        self.assertEqual(os.stat(self.temp_user_config_file.name).st_mode & 0o777, 0o600)
+        os.unlink(self.temp_user_config_file.name + ".lock")
+    
+    def test_add_wiki_keeps_file_mode(self):
+        """Test that add_wiki() keeps the permissions of an existing user configuration."""
+        with open(self.temp_user_config_file.name, 'w') as f:
+            json.dump({"wikis": {}}, f)
+        os.chmod(self.temp_user_config_file.name, 0o644)
+        self.config_manager.add_wiki("new_wiki", {"name": "New", "api_url": "https://new.example.org/api.php"})
+        self.assertEqual(os.stat(self.temp_user_config_file.name).st_mode & 0o777, 0o644)
+        os.unlink(self.temp_user_config_file.name + ".lock")
+    
+    def test_add_wiki_keeps_unreadable_user_config(self):
+        """Test that add_wiki() refuses to replace a user configuration it cannot parse."""
+        with open(self.temp_user_config_file.name, 'w') as f:
+            f.write('{"wikis": {"mine": ')
+        with self.assertRaises(Exception):
+            self.config_manager.add_wiki("new_wiki", {"name": "New", "api_url": "https://new.example.org/api.php"})
+        with open(self.temp_user_config_file.name) as f:
+            self.assertEqual(f.read(), '{"wikis": {"mine": ')
+        os.unlink(self.temp_user_config_file.name + ".lock")
+    
+    def test_get_validation_rules_cached(self):
+        """Test that rules are compiled once per wiki until the configuration is reloaded."""
+        rules = self.config_manager.get_validation_rules("archwiki")
+        self.assertEqual(len(rules), 3)
+        self.assertIs(self.config_manager.get_validation_rules("archwiki"), rules)
+        self.config_manager.merge_configs()
+        self.assertIs(self.config_manager.get_validation_rules("archwiki"), rules)
+        self.touch_config(10 ** 9)
+        self.assertIsNot(self.config_manager.get_validation_rules("archwiki"), rules)
+        self.assertEqual(len(self.config_manager.get_validation_rules("nonexistent")), 0)
+    
     def test_validate_api_url_valid(self):
         """Test validating a valid API URL."""
         valid_url = "https://wiki.archlinux.org/api.php"
@@ -146,6 +367,29 @@ class TestWikiSelector(unittest.TestCase):
         self.assertIn("Other", categorized)
         self.assertIn("archwiki", categorized["Technology"])
         self.assertIn("wikipedia", categorized["Wikimedia Foundation"])
+    
+    @patch('builtins.input', return_value="https://EN.wikipedia.org/api.php")
+    def test_custom_url_reuses_configured_wiki(self, mock_input):
+        """Test that a custom URL of a configured wiki selects that wiki."""
+        self.mock_config_manager.find_wiki_id_by_api_url.side_effect = \
+            lambda url: "wikipedia" if url.lower() == "https://en.wikipedia.org/api.php" else None
+        with patch('sys.stdout'):
+            wiki_id, wiki_config = self.wiki_selector._handle_custom_url()
+        self.assertEqual(wiki_id, "wikipedia")
+        self.assertIs(wiki_config, self.test_config["wikis"]["wikipedia"])
+
+    @patch('builtins.input', side_effect=["linux", "1"])
+    def test_interactive_search(self, mock_input):
+        """Test that text typed at the selection prompt filters the wikis."""
+        self.mock_config_manager.get_wiki_summaries.return_value = self.test_config["wikis"]
+        self.mock_config_manager.get_wikis_by_category.return_value = \
+            {"Wikimedia Foundation": ["wikipedia"], "Technology": ["archwiki"], "Other": []}
+        self.mock_config_manager.search_wikis.return_value = [("archwiki", 0.8)]
+        with patch('sys.stdout'):
+            wiki_id, wiki_config = self.wiki_selector.select_wiki_interactive()
+        # Option 1 is Wikipedia in the full list, and the first match after the search
+        self.mock_config_manager.search_wikis.assert_called_once_with("linux", limit=20)
+        self.assertEqual(wiki_id, "archwiki")
 
 class TestWikiValidator(unittest.TestCase):
     """Test cases for WikiValidator"""
@@ -195,6 +439,1262 @@ class TestWikiValidator(unittest.TestCase):
         self.assertFalse(results["infobox"])
         self.assertFalse(results["navbox"])
 
+class TestLineDiff(unittest.TestCase):
+    """Test cases for the line diff used in validation reports"""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.test_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        """Clean up after each test method."""
+        shutil.rmtree(self.test_dir)
+    
+    def test_opcodes_rebuild_new_text(self):
+        """Test that applying the opcodes to the old lines gives the new lines."""
+        a = ["== A ==", "text", "|-", "|-", "more", "== B ==", "end"]
+        b = ["== A ==", "changed", "|-", "more", "== C ==", "== B ==", "end", "extra"]
+        rebuilt = []
+        for tag, i1, i2, j1, j2 in diff_opcodes(a, b):
+            if tag == "equal":
+                self.assertEqual(a[i1:i2], b[j1:j2])
+            rebuilt.extend(b[j1:j2])
+        self.assertEqual(rebuilt, b)
+    
+    def test_unified_diff_hunks(self):
+        """Test the unified diff format, with context lines and hunk headers."""
+        a = [f"line {i}" for i in range(20)]
+        b = list(a)
+        b[2] = "changed"
+        b[15:16] = []
+        diff = list(unified_diff(a, b, "wiki", "local"))
+        self.assertEqual(diff[:3], ["--- wiki", "+++ local", "@@ -1,6 +1,6 @@"])
+        self.assertIn("-line 2", diff)
+        self.assertIn("+changed", diff)
+        self.assertIn("@@ -13,7 +13,6 @@", diff)
+        self.assertEqual(list(unified_diff(a, list(a))), [])
+    
+    def test_summarize_diff_large_page(self):
+        """Test that a large diff keeps a short preview and writes the rest to a file."""
+        old = "\n".join(f"line {i} with [[Link]]" for i in range(200000))
+        new = old.replace("line 1000 ", "edited 1000 ").replace("line 150000 ", "edited 150000 ")
+        new += "\n" + "\n".join(f"added {i}" for i in range(100))
+        
+        summary = summarize_diff(old, new, max_lines=10, output_dir=self.test_dir)
+        self.assertEqual(summary["added"], 102)
+        self.assertEqual(summary["removed"], 2)
+        self.assertEqual(summary["hunks"], 3)
+        self.assertEqual(len(summary["preview"]), 10)
+        self.assertTrue(summary["truncated"])
+        with open(summary["file"]) as f:
+            written = f.read().splitlines()
+        self.assertEqual(written[:10], summary["preview"])
+        self.assertIn("+edited 150000 with [[Link]]", written)
+        
+        small = summarize_diff("a\nb", "a\nc", output_dir=self.test_dir)
+        self.assertIsNone(small["file"])
+        self.assertEqual(small["preview"][-2:], ["-b", "+c"])
+        
+        # Content lines that look like file headers are still counted
+        headers = summarize_diff("a\n-- x\nb", "a\nb\n++ y", output_dir=self.test_dir)
+        self.assertEqual((headers["added"], headers["removed"]), (1, 1))
+    
+    def test_compare_content_reports_diff(self):
+        """Test that a content mismatch includes the diff in the validation details."""
+        content_file = os.path.join(self.test_dir, "page.txt")
+        with open(content_file, "w") as f:
+            f.write("== Intro ==\nlocal text\n")
+        validator = WikiValidator()
+        success, details = validator.compare_content("== Intro ==\nwiki text\n", content_file, {})
+        self.assertFalse(success)
+        self.assertEqual(details["diff"]["preview"][-2:], ["-wiki text", "+local text"])
+        success, details = validator.compare_content("== Intro ==\nlocal text", content_file, {})
+        self.assertTrue(success)
+        self.assertNotIn("diff", details)
+
+class TestRunJournal(unittest.TestCase):
+    """Test cases for the JSON Lines run journal"""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "run.jsonl")
+    
+    def tearDown(self):
+        """Tear down test fixtures after each test method."""
+        shutil.rmtree(self.temp_dir)
+    
+    def test_structured_records(self):
+        """Test that records from many threads are all written, with their fields."""
+        journal = RunJournal(self.path)
+        threads = [threading.Thread(target=lambda thread=thread: [
+            journal.log(f"Edit {thread}-{index}", wiki="https://wiki.example.org/api.php", page=f"Page {index}",
+                        phase="edit", duration=0.12345, outcome="success") for index in range(200)])
+            for thread in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        journal.log("Done")
+        journal.flush()
+        
+        records = read_journal(self.path)
+        self.assertEqual(len(records), 8 * 200 + 1)
+        self.assertEqual(records[0]["duration"], 0.123)
+        self.assertEqual(records[0]["phase"], "edit")
+        self.assertEqual(set(records[-1]), {"time", "level", "message"})
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+        
+        # Logging after a flush starts the writer again
+        journal.log("After flush", outcome="skipped")
+        journal.flush()
+        self.assertEqual(read_journal(self.path)[-1]["message"], "After flush")
+    
+    def test_rotation_and_close(self):
+        """Test size-based rotation, and that close() removes the journal unless kept."""
+        journal = RunJournal(self.path, max_bytes=2000, backup_count=2)
+        for index in range(200):
+            journal.log(f"Record {index}", page="x" * 20)
+        journal.flush()
+        self.assertTrue(os.path.exists(self.path + ".2"))
+        self.assertFalse(os.path.exists(self.path + ".3"))
+        self.assertLessEqual(os.path.getsize(self.path), 2000 + 200)
+        self.assertEqual(read_journal(self.path)[-1]["message"], "Record 199")
+        
+        journal.close()
+        self.assertEqual(os.listdir(self.temp_dir), [])
+        
+        kept = RunJournal(self.path, keep=True)
+        kept.log("Kept")
+        kept.close()
+        self.assertEqual(read_journal(self.path)[0]["message"], "Kept")
+
+class TestWikiMetrics(unittest.TestCase):
+    """Test cases for per-phase latency metrics"""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.wiki = MockMediaWiki().start()
+        # Fresh registry for the bot, validator and HTTP client
+        self.metrics = WikiMetrics()
+        patcher = patch('wiki_metrics._metrics', self.metrics)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+    
+    def tearDown(self):
+        """Tear down test fixtures after each test method."""
+        self.wiki.stop()
+    
+    def test_histogram_quantiles(self):
+        """Test quantile estimates interpolated within buckets."""
+        histogram = LatencyHistogram((0.1, 1.0))
+        for seconds in [0.05] * 50 + [0.5] * 49 + [3.0]:
+            histogram.observe(seconds)
+        self.assertAlmostEqual(histogram.quantile(0.5), 0.1)
+        self.assertAlmostEqual(histogram.quantile(0.9), 0.1 + 0.9 * 40 / 49)
+        # Above the last bucket, the estimate is capped at the maximum
+        self.assertEqual(histogram.quantile(1.0), 3.0)
+        self.assertIsNone(LatencyHistogram().quantile(0.5))
+    
+    def test_bot_phases_exported(self):
+        """Test that a submission records every phase, bytes and API error codes."""
+        content_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.md')
+        content_file.write("New content\n")
+        content_file.close()
+        self.addCleanup(os.unlink, content_file.name)
+        
+        bot = StandardWikiBot()
+        bot.username = "TestUser"
+        bot.password = "TestPassword"
+        with patch('sys.stdout'):
+            bot.submit_content(self.wiki.api_url, "Page", content_file.name, "Summary")
+            # The session ended with submit_content(), so assert=user refuses the edit
+            with self.assertRaises(Exception):
+                bot.submit_wiki_page(self.wiki.api_url, "Page", "Text", "Summary", "stale-token")
+        
+        summary = self.metrics.to_summary()["wikis"][self.wiki.api_url]
+        self.assertEqual({phase: stats["count"] for phase, stats in summary["phases"].items()},
+                         {"check": 1, "login_token": 1, "login": 1, "csrf_token": 1, "edit": 2})
+        self.assertLessEqual(summary["phases"]["edit"]["p50"], summary["phases"]["edit"]["max"])
+        self.assertEqual(summary["errors"], {"edit": {"assertuserfailed": 1}})
+        self.assertGreater(summary["bytes_sent"], len("New content"))
+        self.assertGreater(summary["bytes_received"], 0)
+        
+        text = self.metrics.to_prometheus()
+        labels = f'wiki="{self.wiki.api_url}",phase="edit"'
+        self.assertIn(f'wiki_phase_duration_seconds_bucket{{{labels},le="+Inf"}} 2\n', text)
+        self.assertIn(f'wiki_phase_duration_seconds_count{{{labels}}} 2\n', text)
+        self.assertIn(f'wiki_errors_total{{{labels},code="assertuserfailed"}} 1\n', text)
+        
+        prom_path = os.path.join(tempfile.mkdtemp(), "wiki.prom")
+        self.addCleanup(shutil.rmtree, os.path.dirname(prom_path))
+        self.metrics.write_prometheus(prom_path)
+        with open(prom_path) as f:
+            self.assertEqual(f.read(), text)
+
+class TestPatternMatcher(unittest.TestCase):
+    """Test cases for the compiled validation rule matcher"""
+    
+    def test_strategies_agree_with_substring_scans(self):
+        """Test that both search strategies find exactly the patterns a per-rule scan finds."""
+        patterns = ["==", "===", "==See also==", "{{Note|", "{{Not", "ab", "bc", "[[Category:", "x" * 30]
+        texts = ["", "abc", "=== Heading ===\n{{Note|text}}", "==See also==\n[[Category:Foo]]", "{{No", "===="]
+        for single_pass in (False, True):
+            matcher = PatternMatcher(patterns, single_pass=single_pass)
+            for text in texts:
+                self.assertEqual(matcher.find(text), {p for p in patterns if p in text}, (single_pass, text))
+    
+    def test_default_strategy(self):
+        """Test that large rule sets use a single pass and empty patterns always match."""
+        self.assertFalse(PatternMatcher(["a", "b"]).single_pass)
+        self.assertTrue(PatternMatcher([f"{{{{Rule{index}|" for index in range(50)]).single_pass)
+        self.assertEqual(PatternMatcher(["", "a"]).find("b"), {""})
+    
+    def test_matcher_is_cached(self):
+        """Test that a rule set is compiled once."""
+        rules = frozenset(["{{Infobox", "==References=="])
+        self.assertIs(get_pattern_matcher(rules), get_pattern_matcher(frozenset(rules)))
+
+class TestValidationRules(unittest.TestCase):
+    """Test cases for typed validation rules"""
+    
+    def test_rule_types(self):
+        """Test literal, regex, count and negated rules."""
+        rules = compile_rules({
+            "note": "{{Note|",
+            "no_todo": {"type": "literal", "pattern": "TODO", "negate": True},
+            "heading": {"type": "regex", "pattern": "(?m)^== [^=]+ ==$"},
+            "sections": {"type": "count", "pattern": "==", "min": 2, "max": 4},
+            "refs": {"type": "count", "pattern": "<ref[ >]", "regex": True, "max": 1}
+        })
+        self.assertEqual(rules.evaluate("== Intro ==\n{{Note|x}}\n<ref>a</ref>"),
+                         {"note": True, "no_todo": True, "heading": True, "sections": True, "refs": True})
+        self.assertEqual(rules.evaluate("TODO\n=== Sub ===\n== A ==\n== B ==\n<ref>a</ref><ref name=b>"),
+                         {"note": False, "no_todo": False, "heading": True, "sections": False, "refs": False})
+    
+    def test_legacy_negated_rule(self):
+        """Test that a plain-string no_duplicate_numbering rule is still negated."""
+        validator = WikiValidator()
+        rules = {"no_duplicate_numbering": "===1. "}
+        self.assertTrue(validator.check_wiki_specific_features("===Intro===", rules)["no_duplicate_numbering"])
+        self.assertFalse(validator.check_wiki_specific_features("===1. Intro", rules)["no_duplicate_numbering"])
+    
+    def test_cached_rules_keep_config_order(self):
+        """Test that a cached rule set reports its rules in configuration order."""
+        config = {"zeta": "{{Note|", "alpha": {"type": "regex", "pattern": "x", "negate": True}}
+        self.assertEqual(list(get_rule_set(config).evaluate("")), ["zeta", "alpha"])
+        same = {"zeta": "{{Note|", "alpha": {"negate": True, "pattern": "x", "type": "regex"}}
+        self.assertIs(get_rule_set(same), get_rule_set(config))
+    
+    def test_invalid_rules(self):
+        """Test that malformed rules are rejected when compiled."""
+        for spec in [{"type": "glob", "pattern": "*"}, {"type": "regex", "pattern": "("},
+                     {"type": "count", "pattern": "=="}, {"pattern": "==", "type": "count", "min": "many"}, 42]:
+            with self.assertRaises(ValueError):
+                compile_rules({"rule": spec})
+
+class TestContentHashing(unittest.TestCase):
+    """Test cases for revision hash comparison"""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.wiki = MockMediaWiki().start()
+        self.validator = WikiValidator()
+    
+    def tearDown(self):
+        """Tear down test fixtures after each test method."""
+        self.wiki.stop()
+    
+    def test_normalize_content(self):
+        """Test that line endings and trailing whitespace are normalized like MediaWiki."""
+        self.assertEqual(normalize_content("a\r\nb\rc  \n\n"), "a\nb\nc")
+        self.assertEqual(normalize_content("\u00e9t\u00e9\u00a0"), "\u00e9t\u00e9\u00a0")
+    
+    def test_content_sha1(self):
+        """Test the hash of known text."""
+        self.assertEqual(content_sha1("hello\n"), "aaf4c61ddcc5e8a2dabede0f3b482cd9aea9434d")
+    
+    def test_is_content_unchanged(self):
+        """Test comparing local content with the latest revision's hash."""
+        self.wiki.set_page("Page", "== Heading ==\nText")
+        self.assertTrue(self.validator.is_content_unchanged(self.wiki.api_url, "Page", "== Heading ==\r\nText\n"))
+        self.assertFalse(self.validator.is_content_unchanged(self.wiki.api_url, "Page", "== Heading ==\nOther"))
+        self.assertFalse(self.validator.is_content_unchanged(self.wiki.api_url, "Missing", "Text"))
+    
+    def test_validate_revision_by_hash(self):
+        """Test that a matching revision is validated without downloading its text."""
+        revid = self.wiki.set_page("Page", "== Heading ==\nText")
+        content_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.md', newline='')
+        content_file.write("== Heading ==\r\nText\n")
+        content_file.close()
+        self.addCleanup(os.unlink, content_file.name)
+        
+        success, details = self.validator.validate_revision(self.wiki.api_url, "Page", content_file.name,
+                                                            {"heading": "== Heading =="}, revid=revid)
+        self.assertTrue(success)
+        self.assertEqual(details["method"], "sha1")
+        self.assertEqual(details["wiki_features"], {"heading": True})
+        self.assertEqual(self.wiki.action_counts["query"], 1)
+        
+        # A later edit does not affect the revision that was validated
+        self.wiki.set_page("Page", "Other text")
+        success, details = self.validator.validate_revision(self.wiki.api_url, "Page", content_file.name, {},
+                                                            revid=revid)
+        self.assertTrue(success)
+        self.assertEqual(self.wiki.action_counts["query"], 2)
+    
+    def test_validate_revision_falls_back_to_content(self):
+        """Test that the page text is fetched only when the hashes differ."""
+        self.wiki.set_page("Page", "Wiki text")
+        content_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.md')
+        content_file.write("Local text")
+        content_file.close()
+        self.addCleanup(os.unlink, content_file.name)
+        
+        success, details = self.validator.validate_revision(self.wiki.api_url, "Page", content_file.name, {})
+        self.assertFalse(success)
+        self.assertEqual(details["method"], "content")
+        self.assertEqual(details["content_lengths"], {"wiki": 9, "local": 10})
+        self.assertEqual(self.wiki.action_counts["query"], 2)
+    
+    def test_standard_bot_skips_unchanged_page(self):
+        """Test that an up-to-date page is skipped before logging in."""
+        self.wiki.set_page("Page", "Same content")
+        content_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.md')
+        content_file.write("Same content\n")
+        content_file.close()
+        self.addCleanup(os.unlink, content_file.name)
+        
+        bot = StandardWikiBot()
+        bot.username = "TestUser"
+        bot.password = "TestPassword"
+        with patch('sys.stdout'):
+            bot.submit_content(self.wiki.api_url, "Page", content_file.name, "Summary")
+        self.assertNotIn("login", self.wiki.action_counts)
+        self.assertNotIn("edit", self.wiki.action_counts)
+        # cleanup() wrote the journal out
+        self.assertIn({"wiki": self.wiki.api_url, "page": "Page", "phase": "check", "outcome": "unchanged"},
+                      [{key: record.get(key) for key in ("wiki", "page", "phase", "outcome")}
+                       for record in read_journal(bot.log_file)])
+
+class TestBatchedFetching(unittest.TestCase):
+    """Test cases for batched multi-title queries"""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.wiki = MockMediaWiki().start()
+        self.validator = WikiValidator()
+    
+    def tearDown(self):
+        """Tear down test fixtures after each test method."""
+        self.wiki.stop()
+    
+    def test_titles_packed_per_request(self):
+        """Test that titles are sent 50 per request by default."""
+        for index in range(120):
+            self.wiki.set_page(f"Page {index}", f"Text {index}")
+        titles = (f"Page {index}" for index in range(120))
+        results = dict(self.validator.fetch_revision_infos(self.wiki.api_url, titles))
+        self.assertEqual(len(results), 120)
+        self.assertEqual(results["Page 7"]["sha1"], content_sha1("Text 7"))
+        # One API limits lookup and three batches
+        self.assertEqual(self.wiki.action_counts["query"], 4)
+    
+    def test_high_limits_batch_size(self):
+        """Test that accounts with apihighlimits get 500 titles per request."""
+        self.assertEqual(self.validator.get_title_batch_size(self.wiki.api_url), 50)
+        self.wiki.high_limit_users.add("TestUser")
+        bot = StandardWikiBot()
+        bot.username = "TestUser"
+        bot.password = "TestPassword"
+        bot.authenticate(self.wiki.api_url)
+        validator = WikiValidator(http_client=bot.http_client)
+        self.assertEqual(validator.get_title_batch_size(self.wiki.api_url), 500)
+    
+    def test_normalized_and_redirected_titles(self):
+        """Test that results are reported under the requested titles."""
+        self.wiki.set_page("Target", "Target text")
+        self.wiki.set_page("Alias", "#REDIRECT [[target]]")
+        titles = ["alias", "Missing_page", "target", "Alias"]
+        results = dict(self.validator.fetch_wiki_pages(self.wiki.api_url, titles, follow_redirects=True,
+                                                       batch_size=50))
+        self.assertEqual(results, {"alias": "Target text", "Missing_page": None, "target": "Target text",
+                                   "Alias": "Target text"})
+        results = dict(self.validator.fetch_wiki_pages(self.wiki.api_url, ["alias"], batch_size=50))
+        self.assertEqual(results, {"alias": "#REDIRECT [[target]]"})
+    
+    def test_follows_continuation(self):
+        """Test that page texts split across continuations are all returned."""
+        self.wiki.content_batch = 2
+        for index in range(5):
+            self.wiki.set_page(f"Page {index}", f"Text {index}")
+        results = self.validator.fetch_wiki_pages(self.wiki.api_url, [f"Page {index}" for index in range(5)],
+                                                  batch_size=50)
+        first = next(results)
+        # The first response is yielded before the continuations are requested
+        self.assertEqual(self.wiki.action_counts["query"], 1)
+        results = dict([first] + list(results))
+        self.assertEqual(results, {f"Page {index}": f"Text {index}" for index in range(5)})
+        self.assertEqual(self.wiki.action_counts["query"], 3)
+    
+    def test_validate_submissions(self):
+        """Test validating several pages with one request."""
+        self.wiki.set_page("Page 0", "Same")
+        self.wiki.set_page("Page 1", "Different")
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        submissions = []
+        for index in range(3):
+            path = os.path.join(temp_dir, f"page{index}.md")
+            with open(path, 'w') as f:
+                f.write("Same\n")
+            submissions.append((f"Page {index}", path))
+        results = {title: success for title, success, _ in
+                   self.validator.validate_submissions(self.wiki.api_url, submissions, {}, batch_size=50)}
+        self.assertEqual(results, {"Page 0": True, "Page 1": False, "Page 2": False})
+        self.assertEqual(self.wiki.action_counts["query"], 1)
+
+class TestWikiHttpClient(unittest.TestCase):
+    """Test cases for WikiHttpClient against the mock MediaWiki API"""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.wiki = MockMediaWiki().start()
+        self.client = WikiHttpClient()
+    
+    def tearDown(self):
+        """Tear down test fixtures after each test method."""
+        self.client.close()
+        self.wiki.stop()
+    
+    def test_session_cookies_kept_in_memory(self):
+        """Test that the session cookie is reused across requests."""
+        self.client.post_json(self.wiki.api_url, {"action": "query", "meta": "tokens", "type": "login", "format": "json"})
+        self.client.post_json(self.wiki.api_url, {"action": "query", "meta": "tokens", "type": "login", "format": "json"})
+        self.assertEqual(len(self.wiki.sessions), 1)
+        self.client.clear_cookies()
+        self.client.post_json(self.wiki.api_url, {"action": "query", "meta": "tokens", "type": "login", "format": "json"})
+        self.assertEqual(len(self.wiki.sessions), 2)
+    
+    def test_connection_error(self):
+        """Test that connection failures are reported as network errors."""
+        self.wiki.stop()
+        with self.assertRaises(WikiHttpError) as context:
+            self.client.get_json(self.wiki.api_url, {"action": "query"})
+        self.assertIn("network", str(context.exception).lower())
+        self.wiki = MockMediaWiki().start()
+    
+    def test_injected_faults(self):
+        """Test the mock wiki's maxlag, throttling and dropped-connection faults."""
+        query = {"action": "query", "meta": "tokens", "type": "login", "format": "json"}
+        with MockMediaWiki(faults=FaultProfile(maxlag_rate=1.0, lag=3)) as wiki:
+            response = self.client.request("POST", wiki.api_url, data=query)
+            self.assertEqual(response.json()["error"]["code"], "maxlag")
+            self.assertEqual(response.headers["X-Database-Lag"], "3")
+            self.assertEqual(response.headers["Retry-After"], "5")
+            # A request that tolerates the lag gets through
+            self.assertIn("query", self.client.post_json(wiki.api_url, dict(query, maxlag="5")))
+        
+        with MockMediaWiki(faults=FaultProfile(throttle_rate=1.0, retry_after=7)) as wiki:
+            with self.assertRaises(WikiHttpError) as context:
+                self.client.post_json(wiki.api_url, query)
+            self.assertEqual(context.exception.code, "http-429")
+        
+        with MockMediaWiki(faults=FaultProfile(disconnect_rate=1.0)) as wiki:
+            with self.assertRaises(WikiHttpError):
+                self.client.post_json(wiki.api_url, query)
+            # The request took effect before the connection dropped
+            self.assertEqual(wiki.request_count, 1)
+            self.assertEqual(wiki.fault_counts, {"disconnect": 1})
+    
+    def test_standard_bot_submission(self):
+        """Test a full login and edit cycle of StandardWikiBot."""
+        content_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.md')
+        content_file.write("== Test ==\nHello & welcome +1")
+        content_file.close()
+        self.addCleanup(os.unlink, content_file.name)
+        
+        bot = StandardWikiBot()
+        bot.username = "TestUser"
+        bot.password = "TestPassword"
+        bot.submit_content(self.wiki.api_url, "Test Page", content_file.name, "Test summary")
+        
+        self.assertEqual(self.wiki.pages["Test Page"]["text"], "== Test ==\nHello & welcome +1")
+        self.assertEqual(self.wiki.action_counts["edit"], 1)
+        
+        validator = WikiValidator(http_client=self.client)
+        self.assertEqual(validator.fetch_wiki_page(self.wiki.api_url, "Test Page"), "== Test ==\nHello & welcome +1")
+        self.assertIsNone(validator.fetch_wiki_page(self.wiki.api_url, "Missing Page"))
+
+class TestRetryPolicy(unittest.TestCase):
+    """Test cases for RetryPolicy"""
+    
+    def test_error_classification(self):
+        """Test that errors are classified by type and code, not by message."""
+        policy = RetryPolicy()
+        self.assertEqual(policy.retry_reason(MaxLagError("lagging", lag=3)), "maxlag")
+        self.assertEqual(policy.retry_reason(RateLimitedError("slow down")), "ratelimited")
+        self.assertEqual(policy.retry_reason(BadTokenError("bad token")), "badtoken")
+        self.assertEqual(policy.retry_reason(WikiApiError("read-only", code="readonly")), "readonly")
+        self.assertEqual(policy.retry_reason(WikiHttpError("timed out", code="timeout")), "transient")
+        self.assertEqual(policy.retry_reason(WikiHttpError("busy", code="http-503")), "throttled")
+        self.assertIsNone(policy.retry_reason(WikiHttpError("not found", code="http-404")))
+        self.assertIsNone(policy.retry_reason(WrongTokenError("wrong token")))
+        self.assertIsNone(policy.retry_reason(WikiApiError("spam", code="spamdetected")))
+        # Keywords in the message no longer make an error retryable
+        self.assertIsNone(policy.retry_reason(Exception("network maxlag timeout")))
+    
+    def test_delays_honour_server_hints(self):
+        """Test that jittered delays stay in bounds and never undercut Retry-After or the lag."""
+        policy = RetryPolicy(base_delay=1.0, max_delay=30.0, seed=1)
+        delay = 0.0
+        for _ in range(20):
+            previous, delay = delay, policy.next_delay(delay, WikiHttpError("timed out", code="timeout"))
+            self.assertGreaterEqual(delay, 1.0)
+            self.assertLessEqual(delay, min(30.0, max(1.0, previous * 3)))
+        self.assertGreaterEqual(policy.next_delay(0.0, MaxLagError("lagging", lag=7)), 7)
+        self.assertGreaterEqual(policy.next_delay(0.0, WikiHttpError("busy", code="http-429", retry_after=12)), 12)
+        # Server requested waits are capped too
+        self.assertEqual(policy.next_delay(0.0, WikiHttpError("busy", code="http-429", retry_after=3600)), 30.0)
+    
+    def test_bot_retries_lag_and_refreshes_token(self):
+        """Test that the bot waits out maxlag errors and resends a rejected edit with a fresh token."""
+        # Lagged beyond the bot's default maxlag of 5 seconds
+        with MockMediaWiki(faults=FaultProfile(maxlag_rate=0.5, lag=8, seed=4)) as wiki, \
+                patch('time.sleep') as sleep, patch('wiki_rate_limiter._limiters', {}):
+            bot = StandardWikiBot()
+            bot.retry_policy = RetryPolicy(max_attempts=10, seed=1)
+            bot.username = "TestUser"
+            bot.password = "TestPassword"
+            csrf_tok = bot.authenticate(wiki.api_url)
+            bot.exponential_backoff(bot.submit_wiki_page, wiki.api_url, "Retried Page", "Saved", "Test summary",
+                                    csrf_token="stale+\\", refresh_token=lambda: csrf_tok)
+            self.assertEqual(wiki.pages["Retried Page"]["text"], "Saved")
+            self.assertGreater(wiki.fault_counts["maxlag"], 0)
+            self.assertGreaterEqual(min(args[0] for args, _ in sleep.call_args_list), 8)
+            retries = bot.metrics.to_summary()["wikis"][wiki.api_url]["retries"]
+            self.assertEqual(retries["badtoken"], 1)
+            self.assertEqual(retries["maxlag"], wiki.fault_counts["maxlag"])
+
+
+class FakeClock:
+    """Stand-in for the time module whose sleep() advances monotonic() instantly."""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def monotonic(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestAdaptiveRateLimiter(unittest.TestCase):
+    """Test cases for AdaptiveRateLimiter"""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.clock = FakeClock()
+        self.metrics = WikiMetrics()
+        for patcher in (patch('wiki_rate_limiter.time', self.clock), patch('wiki_rate_limiter._limiters', {}),
+                        patch('wiki_metrics._metrics', self.metrics)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.limiter = AdaptiveRateLimiter("https://wiki.example.org/api.php")
+    
+    def test_paced_after_push_back(self):
+        """Test that a wiki is not paced until it pushes back, then held and paced at half the rate."""
+        for _ in range(20):
+            self.assertEqual(self.limiter.acquire(), 0)
+            self.clock.now += 0.1
+        self.assertIsNone(self.limiter.rate)
+        
+        self.limiter.record_error(MaxLagError("lagging", lag=6, retry_after=5))
+        self.assertAlmostEqual(self.limiter.rate, 5.0)
+        # Held for the reported lag, then one request every 1/rate seconds
+        self.assertAlmostEqual(self.limiter.acquire(), 6.2)
+        self.assertAlmostEqual(self.limiter.acquire(), 0.2)
+        
+        # Error-free responses raise the rate again, up to max_rate
+        self.clock.now += 10
+        self.limiter.record_latency(0.1)
+        self.assertGreater(self.limiter.rate, 9.0)
+        self.limiter.set_max_rate(6.0)
+        self.assertEqual(self.limiter.rate, 6.0)
+        
+        pacing = self.metrics.to_summary()["wikis"]["https://wiki.example.org/api.php"]["pacing"]
+        self.assertEqual(pacing["rate"], 6.0)
+        self.assertEqual(pacing["signals"], {"maxlag": 1})
+        self.assertIn('wiki_pacing_slowdowns_total{wiki="https://wiki.example.org/api.php",reason="maxlag"} 1',
+                      self.metrics.to_prometheus())
+    
+    def test_slow_and_throttled_responses(self):
+        """Test that slow responses and throttling cut the rate, but other errors do not."""
+        self.limiter.set_max_rate(8.0)
+        self.limiter.record_latency(12.0)
+        self.assertEqual(self.limiter.rate, 4.0)
+        # A burst of push backs within DECREASE_INTERVAL cuts the rate once
+        self.limiter.record_error(WikiHttpError("busy", code="http-429", retry_after=3))
+        self.assertEqual(self.limiter.rate, 4.0)
+        self.clock.now += 2
+        self.limiter.record_error(WikiHttpError("busy", code="http-429", retry_after=3))
+        self.limiter.record_error(WikiHttpError("not found", code="http-404"))
+        self.limiter.record_error(WikiApiError("spam", code="spamdetected"))
+        self.assertEqual(self.limiter.rate, 2.0)
+        self.assertEqual(self.limiter.state()["signals"], {"latency": 1, "throttled": 2})
+    
+    def test_bots_send_maxlag(self):
+        """Test that requests carry maxlag, so a wiki lagging less than that serves them."""
+        self.clock.sleep = lambda seconds: None
+        with MockMediaWiki(faults=FaultProfile(maxlag_rate=1.0, lag=3)) as wiki:
+            bot = StandardWikiBot()
+            bot.username = "TestUser"
+            bot.password = "TestPassword"
+            self.assertTrue(bot.authenticate(wiki.api_url))
+            self.assertEqual(wiki.fault_counts, {})
+            
+            bot.maxlag = 2
+            with self.assertRaises(MaxLagError):
+                bot.api_request(wiki.api_url, {"action": "query", "meta": "tokens", "format": "json"})
+
+
+class TestStreamingUpload(unittest.TestCase):
+    """Test cases for streaming page content from files"""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.temp_dir = tempfile.mkdtemp()
+    
+    def tearDown(self):
+        """Tear down test fixtures after each test method."""
+        shutil.rmtree(self.temp_dir)
+    
+    def write_file(self, name, data):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+    
+    def test_streamed_digest_matches_content_sha1(self):
+        """Test that hashing a file in small chunks normalizes like content_sha1()."""
+        for text in ["a\r\nb\rc \t\r\n\r\n", "caf\u00e9  \n  x  \n\n", "   ", "", "line\r"]:
+            path = self.write_file("page.txt", text.encode("utf-8"))
+            for chunk_size in (1, 2, 3, 1024):
+                normalized = normalize_content(text).encode("utf-8")
+                self.assertEqual(content_digest(FileFormValue(path, chunk_size=chunk_size)),
+                                 (content_sha1(text), len(normalized)), (text, chunk_size))
+    
+    def test_invalid_utf8_rejected(self):
+        """Test that non-UTF-8 files are rejected before anything is sent."""
+        path = self.write_file("latin1.txt", "caf\u00e9".encode("latin-1"))
+        with self.assertRaises(UnicodeDecodeError):
+            FileFormValue(path)
+    
+    def test_multipart_edit_round_trip(self):
+        """Test that streamed content arrives intact through the edit API."""
+        text = "== Z\u00fcrich ==\nA & B = 100% + more\n--WikiFormBoundary\n"
+        path = self.write_file("page.md", text.encode("utf-8"))
+        bot = StandardWikiBot()
+        bot.username = "TestUser"
+        bot.password = "TestPassword"
+        with MockMediaWiki() as wiki, patch('sys.stdout'):
+            bot.submit_content(wiki.api_url, "Page", path, "Summary")
+            self.assertEqual(wiki.pages["Page"]["text"], normalize_content(text))
+    
+    def test_large_page_streams_with_bounded_memory(self):
+        """Test that a 50 MB page is sent with a Content-Length and without loading it into memory."""
+        path = os.path.join(self.temp_dir, "large.md")
+        line = "== Z\u00fcrich & co ==\nThe [[Link|text]] is 100% {{Template|a=b}}.\n".encode("utf-8")
+        with open(path, 'wb') as f:
+            for _ in range(50 * 1024 * 1024 // len(line) + 1):
+                f.write(line)
+        received_path = os.path.join(self.temp_dir, "received")
+        received = {}
+        
+        class SinkHandler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+            
+            def do_POST(self):
+                received["content_length"] = self.headers.get("Content-Length")
+                received["transfer_encoding"] = self.headers.get("Transfer-Encoding")
+                remaining = int(received["content_length"])
+                with open(received_path, 'wb') as f:
+                    while remaining:
+                        chunk = self.rfile.read(min(remaining, 65536))
+                        f.write(chunk)
+                        remaining -= len(chunk)
+                payload = b'{"ok": true}'
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+        
+        server = ThreadingHTTPServer(("127.0.0.1", 0), SinkHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        client = WikiHttpClient()
+        
+        tracemalloc.start()
+        try:
+            content = FileFormValue(path)
+            response = client.post_json(f"http://127.0.0.1:{server.server_address[1]}/api.php",
+                                        {"action": "edit", "title": "Large", "text": content, "token": "+\\"})
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        
+        self.assertEqual(response, {"ok": True})
+        self.assertGreater(content.size, 50 * 1024 * 1024)
+        self.assertLess(peak, 8 * 1024 * 1024)
+        self.assertIsNone(received["transfer_encoding"])
+        self.assertEqual(int(received["content_length"]), os.path.getsize(received_path))
+        
+        # The text part holds the file byte for byte
+        with open(received_path, 'rb') as f:
+            body = f.read()
+        start = body.index(b"\r\n\r\n", body.index(b'name="text"')) + 4
+        with open(path, 'rb') as f:
+            self.assertEqual(hashlib.sha1(body[start:start + content.size]).digest(),
+                             hashlib.sha1(f.read()).digest())
+        self.assertTrue(body[start + content.size:].startswith(b"\r\n--WikiFormBoundary"))
+
+class TestManifestSubmission(unittest.TestCase):
+    """Test cases for batch manifest submission"""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.wiki = MockMediaWiki().start()
+        self.temp_dir = tempfile.mkdtemp()
+        self.manifest = []
+        for index in range(3):
+            path = os.path.join(self.temp_dir, f"page{index}.md")
+            with open(path, 'w') as f:
+                f.write(f"Content of page {index}")
+            self.manifest.append({"title": f"Page {index}", "content_file": path, "summary": "Batch"})
+        
+        self.bot = StandardWikiBot()
+        self.bot.username = "TestUser"
+        self.bot.password = "TestPassword"
+        # Count edit round trips only
+        self.bot.skip_unchanged = False
+    
+    def tearDown(self):
+        """Tear down test fixtures after each test method."""
+        self.wiki.stop()
+        shutil.rmtree(self.temp_dir)
+    
+    def test_load_manifest_json(self):
+        """Test loading a JSON manifest with relative paths and default summaries."""
+        manifest_file = os.path.join(self.temp_dir, "manifest.json")
+        with open(manifest_file, 'w') as f:
+            json.dump({"pages": [{"title": "Page 0", "content_file": "page0.md"}]}, f)
+        manifest = load_manifest(manifest_file, "Default summary")
+        self.assertEqual(manifest[0]["content_file"], os.path.join(self.temp_dir, "page0.md"))
+        self.assertEqual(manifest[0]["summary"], "Default summary")
+    
+    def test_load_manifest_csv(self):
+        """Test loading a CSV manifest."""
+        manifest_file = os.path.join(self.temp_dir, "manifest.csv")
+        with open(manifest_file, 'w') as f:
+            f.write("title,content_file,summary\nPage 1,page1.md,Fix typo\n")
+        manifest = load_manifest(manifest_file)
+        self.assertEqual(manifest, [{"title": "Page 1", "content_file": os.path.join(self.temp_dir, "page1.md"),
+                                     "summary": "Fix typo"}])
+    
+    def test_load_manifest_missing_fields(self):
+        """Test that entries without a content file are rejected."""
+        manifest_file = os.path.join(self.temp_dir, "manifest.json")
+        with open(manifest_file, 'w') as f:
+            json.dump([{"title": "Page 0"}], f)
+        with self.assertRaises(ValueError):
+            load_manifest(manifest_file)
+    
+    def test_submit_manifest_single_session(self):
+        """Test that a batch logs in once and costs one round trip per page."""
+        results = self.bot.submit_manifest(self.wiki.api_url, self.manifest)
+        self.assertEqual([result["status"] for result in results], ["success"] * 3)
+        self.assertEqual(self.wiki.action_counts["login"], 1)
+        self.assertEqual(self.wiki.action_counts["edit"], 3)
+        # Login token and CSRF token queries only
+        self.assertEqual(self.wiki.action_counts["query"], 2)
+        self.assertEqual(self.wiki.pages["Page 2"]["text"], "Content of page 2")
+    
+    def test_submit_manifest_refreshes_bad_token(self):
+        """Test that the CSRF token is refreshed once on badtoken."""
+        submit_wiki_page = self.bot.submit_wiki_page
+        
+        def submit_and_expire(*args, **kwargs):
+            result = submit_wiki_page(*args, **kwargs)
+            self.wiki.expire_tokens()
+            return result
+        
+        self.bot.submit_wiki_page = submit_and_expire
+        results = self.bot.submit_manifest(self.wiki.api_url, self.manifest)
+        self.assertEqual([result["status"] for result in results], ["success"] * 3)
+        self.assertEqual(self.wiki.action_counts["query"], 4)
+        # Each refresh is a badtoken retry in the wiki's metrics
+        self.assertEqual(get_metrics().to_summary()["wikis"][self.wiki.api_url]["retries"], {"badtoken": 2})
+    
+    def test_submit_manifest_logs_in_after_session_expiry(self):
+        """Test that an expired session is logged in again instead of editing logged out."""
+        submit_wiki_page = self.bot.submit_wiki_page
+        
+        def submit_and_expire(*args, **kwargs):
+            result = submit_wiki_page(*args, **kwargs)
+            self.wiki.expire_sessions()
+            return result
+        
+        self.bot.submit_wiki_page = submit_and_expire
+        results = self.bot.submit_manifest(self.wiki.api_url, self.manifest)
+        self.assertEqual([result["status"] for result in results], ["success"] * 3)
+        self.assertEqual(self.wiki.action_counts["login"], 3)
+        self.assertEqual({revision["user"] for revision in self.wiki.revisions.values()}, {"TestUser"})
+    
+    def test_submit_manifest_skips_unchanged_pages(self):
+        """Test that pages already holding the local content are not uploaded."""
+        self.wiki.set_page("Page 0", "Content of page 0\n\n")
+        self.wiki.set_page("Page 1", "Old content")
+        self.bot.skip_unchanged = True
+        results = self.bot.submit_manifest(self.wiki.api_url, self.manifest)
+        self.assertEqual([result["status"] for result in results], ["skipped", "success", "success"])
+        self.assertEqual(self.wiki.action_counts["edit"], 2)
+        # Login and CSRF tokens, API limits, and one batched revision lookup for all pages
+        self.assertEqual(self.wiki.action_counts["query"], 4)
+    
+    def test_submit_manifest_reports_failures(self):
+        """Test that a missing content file fails only its own page."""
+        self.manifest[1]["content_file"] = os.path.join(self.temp_dir, "missing.md")
+        results = self.bot.submit_manifest(self.wiki.api_url, self.manifest)
+        self.assertEqual([result["status"] for result in results], ["success", "failed", "success"])
+        self.assertIsNotNone(results[1]["error"])
+
+class TestAsyncSubmissionEngine(unittest.TestCase):
+    """Test cases for AsyncSubmissionEngine"""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.engine = AsyncSubmissionEngine(base_delay=0.05)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.finished = []
+    
+    def _job(self, name, fail_times=0):
+        attempts = {"count": 0}
+        
+        def run():
+            with self.lock:
+                self.in_flight += 1
+                self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            try:
+                time.sleep(0.01)
+                attempts["count"] += 1
+                if attempts["count"] <= fail_times:
+                    raise MaxLagError("Wiki is currently lagging (0 seconds behind). Please try again later.", lag=0)
+                self.finished.append(name)
+                return name
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+        
+        return {"wiki": "testwiki", "name": name, "func": run}
+    
+    def test_respects_max_in_flight(self):
+        """Test that no more than max_in_flight jobs run at once."""
+        self.engine.set_limit("testwiki", 3)
+        outcomes = self.engine.run([self._job(index) for index in range(12)])
+        self.assertEqual([outcome["result"] for outcome in outcomes], list(range(12)))
+        self.assertLessEqual(self.peak_in_flight, 3)
+        self.assertGreater(self.peak_in_flight, 1)
+    
+    def test_backoff_does_not_stall_other_jobs(self):
+        """Test that a job waiting to retry frees its slot for the others."""
+        self.engine.set_limit("testwiki", 1)
+        jobs = [self._job("lagged", fail_times=1)] + [self._job(index) for index in range(3)]
+        outcomes = self.engine.run(jobs)
+        self.assertEqual(outcomes[0]["attempts"], 2)
+        self.assertEqual(self.finished, [0, 1, 2, "lagged"])
+    
+    def test_permanent_error_not_retried(self):
+        """Test that non-transient errors are returned without retrying."""
+        def run():
+            raise Exception("Content detected as spam. Please review your content.")
+        
+        outcomes = self.engine.run([{"wiki": "testwiki", "func": run}])
+        self.assertEqual(outcomes[0]["attempts"], 1)
+        self.assertIn("spam", str(outcomes[0]["error"]))
+    
+    def test_concurrent_manifest_submission(self):
+        """Test a concurrent manifest submission against the mock wiki."""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        manifest = []
+        for index in range(20):
+            path = os.path.join(temp_dir, f"page{index}.md")
+            with open(path, 'w') as f:
+                f.write(f"Content {index}")
+            manifest.append({"title": f"Page {index}", "content_file": path, "summary": "Batch"})
+        
+        with MockMediaWiki(latency=0.01) as wiki:
+            bot = StandardWikiBot()
+            bot.username = "TestUser"
+            bot.password = "TestPassword"
+            results = bot.submit_manifest(wiki.api_url, manifest, max_in_flight=8)
+            self.assertEqual([result["status"] for result in results], ["success"] * 20)
+            self.assertEqual(len(wiki.pages), 20)
+            self.assertEqual(wiki.action_counts["login"], 1)
+
+class TestMultiWikiFanOut(unittest.TestCase):
+    """Test cases for pushing one file to several wikis"""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.wikis = [MockMediaWiki(latency=0.1).start() for _ in range(3)]
+        self.targets = [
+            (f"wiki{index}", {"name": f"Wiki {index}", "api_url": wiki.api_url, "validation_rules": {}})
+            for index, wiki in enumerate(self.wikis)
+        ]
+        content_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.md')
+        content_file.write("Mirrored help page")
+        content_file.close()
+        self.content_file = content_file.name
+    
+    def tearDown(self):
+        """Tear down test fixtures after each test method."""
+        for wiki in self.wikis:
+            wiki.stop()
+        os.unlink(self.content_file)
+    
+    @patch('wiki_secure_submission.getpass.getpass', return_value="TestPassword")
+    @patch('builtins.input', return_value="TestUser")
+    def test_submit_to_wikis_concurrently(self, mock_input, mock_getpass):
+        """Test that all wikis are updated in about the time of one."""
+        start = time.monotonic()
+        with patch('sys.stdout'):
+            results = submit_to_wikis(self.targets, "Help Page", self.content_file, "Mirror")
+        elapsed = time.monotonic() - start
+        
+        self.assertEqual([result["status"] for result in results], ["success"] * 3)
+        self.assertTrue(all(result["content_match"] for result in results))
+        for wiki in self.wikis:
+            self.assertEqual(wiki.pages["Help Page"]["text"], "Mirrored help page")
+        # Each wiki needs five round trips of 0.1s; sequentially this takes at least 1.5s
+        self.assertLess(elapsed, 1.2)
+        mock_getpass.assert_called_once()
+    
+    @patch('wiki_secure_submission.getpass.getpass', return_value="WrongPassword")
+    @patch('builtins.input', return_value="TestUser")
+    def test_submit_to_wikis_reports_failures(self, mock_input, mock_getpass):
+        """Test that a failed login is reported per wiki."""
+        with patch('sys.stdout'):
+            results = submit_to_wikis(self.targets[:1], "Help Page", self.content_file, "Mirror")
+        self.assertEqual(results[0]["status"], "failed")
+        self.assertIn("Login failed", results[0]["error"])
+    
+    @patch('wiki_secure_submission.getpass.getpass', return_value="TestPassword")
+    @patch('builtins.input', return_value="TestUser")
+    def test_submit_to_wikis_logs_in_after_session_expiry(self, mock_input, mock_getpass):
+        """Test that a session expiring before the edit is logged in again with the prompted password."""
+        submit_wiki_page = EnhancedSecureWikiBot.submit_wiki_page
+        expired = []
+        
+        def expire_and_submit(bot, *args, **kwargs):
+            if not expired:
+                expired.append(True)
+                self.wikis[0].expire_sessions()
+            return submit_wiki_page(bot, *args, **kwargs)
+        
+        with patch.object(EnhancedSecureWikiBot, 'submit_wiki_page', expire_and_submit), patch('sys.stdout'):
+            results = submit_to_wikis(self.targets[:1], "Help Page", self.content_file, "Mirror")
+        self.assertEqual(results[0]["status"], "success")
+        self.assertEqual(self.wikis[0].action_counts["login"], 2)
+        self.assertEqual({revision["user"] for revision in self.wikis[0].revisions.values()}, {"TestUser"})
+        mock_getpass.assert_called_once()
+    
+    def test_resolve_fanout_targets(self):
+        """Test resolving wiki IDs and categories into targets."""
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        config_file = os.path.join(temp_dir, "wiki_config.json")
+        with open(config_file, 'w') as f:
+            json.dump({"wikis": dict(self.targets)}, f)
+        config_manager = WikiConfigManager(config_file=config_file,
+                                           user_config_file=os.path.join(temp_dir, "user_wikis.json"),
+                                           use_disk_cache=False)
+        wiki_selector = WikiSelector(config_manager)
+        
+        targets = resolve_fanout_targets(config_manager, wiki_selector, "wiki0, wiki2", None)
+        self.assertEqual([wiki_id for wiki_id, _ in targets], ["wiki0", "wiki2"])
+        targets = resolve_fanout_targets(config_manager, wiki_selector, "wiki1", "other")
+        self.assertEqual([wiki_id for wiki_id, _ in targets], ["wiki1", "wiki0", "wiki2"])
+        with self.assertRaises(Exception):
+            resolve_fanout_targets(config_manager, wiki_selector, "missing", None)
+
+class TestWikiPlan(unittest.TestCase):
+    """Test cases for planning a manifest submission without editing"""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.wiki = MockMediaWiki().start()
+        self.temp_dir = tempfile.mkdtemp()
+        config_file = os.path.join(self.temp_dir, "wiki_config.json")
+        with open(config_file, 'w') as f:
+            json.dump({"default_wiki": "main", "wikis": {"main": {"name": "Main", "api_url": self.wiki.api_url}}}, f)
+        self.config_manager = WikiConfigManager(config_file=config_file,
+                                                user_config_file=os.path.join(self.temp_dir, "user_wikis.json"),
+                                                use_disk_cache=False)
+        for patcher in (patch('wiki_rate_limiter._limiters', {}), patch('wiki_metrics._metrics', WikiMetrics())):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+    
+    def tearDown(self):
+        """Tear down test fixtures after each test method."""
+        self.wiki.stop()
+        shutil.rmtree(self.temp_dir)
+    
+    def _entry(self, title, content, **fields):
+        path = os.path.join(self.temp_dir, f"{title}.md")
+        if content is not None:
+            with open(path, 'w') as f:
+                f.write(content)
+        return dict(fields, title=title, content_file=path)
+    
+    def test_changeset(self):
+        """Test that pages are classified with byte deltas across wikis, without any edit."""
+        self.wiki.set_page("Same", "Same text")
+        self.wiki.set_page("Old", "Old")
+        with MockMediaWiki() as other:
+            manifest = [
+                self._entry("Same", "Same text\n"),
+                self._entry("Old", "Old text", wiki="main"),
+                self._entry("New", "Brand new", wiki=other.api_url),
+                self._entry("Unreadable", None),
+                self._entry("Elsewhere", "Text", wiki="unknown")
+            ]
+            plan = WikiPlanner(self.config_manager).plan(manifest)
+            self.assertNotIn("edit", other.action_counts)
+        
+        self.assertEqual([change["action"] for change in plan["pages"]],
+                         ["unchanged", "update", "create", "error", "error"])
+        self.assertEqual([change["byte_delta"] for change in plan["pages"]], [0, 5, 9, None, None])
+        self.assertEqual(plan["pages"][1]["api_url"], self.wiki.api_url)
+        self.assertIn("not found in configuration", plan["pages"][4]["error"])
+        self.assertEqual(plan["summary"], {"create": 1, "update": 1, "unchanged": 1, "error": 2, "byte_delta": 14})
+        # One API limits lookup and one batch for the three titles of this wiki
+        self.assertEqual(self.wiki.action_counts["query"], 2)
+        self.assertNotIn("edit", self.wiki.action_counts)
+    
+    def test_failed_lookup_is_not_a_create(self):
+        """Test that pages whose revisions could not be fetched are reported as errors after retries."""
+        async def no_sleep(*args, **kwargs):
+            return None
+        
+        manifest = [self._entry(f"Page {index}", "Text") for index in range(3)]
+        with MockMediaWiki(faults=FaultProfile(maxlag_rate=1.0, lag=3)) as wiki, \
+                patch('asyncio.sleep', no_sleep), patch('wiki_rate_limiter.time', FakeClock()), patch('sys.stderr'):
+            plan = WikiPlanner(self.config_manager).plan(manifest, wiki.api_url)
+        self.assertEqual(plan["summary"]["error"], 3)
+        self.assertIn("lagging", plan["pages"][0]["error"])
+        self.assertEqual(get_metrics().to_summary()["wikis"][wiki.api_url]["retries"], {"maxlag": 2})
+
+class TestWatchMode(unittest.TestCase):
+    """Test cases for watching a content directory"""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.temp_dir = tempfile.mkdtemp()
+        for name in ("Bluetooth.md", "Headset_profiles.md"):
+            self._write(name, f"Text of {name}")
+    
+    def tearDown(self):
+        """Tear down test fixtures after each test method."""
+        shutil.rmtree(self.temp_dir)
+    
+    def _write(self, name, content):
+        path = os.path.join(self.temp_dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+    
+    def test_content_watcher(self):
+        """Test that bursts of saves are reported once and touch-only changes are not reported."""
+        self.assertEqual(page_title_for_file(self.temp_dir, os.path.join(self.temp_dir, "Sub", "Headset_profiles.md")),
+                         "Sub/Headset profiles")
+        # inotify where available, and scanning
+        for poll_interval in (None, 0.05):
+            with self.subTest(poll_interval=poll_interval), patch('sys.stderr'):
+                watcher = ContentWatcher(self.temp_dir, debounce=0.2, poll_interval=poll_interval)
+                self.addCleanup(watcher.close)
+                os.utime(os.path.join(self.temp_dir, "Bluetooth.md"))
+                self._write("Headset_profiles.md", "Text of Headset_profiles.md\n")
+                self._write(".Bluetooth.md.swp", "swap")
+                self.assertEqual(watcher.changes(timeout=0.5), [])
+                
+                path = self._write("Bluetooth.md", "Draft")
+                threading.Timer(0.05, self._write, ("Bluetooth.md", f"Final {poll_interval}")).start()
+                self.assertEqual(watcher.changes(timeout=2), [path])
+                self.assertEqual(watcher.changes(timeout=0.3), [])
+                
+                threading.Timer(0.1, watcher.stop).start()
+                start = time.monotonic()
+                self.assertEqual(watcher.changes(), [])
+                self.assertLess(time.monotonic() - start, 1)
+    
+    def test_content_watcher_falls_back_to_polling(self):
+        """Test that inotify is not touched where it cannot exist."""
+        for platform, libc in (("win32", "msvcrt"), ("linux", None)):
+            with self.subTest(platform=platform), patch('wiki_watch.sys.platform', platform), \
+                    patch('wiki_watch.ctypes.util.find_library', return_value=libc), \
+                    patch('wiki_watch.ctypes.CDLL') as cdll, patch('sys.stderr'):
+                watcher = ContentWatcher(self.temp_dir)
+                watcher.close()
+                self.assertEqual(watcher.backend, "polling")
+                cdll.assert_not_called()
+    
+    def test_watch_pushes_in_one_session(self):
+        """Test that saves are pushed through one session that is renewed once it expires."""
+        with MockMediaWiki() as wiki, patch('sys.stdout'), patch('sys.stderr'), \
+                patch('wiki_automated_submission.WATCH_SESSION_CHECK_INTERVAL', 0):
+            watcher = ContentWatcher(self.temp_dir, debounce=0.05)
+            self.addCleanup(watcher.close)
+            bot = StandardWikiBot()
+            bot.username = "TestUser"
+            bot.password = "TestPassword"
+            thread = threading.Thread(target=bot.watch, args=(wiki.api_url, watcher, "Watched"))
+            thread.start()
+            
+            def wait_for(title, text):
+                deadline = time.monotonic() + 5
+                while wiki.pages.get(title, {}).get("text") != text and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                return wiki.pages.get(title, {}).get("text")
+            
+            time.sleep(0.2)
+            self._write("Headset_profiles.md", "Profiles")
+            self.assertEqual(wait_for("Headset profiles", "Profiles"), "Profiles")
+            # The server forgets the session; the next push logs in again instead of editing anonymously
+            wiki.sessions.clear()
+            time.sleep(0.1)
+            self._write("Bluetooth.md", "Bluetooth")
+            self.assertEqual(wait_for("Bluetooth", "Bluetooth"), "Bluetooth")
+            watcher.stop()
+            thread.join(5)
+        
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(wiki.action_counts["edit"], 2)
+        self.assertEqual(wiki.action_counts["login"], 2)
+
+@unittest.skipIf(Fernet is None, "cryptography is not installed")
+class TestWikiSessionCache(unittest.TestCase):
+    """Test cases for the encrypted session cache"""
+    
+    def setUp(self):
+        """Set up test fixtures before each test method."""
+        self.wiki = MockMediaWiki().start()
+        self.cache_dir = tempfile.mkdtemp()
+        self.key_dir = tempfile.mkdtemp()
+        self.key_file = os.path.join(self.key_dir, "session.key")
+        content_file = tempfile.NamedTemporaryFile(mode='w', delete=False, suffix='.md')
+        content_file.write("Cached session content")
+        content_file.close()
+        self.content_file = content_file.name
+    
+    def tearDown(self):
+        """Tear down test fixtures after each test method."""
+        self.wiki.stop()
+        shutil.rmtree(self.cache_dir)
+        shutil.rmtree(self.key_dir)
+        os.unlink(self.content_file)
+    
+    def _run_standard_bot(self):
+        bot = StandardWikiBot()
+        bot.username = "TestUser"
+        bot.password = "TestPassword"
+        bot.session_cache = WikiSessionCache(cache_dir=self.cache_dir, key_file=self.key_file)
+        bot.skip_unchanged = False
+        with patch('sys.stdout'):
+            bot.submit_content(self.wiki.api_url, "Cached Page", self.content_file, "Summary")
+    
+    def test_store_and_load(self):
+        """Test that entries round-trip and are encrypted at rest."""
+        cache = WikiSessionCache(cache_dir=self.cache_dir, key_file=self.key_file)
+        cache.store("https://wiki.example.com/api.php", "User", [{"name": "session", "value": "secret"}], "abc+\\")
+        entry = cache.load("https://wiki.example.com/api.php", "User")
+        self.assertEqual(entry["csrf_token"], "abc+\\")
+        self.assertIsNone(cache.load("https://wiki.example.com/api.php", "OtherUser"))
+        for name in os.listdir(self.cache_dir):
+            with open(os.path.join(self.cache_dir, name), 'rb') as f:
+                self.assertNotIn(b"secret", f.read())
+    
+    @patch.dict(os.environ, {}, clear=False)
+    def test_key_kept_out_of_cache_dir(self):
+        """Test that the generated key is stored apart from the entries, with 600 permissions."""
+        os.environ.pop("WIKI_SESSION_CACHE_KEY", None)
+        with open(os.path.join(self.cache_dir, "session.key"), 'wb') as f:
+            f.write(Fernet.generate_key())
+        cache = WikiSessionCache(cache_dir=self.cache_dir, key_file=self.key_file)
+        cache.store("https://wiki.example.com/api.php", "User", [], "abc+\\")
+        self.assertNotIn("session.key", os.listdir(self.cache_dir))
+        self.assertEqual(os.stat(self.key_file).st_mode & 0o777, 0o600)
+        with self.assertRaises(ValueError):
+            WikiSessionCache(cache_dir=self.cache_dir, key_file=os.path.join(self.cache_dir, "session.key"))
+    
+    def test_expired_entry_ignored(self):
+        """Test that expired entries are not returned."""
+        cache = WikiSessionCache(cache_dir=self.cache_dir, ttl=-1, key_file=self.key_file)
+        cache.store("https://wiki.example.com/api.php", "User", [], "abc+\\")
+        self.assertIsNone(cache.load("https://wiki.example.com/api.php", "User"))
+    
+    def test_repeat_run_skips_login(self):
+        """Test that a second run reuses the cached session with one token check."""
+        self._run_standard_bot()
+        self.assertEqual(self.wiki.action_counts["login"], 1)
+        queries_after_first_run = self.wiki.action_counts["query"]
+        
+        self._run_standard_bot()
+        self.assertEqual(self.wiki.action_counts["login"], 1)
+        self.assertEqual(self.wiki.action_counts["query"], queries_after_first_run + 1)
+        self.assertEqual(self.wiki.action_counts["edit"], 2)
+    
+    def test_invalid_session_falls_back_to_login(self):
+        """Test that a session the wiki no longer knows triggers a full login."""
+        self._run_standard_bot()
+        self.wiki.sessions.clear()
+        self._run_standard_bot()
+        self.assertEqual(self.wiki.action_counts["login"], 2)
+    
+    @patch('wiki_secure_submission.getpass.getpass', return_value="TestPassword")
+    @patch('builtins.input', return_value="TestUser")
+    def test_secure_bot_skips_password_prompt(self, mock_input, mock_getpass):
+        """Test that the secure bot only asks for the password without a cached session."""
+        for _ in range(2):
+            bot = EnhancedSecureWikiBot()
+            bot.set_wiki_config({"name": "Mock Wiki", "api_url": self.wiki.api_url})
+            bot.session_cache = WikiSessionCache(cache_dir=self.cache_dir, key_file=self.key_file)
+            bot.skip_unchanged = False
+            with patch('sys.stdout'):
+                bot.submit_content("Cached Page", self.content_file, "Summary")
+        mock_getpass.assert_called_once()
+        self.assertEqual(self.wiki.action_counts["login"], 1)
+    
+    @patch('wiki_secure_submission.getpass.getpass', return_value="TestPassword")
+    @patch('builtins.input', return_value="TestUser")
+    def test_multi_wiki_submission_uses_cache(self, mock_input, mock_getpass):
+        """Test that a multi-wiki submission reuses and updates the cached sessions."""
+        targets = [("mock", {"name": "Mock Wiki", "api_url": self.wiki.api_url, "validation_rules": {}})]
+        cache = WikiSessionCache(cache_dir=self.cache_dir, key_file=self.key_file)
+        for _ in range(2):
+            with patch('sys.stdout'):
+                results = submit_to_wikis(targets, "Cached Page", self.content_file, "Summary",
+                                          skip_unchanged=False, session_cache=cache)
+            self.assertIsNone(results[0]["error"])
+        self.assertEqual(self.wiki.action_counts["login"], 1)
+        self.assertEqual(self.wiki.action_counts["edit"], 2)
+
 def main():
     """Run all tests."""
     unittest.main()